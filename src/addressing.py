@@ -0,0 +1,131 @@
+"""
+Operand address resolvers - one specialised function per addressing mode.
+
+Each resolver takes the CPU (with the program counter pointing at the first operand byte) and returns the effective
+address of the operand. They are bound to each Opcode when the opcode table is loaded so executing an instruction
+never has to compare AddressingMode members.
+
+https://www.nesdev.org/obelisk-6502-guide/addressing.html
+"""
+from typing import Any, Callable, Dict
+from constants import AddressingMode
+
+Resolver = Callable[["CPU"], Any]
+
+
+def immediate(cpu: "CPU") -> int:
+    return cpu.program_counter
+
+
+def zero_page(cpu: "CPU") -> int:
+    return cpu.memory.read(cpu.program_counter)
+
+
+def x_indexed_zero_page(cpu: "CPU") -> int:
+    return (cpu.memory.read(cpu.program_counter) + cpu.register_x) & 0xFF
+
+
+def y_indexed_zero_page(cpu: "CPU") -> int:
+    return (cpu.memory.read(cpu.program_counter) + cpu.register_y) & 0xFF
+
+
+def absolute(cpu: "CPU") -> int:
+    return cpu.memory.read_u16(cpu.program_counter)
+
+
+def x_indexed_absolute(cpu: "CPU") -> int:
+    return (cpu.memory.read_u16(cpu.program_counter) + cpu.register_x) & 0xFFFF
+
+
+def y_indexed_absolute(cpu: "CPU") -> int:
+    return (cpu.memory.read_u16(cpu.program_counter) + cpu.register_y) & 0xFFFF
+
+
+def x_indexed_zero_page_indirect(cpu: "CPU") -> int:
+    memory = cpu.memory
+    i = (memory.read(cpu.program_counter) + cpu.register_x) & 0xFF
+    return ((memory.read((i + 1) & 0xFF) << 8) + memory.read(i)) & 0xFFFF
+
+
+def zero_page_indirect_y_indexed(cpu: "CPU") -> int:
+    memory = cpu.memory
+    i = memory.read(cpu.program_counter)
+    return (memory.read(i) + (memory.read((i + 1) & 0xFF) << 8) + cpu.register_y) & 0xFFFF
+
+
+def relative(cpu: "CPU") -> int:
+    return cpu.memory.read(cpu.program_counter)
+
+
+def accumulator(cpu: "CPU") -> int:
+    return cpu.register_a
+
+
+def implied(cpu: "CPU") -> None:
+    return None
+
+
+def absolute_indirect(cpu: "CPU") -> int:
+    memory = cpu.memory
+    pointer = memory.read_u16(cpu.program_counter)
+
+    # the 6502 doesn't carry into the high byte when the pointer sits on the last byte of a page, so the high byte
+    # of the target is fetched from the start of the same page
+    if pointer & 0x00FF == 0x00FF:
+        return (memory.read(pointer & 0xFF00) << 8) | memory.read(pointer)
+
+    return memory.read_u16(pointer)
+
+
+# The indexed modes again for the opcodes that take an extra cycle (+p) when the index carries into the next page
+def x_indexed_absolute_page_crossing(cpu: "CPU") -> int:
+    base = cpu.memory.read_u16(cpu.program_counter)
+    address = (base + cpu.register_x) & 0xFFFF
+    if (base ^ address) & 0xFF00:
+        cpu.cycles += 1
+
+    return address
+
+
+def y_indexed_absolute_page_crossing(cpu: "CPU") -> int:
+    base = cpu.memory.read_u16(cpu.program_counter)
+    address = (base + cpu.register_y) & 0xFFFF
+    if (base ^ address) & 0xFF00:
+        cpu.cycles += 1
+
+    return address
+
+
+def zero_page_indirect_y_indexed_page_crossing(cpu: "CPU") -> int:
+    memory = cpu.memory
+    i = memory.read(cpu.program_counter)
+    base = memory.read(i) + (memory.read((i + 1) & 0xFF) << 8)
+    address = (base + cpu.register_y) & 0xFFFF
+    if (base ^ address) & 0xFF00:
+        cpu.cycles += 1
+
+    return address
+
+
+ADDRESS_RESOLVERS: Dict[AddressingMode, Resolver] = {
+    AddressingMode.IMMEDIATE: immediate,
+    AddressingMode.ZERO_PAGE: zero_page,
+    AddressingMode.X_INDEXED_ZERO_PAGE: x_indexed_zero_page,
+    AddressingMode.Y_INDEXED_ZERO_PAGE: y_indexed_zero_page,
+    AddressingMode.ABSOLUTE: absolute,
+    AddressingMode.X_INDEXED_ABSOLUTE: x_indexed_absolute,
+    AddressingMode.Y_INDEXED_ABSOLUTE: y_indexed_absolute,
+    AddressingMode.X_INDEXED_ZERO_PAGE_INDIRECT: x_indexed_zero_page_indirect,
+    AddressingMode.ZERO_PAGE_INDIRECT_Y_INDEXED: zero_page_indirect_y_indexed,
+    AddressingMode.RELATIVE: relative,
+    AddressingMode.ACCUMULATOR: accumulator,
+    AddressingMode.IMPLIED: implied,
+    AddressingMode.ABSOLUTE_INDIRECT: absolute_indirect,
+}
+
+PAGE_CROSSING_RESOLVERS: Dict[AddressingMode, Resolver] = {
+    **ADDRESS_RESOLVERS,
+    AddressingMode.X_INDEXED_ABSOLUTE: x_indexed_absolute_page_crossing,
+    AddressingMode.Y_INDEXED_ABSOLUTE: y_indexed_absolute_page_crossing,
+    AddressingMode.ZERO_PAGE_INDIRECT_Y_INDEXED: zero_page_indirect_y_indexed_page_crossing,
+}
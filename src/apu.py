@@ -0,0 +1,131 @@
+"""
+The APU and I/O registers ($4000-$4017) - a stub so that the code every game runs at reset (silencing the APU through
+$4015, setting the frame counter through $4017, polling the controllers through $4016/$4017) runs rather than hitting
+an unmapped address.
+
+No sound is generated: writes to the APU registers are latched, so they read back through registers, and reads of the
+write only registers (and of $4018-$40FF) return open bus. The two controllers are read a button at a time through
+their shift registers like the real thing, with the buttons held set by the host.
+
+Other devices can own a register in the range - the PPU's OAM DMA at $4014 - see APU.map_register.
+
+https://www.nesdev.org/wiki/APU_registers
+"""
+from copy import copy
+from typing import Callable, Dict, List
+
+APU_REGISTERS: int = 0x4000
+APU_STATUS: int = 0x4015
+JOYPAD_1: int = 0x4016
+JOYPAD_2: int = 0x4017
+REGISTERS_END: int = 0x4018
+
+# a read of a register that doesn't drive the data bus sees whatever was last on it, for an absolute read of $40xx
+# that's the high byte of the address
+OPEN_BUS: int = 0x40
+
+# the buttons in the order the controller shifts them out
+BUTTON_A: int = 0x01
+BUTTON_B: int = 0x02
+BUTTON_SELECT: int = 0x04
+BUTTON_START: int = 0x08
+BUTTON_UP: int = 0x10
+BUTTON_DOWN: int = 0x20
+BUTTON_LEFT: int = 0x40
+BUTTON_RIGHT: int = 0x80
+
+
+class Controller:
+    """A standard controller - while the strobe is high the shift register keeps reloading from the buttons held, once
+    it's low each read shifts out the next button, then 1s once all 8 have been read.
+
+    https://www.nesdev.org/wiki/Standard_controller
+    """
+
+    __slots__ = ("buttons", "strobe", "shift")
+
+    # the buttons held, set by the host
+    buttons: int
+    strobe: int
+    shift: int
+
+    def __init__(self) -> None:
+        self.buttons = 0
+        self.strobe = 0
+        self.shift = 0
+
+    def write(self, data: int) -> None:
+        self.strobe = data & 0x01
+        if self.strobe:
+            self.shift = self.buttons
+
+    def read(self) -> int:
+        if self.strobe:
+            return self.buttons & 0x01
+
+        bit = self.shift & 0x01
+        self.shift = (self.shift >> 1) | 0x80
+        return bit
+
+
+class APU:
+    """The APU and I/O registers, mapped over the $4000-$40FF page by the memory bus - see Memory."""
+
+    # the last value written to each register from $4000 to $4017
+    registers: bytearray
+    controllers: List[Controller]
+    # the registers owned by other devices, by address
+    handlers: Dict[int, Callable[[int, int], None]]
+
+    def __init__(self) -> None:
+        self.registers = bytearray(REGISTERS_END - APU_REGISTERS)
+        self.controllers = [Controller(), Controller()]
+        self.handlers = {}
+
+    def map_register(self, addr: int, write: Callable[[int, int], None]) -> None:
+        """Hand writes to a register over to another device, i.e. OAM DMA at $4014 to the PPU.
+
+        Args:
+            addr (int): The register
+            write (Callable[[int, int], None]): Called as write(addr, data)
+
+        Returns:
+            None
+        """
+        if not APU_REGISTERS <= addr < REGISTERS_END:
+            raise ValueError(f"Can't map {hex(addr)}: not an APU or I/O register")
+
+        self.handlers[addr] = write
+
+    def read(self, addr: int) -> int:
+        if addr == JOYPAD_1 or addr == JOYPAD_2:
+            # only the low bit is driven, the rest is open bus
+            return self.controllers[addr - JOYPAD_1].read() | OPEN_BUS
+
+        return OPEN_BUS
+
+    def write(self, addr: int, data: int) -> None:
+        handler = self.handlers.get(addr)
+        if handler is not None:
+            handler(addr, data)
+            return
+
+        if addr >= REGISTERS_END:
+            # nothing on the bus listens to the rest of the page
+            return
+
+        self.registers[addr - APU_REGISTERS] = data
+
+        # $4016 strobes both controllers, a write to $4017 is the APU's frame counter
+        if addr == JOYPAD_1:
+            for controller in self.controllers:
+                controller.write(data)
+
+    def fork(self, memory: "Memory") -> "APU":
+        """A copy of the registers and the controllers for a fork of memory - see Memory.fork"""
+        child = copy(self)
+        child.registers = bytearray(self.registers)
+        child.controllers = [copy(controller) for controller in self.controllers]
+        child.handlers = self.handlers.copy()
+
+        return child
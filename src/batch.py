@@ -0,0 +1,178 @@
+"""
+Headless batch runner - runs every program or ROM in a directory, one per worker process, and writes a JSON report.
+
+Each file is run in its own worker of a ProcessPoolExecutor (so a run can't affect another) until it stops on BRK or an
+undefined opcode, or its instruction or cycle budget runs out. iNES ROMs (.nes) are loaded and run a frame at a time
+through the Console, so the PPU keeps up and its NMIs are taken, any other file is taken as a raw 6502 program, loaded
+into flat memory at the program offset and run straight through on the CPU.
+
+For each file the report has the reason the run stopped, the final registers, a SHA-1 of memory (all 64KiB of flat
+memory, the RAM and SRAM on the bus), the instructions and cycles executed and the instructions per second. An error
+(a ROM that can't be loaded, a memory access that isn't mapped) is reported against the file rather than stopping the
+batch.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from constants import StopReason
+from cpu import CPU
+from memory import Memory
+
+ROM_SUFFIX: str = ".nes"
+
+
+def load(path: Path, program_offset: int, translate: bool, fast_forward: bool) -> Tuple[CPU, Optional["Console"]]:
+    """The CPU to run, and the console it's in for a ROM"""
+    if path.suffix.lower() == ROM_SUFFIX:
+        # the cartridge loader has dependencies of its own, only needed for ROMs
+        from console import Console
+
+        # mmap'ed, so the workers share the ROM through the page cache rather than each reading a copy
+        console = Console(rom_path=path, translate=translate, fast_forward=fast_forward, memory_map=True)
+        console.load_cartridge()
+        return console.cpu, console
+
+    cpu = CPU(program_offset=program_offset, translate=translate, fast_forward=fast_forward)
+    cpu.pre_load(list(path.read_bytes()))
+
+    return cpu, None
+
+
+def memory_hash(memory: Memory) -> str:
+    sha1 = hashlib.sha1()
+    for region in memory.regions():
+        sha1.update(region)
+
+    return sha1.hexdigest()
+
+
+def run_program(path: Path, instructions: int, cycles: int, program_offset: int = 0x0600, translate: bool = False, fast_forward: bool = False) -> Dict[str, Any]:
+    """Run a single program or ROM - this is what each worker process runs.
+
+    Args:
+        path (Path): The program or ROM
+        instructions (int): The instruction budget
+        cycles (int): The cycle budget
+        program_offset (int): Where raw programs are loaded
+        translate (bool): Run through the basic block translator
+        fast_forward (bool): Skip idle loops
+
+    Returns:
+        Dict[str, Any]: The report for the program
+    """
+    report: Dict[str, Any] = {"path": str(path)}
+    console = None
+
+    try:
+        cpu, console = load(path, program_offset, translate, fast_forward)
+
+        start = time.perf_counter()
+        if console is not None:
+            reason = console.run(instructions, until_cycles=cpu.cycles + cycles)
+        else:
+            reason = cpu.execute(instructions, until_cycles=cpu.cycles + cycles)
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        report["error"] = f"{e.__class__.__name__}: {e}"
+        return report
+    finally:
+        # a worker runs program after program, each ROM is let go of once it has run
+        if console is not None:
+            console.close()
+
+    report.update(
+        {
+            "stop_reason": reason.value,
+            "registers": {
+                "a": cpu.register_a,
+                "x": cpu.register_x,
+                "y": cpu.register_y,
+                "status": cpu.status,
+                "stack_pointer": cpu.stack_pointer,
+                "program_counter": cpu.program_counter,
+            },
+            "memory_sha1": memory_hash(cpu.memory),
+            "instructions": cpu.executed,
+            "cycles": cpu.cycles,
+            "seconds": elapsed,
+            "instructions_per_second": cpu.executed / elapsed if elapsed else None,
+        }
+    )
+
+    return report
+
+
+def find_programs(directory: Path) -> List[Path]:
+    return sorted(path for path in directory.rglob("*") if path.is_file())
+
+
+def run_batch(
+    paths: List[Path],
+    instructions: int = sys.maxsize,
+    cycles: int = sys.maxsize,
+    program_offset: int = 0x0600,
+    translate: bool = False,
+    fast_forward: bool = False,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Run the programs across a pool of worker processes.
+
+    Returns:
+        Dict[str, Any]: The report - a list of the program reports and a summary of the batch
+    """
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_program, path, instructions, cycles, program_offset, translate, fast_forward) for path in paths]
+        programs = [future.result() for future in futures]
+
+    elapsed = time.perf_counter() - start
+    executed = sum(program.get("instructions", 0) for program in programs)
+
+    return {
+        "programs": programs,
+        "summary": {
+            "programs": len(programs),
+            "errors": sum("error" in program for program in programs),
+            "stop_reasons": {reason.value: sum(program.get("stop_reason") == reason.value for program in programs) for reason in StopReason},
+            "instructions": executed,
+            "seconds": elapsed,
+            "instructions_per_second": executed / elapsed if elapsed else None,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path, help="The directory of programs and ROMs to run")
+    parser.add_argument("-o", "--output", type=Path, help="Where to write the JSON report (default stdout)")
+    parser.add_argument("-i", "--instructions", type=int, default=10_000_000, help="The instruction budget for each program")
+    parser.add_argument("-c", "--cycles", type=int, default=sys.maxsize, help="The cycle budget for each program")
+    parser.add_argument("-p", "--program-offset", type=lambda value: int(value, 0), default=0x0600, help="Where raw programs are loaded")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="The number of worker processes")
+    parser.add_argument("-t", "--translate", action="store_true", help="Run through the basic block translator rather than the interpreter")
+    parser.add_argument("-f", "--fast-forward", action="store_true", help="Skip idle loops")
+
+    args = parser.parse_args()
+
+    report = run_batch(
+        find_programs(args.directory),
+        instructions=args.instructions,
+        cycles=args.cycles,
+        program_offset=args.program_offset,
+        translate=args.translate,
+        fast_forward=args.fast_forward,
+        workers=args.workers,
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,99 @@
+"""
+Measures the throughput of the CPU in instructions per second.
+
+The snake program is run headless (no pygame window and no input) until the snake runs into a wall and the program
+hits BRK. The instruction count is taken from a first run with a counting callback and the timing from subsequent
+runs with no callback, so the number reported is the speed of the bare execution loop. With --translate the program
+runs through the basic block translator instead of the interpreter, with --fast-forward idle loops are skipped.
+
+With --trace the program is also run without a trace, and the cost of tracing is reported as how much slower the
+traced run is - with --max-trace-overhead the benchmark fails when it's over the given percentage, so the trace stays
+cheap enough to leave on.
+
+With --startup the time taken to construct a CPU is measured instead.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from cpu import CPU  # noqa: E402
+from memory import Memory  # noqa: E402
+from snake import SnakeGame  # noqa: E402
+
+
+def count_instructions(program: List[int], program_offset: int) -> int:
+    executed = 0
+
+    def callback() -> None:
+        nonlocal executed
+        executed += 1
+
+    cpu = CPU(callback=callback, program_offset=program_offset)
+    cpu.load_and_run(program)
+
+    return executed
+
+
+def instructions_per_second(program: List[int], program_offset: int = 0x0600, repeat: int = 20, translate: bool = False, fast_forward: bool = False, trace: int = 0) -> float:
+    instructions = count_instructions(program, program_offset)
+
+    # the CPU (and so the translators block cache) is kept between runs, the best run is then the speed of the
+    # translated code rather than of the translation
+    cpu = CPU(program_offset=program_offset, translate=translate, fast_forward=fast_forward, trace=trace)
+
+    best = float("inf")
+    for _ in range(repeat):
+        cpu.memory = Memory()
+        cpu.pre_load(program)
+
+        # a single batch covering the whole program - the translator (when enabled) is only used by execute
+        start = time.perf_counter()
+        cpu.execute(sys.maxsize)
+        best = min(best, time.perf_counter() - start)
+
+    return instructions / best
+
+
+def construction_time(repeat: int = 20, number: int = 200) -> float:
+    """The time it takes to construct a CPU in seconds, the best of repeat timings of number CPUs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            CPU()
+
+        best = min(best, (time.perf_counter() - start) / number)
+
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="The number of timed runs, the fastest is reported")
+    parser.add_argument("-t", "--translate", action="store_true", help="Run through the basic block translator rather than the interpreter")
+    parser.add_argument("-f", "--fast-forward", action="store_true", help="Skip idle loops")
+    parser.add_argument("--trace", type=int, default=0, help="Record the last TRACE instructions, see the tracer module")
+    parser.add_argument("--max-trace-overhead", type=float, help="Fail if tracing makes the CPU more than this many percent slower")
+    parser.add_argument("-s", "--startup", action="store_true", help="Measure how long constructing a CPU takes instead")
+
+    args = parser.parse_args()
+
+    if args.startup:
+        print(f"{construction_time(repeat=args.repeat) * 1e6:,.1f} us per CPU()")
+        exit(0)
+
+    speed = instructions_per_second(SnakeGame.CODE, repeat=args.repeat, translate=args.translate, fast_forward=args.fast_forward, trace=args.trace)
+    print(f"{speed:,.0f} instructions/s")
+
+    if args.trace:
+        untraced = instructions_per_second(SnakeGame.CODE, repeat=args.repeat, translate=args.translate, fast_forward=args.fast_forward)
+        overhead = (untraced / speed - 1) * 100
+        print(f"{untraced:,.0f} instructions/s without the trace, tracing costs {overhead:.0f}%")
+
+        if args.max_trace_overhead is not None and overhead > args.max_trace_overhead:
+            print(f"Tracing costs more than {args.max_trace_overhead:.0f}%", file=sys.stderr)
+            exit(1)
@@ -1,9 +1,147 @@
-import sys
+import mmap
+from functools import lru_cache
 from logging import Logger
+from types import TracebackType
+from typing import Optional, Tuple, Type, Union
 from pydantic import FilePath
-from constants import HEX_8, HEX_16, KB, CartridgeFormat, HeaderFlags6, HeaderFlags9iNES
+from constants import HEX_8, HEX_16, KB, CartridgeFormat, HeaderFlags6, HeaderFlags9iNES, Mirroring
 from logger import get_logger
 
+MAGIC: bytes = b"NES\x1a"
+HEADER_SIZE: int = HEX_16
+TRAINER_SIZE: int = 0x200
+PROGRAM_ROM_BANK_SIZE: int = HEX_16 * KB
+CHARACTER_ROM_BANK_SIZE: int = HEX_8 * KB
+
+
+class RomHeader:
+    """The 16 byte header at the start of an iNES or NES2.0 ROM, parsed - see parse_header.
+
+    https://www.nesdev.org/wiki/INES
+    https://www.nesdev.org/wiki/NES_2.0
+    """
+
+    __slots__ = (
+        "type",
+        "mapper",
+        "flags_6",
+        "mirroring",
+        "trainer",
+        "program_rom_size_multiplier",
+        "program_rom_size",
+        "character_rom_size_multiplier",
+        "character_rom_size",
+        "program_rom_start",
+        "character_rom_start",
+        "end",
+    )
+
+    type: CartridgeFormat
+    mapper: int
+    flags_6: int
+    mirroring: Mirroring
+    trainer: bool
+    program_rom_size_multiplier: int
+    program_rom_size: int
+    character_rom_size_multiplier: int
+    character_rom_size: int
+    program_rom_start: int
+    character_rom_start: int
+    end: int
+
+    def __init__(self, header: bytes, size: int) -> None:
+        self.type = self.identify(header, size)
+
+        self.flags_6 = header[6]
+        if self.flags_6 & HeaderFlags6.IGNORE_MIRRORING.value:
+            self.mirroring = Mirroring.FOUR_SCREEN
+        elif self.flags_6 & HeaderFlags6.MIRRORING_VERTICAL.value:
+            self.mirroring = Mirroring.VERTICAL
+        else:
+            self.mirroring = Mirroring.HORIZONTAL
+        self.trainer = bool(self.flags_6 & HeaderFlags6.TRAINER.value)
+
+        # archaic iNES ROMs can have garbage in bytes 7-15 (i.e. "DiskDude!"), so only the lower nybble is used
+        self.mapper = self.flags_6 >> 4
+        if self.type != CartridgeFormat.archaicines:
+            self.mapper |= header[7] & 0xF0
+        if self.type == CartridgeFormat.nes20:
+            self.mapper |= (header[8] & 0x0F) << 8
+
+        self.program_rom_size_multiplier, self.program_rom_size = self.rom_size(header, 4, header[9] & 0x0F, PROGRAM_ROM_BANK_SIZE)
+        self.character_rom_size_multiplier, self.character_rom_size = self.rom_size(header, 5, header[9] >> 4, CHARACTER_ROM_BANK_SIZE)
+
+        # PRG ROM follows the header (and the trainer if there is one), CHR ROM follows the PRG ROM
+        self.program_rom_start = HEADER_SIZE + (TRAINER_SIZE if self.trainer else 0)
+        self.character_rom_start = self.program_rom_start + self.program_rom_size
+        self.end = self.character_rom_start + self.character_rom_size
+
+    def rom_size(self, header: bytes, index: int, msb: int, bank_size: int) -> Tuple[int, int]:
+        """The number of banks and the size in bytes of the PRG or CHR ROM.
+
+        Args:
+            header (bytes): The header
+            index (int): The byte holding the number of banks, 4 for PRG and 5 for CHR
+            msb (int): The NES2.0 most significant nybble of the number of banks from byte 9
+            bank_size (int): The size of a bank
+
+        Returns:
+            Tuple[int, int]: The number of banks and the size in bytes
+        """
+        if self.type != CartridgeFormat.nes20:
+            return header[index], header[index] * bank_size
+
+        # NES2.0 sizes that aren't a multiple of the bank size are written as 2^exponent * (multiplier * 2 + 1) bytes
+        if msb == 0x0F:
+            size = (1 << (header[index] >> 2)) * ((header[index] & 0x03) * 2 + 1)
+            return size // bank_size, size
+
+        multiplier = msb << 8 | header[index]
+        return multiplier, multiplier * bank_size
+
+    @staticmethod
+    def identify(header: bytes, size: int) -> CartridgeFormat:
+        """Recommended detection procedure:
+
+        If byte 7 AND $0C = $08, and the size taking into account byte 9 does not exceed the actual size of the ROM
+            image, then NES 2.0.
+        If byte 7 AND $0C = $04, archaic iNES.
+        If byte 7 AND $0C = $00, and bytes 12-15 are all 0, then iNES.
+        Otherwise, iNES 0.7 or archaic iNES.
+        """
+        if (header[7] & 0x0C) == 0x08:
+            program_rom_size = ((header[9] & 0x0F) << 8 | header[4]) * PROGRAM_ROM_BANK_SIZE
+            character_rom_size = ((header[9] >> 4) << 8 | header[5]) * CHARACTER_ROM_BANK_SIZE
+            # the exponent-multiplier notation is only used by odd sized ROMs, the size can't be checked up front
+            if (header[9] & 0x0F) == 0x0F or (header[9] >> 4) == 0x0F or HEADER_SIZE + program_rom_size + character_rom_size <= size:
+                return CartridgeFormat.nes20
+
+        if (header[7] & 0x0C) == 0x04:
+            return CartridgeFormat.archaicines
+
+        if (header[7] & 0x0C) == 0x00 and not any(header[12:16]):
+            return CartridgeFormat.ines
+
+        return CartridgeFormat.ines07
+
+
+@lru_cache(maxsize=None)
+def parse_header(header: bytes, size: int) -> RomHeader:
+    """Parse a ROM header - the result is cached on the header and the size of the ROM, so opening the same ROM any
+    number of times only parses it once.
+
+    Args:
+        header (bytes): The first 16 bytes of the ROM
+        size (int): The size of the ROM in bytes
+
+    Returns:
+        RomHeader: The parsed header
+    """
+    if len(header) != HEADER_SIZE or header[:4] != MAGIC:
+        raise ValueError("Not an iNES or NES2.0 header")
+
+    return RomHeader(header, size)
+
 
 class Cartridge:
     """A class that defines the specification of a 'virtual' cartridge - fundamentally it implements whats defined
@@ -15,8 +153,15 @@ class Cartridge:
     * Loads the rom from a file and determines if the file provided is valid
     * utilising the header determine the size of the PGR and CHR ROM
 
+    The ROM is read once and the PRG and CHR ROM are zero-copy read-only memoryviews into it. With memory_map the file
+    is mmap'ed rather than read, so its pages are loaded on demand and shared (through the page cache) between every
+    emulator that has the same ROM open, rather than each holding its own copy.
+
+    Close the cartridge (or use it as a context manager) once it's done with to unmap the ROM - see close.
+
     Raises:
-        Exception: if the specified rom file is not determined to be in the iiNES or NES2.0 format
+        ValueError: if the specified rom file is not determined to be in the iNES or NES2.0 format, or is shorter than
+            its header says
 
     Returns:
         Cartridge
@@ -24,79 +169,132 @@ class Cartridge:
 
     logger: Logger
     rom_path: FilePath
-    raw_bytes: bytearray
+    memory_map: bool
+    # the ROM as read, or mapped
+    rom: Union[bytes, mmap.mmap]
+    raw_bytes: memoryview
 
     type: CartridgeFormat
-    header: bytearray
-    program_rom: bytearray
-    character_rom: bytearray
+    rom_header: RomHeader
+    header: memoryview
+    program_rom: memoryview
+    character_rom: memoryview
     program_rom_size: int
     character_rom_size: int
     program_rom_size_multiplier: int
     character_rom_size_multiplier: int
+    mapper: int
 
-    def __init__(self, rom_path: FilePath) -> None:
+    def __init__(self, rom_path: FilePath, memory_map: bool = False) -> None:
         self.logger = get_logger(self.__class__.__name__)
 
         self.rom_path = rom_path
+        self.memory_map = memory_map
         self.raw_bytes = self.validate(self.rom_path)
-        self.type = self.identify()
 
-        self.logger.debug(f"The ROM at {self.rom_path} is of type {self.type}")
+        self.header = self.raw_bytes[:HEADER_SIZE]
+        self.rom_header = parse_header(bytes(self.header), len(self.raw_bytes))
+        self.type = self.rom_header.type
 
-        self.header = self.raw_bytes[:HEX_16]
+        self.logger.debug("The ROM at %s is of type %s", self.rom_path, self.type)
 
-        self.program_rom_size_multiplier = self.header[4]
-        self.program_rom_size = self.program_rom_size_multiplier * HEX_16
+        self.program_rom_size_multiplier = self.rom_header.program_rom_size_multiplier
+        self.program_rom_size = self.rom_header.program_rom_size
 
-        self.character_rom_size_multiplier = self.header[5]
-        self.character_rom_size = self.character_rom_size_multiplier * HEX_8
+        self.character_rom_size_multiplier = self.rom_header.character_rom_size_multiplier
+        self.character_rom_size = self.rom_header.character_rom_size
 
-        self.logger.debug(f"The PRG ROM size is {int(self.program_rom_size_multiplier)}x16Kb = {hex(self.program_rom_size)}")
-        self.logger.debug(f"The CHR ROM size is {int(self.character_rom_size_multiplier)}x8Kb = {hex(self.character_rom_size)}")
+        self.mapper = self.rom_header.mapper
+
+        self.logger.debug("The PRG ROM size is %dx16Kb = %#x", self.program_rom_size_multiplier, self.program_rom_size)
+        self.logger.debug("The CHR ROM size is %dx8Kb = %#x", self.character_rom_size_multiplier, self.character_rom_size)
 
         if self.type in [CartridgeFormat.ines, CartridgeFormat.ines07]:
             self.logger.debug(HeaderFlags6(self.header[6]))
             self.logger.debug(HeaderFlags9iNES(self.header[9]))
 
-        # PRG ROM is contained in 16Kb chunks after the header
-        self.program_rom = self.raw_bytes[HEX_16 : (HEX_16 * KB) * self.program_rom_size_multiplier]
+        if len(self.raw_bytes) < self.rom_header.end:
+            self.logger.critical("The provided ROM file %s is truncated", rom_path)
+            raise ValueError(f"The ROM file {rom_path} is {len(self.raw_bytes)} bytes, its header says {self.rom_header.end}")
+
+        # PRG ROM is contained in 16Kb chunks after the header (and trainer)
+        self.program_rom = self.raw_bytes[self.rom_header.program_rom_start : self.rom_header.character_rom_start]
 
         # CHR ROM is contained in 8kb chunks after the header and the PGR ROM
-        self.character_rom = self.raw_bytes[HEX_16 + (HEX_16 * KB) * self.program_rom_size_multiplier : (HEX_8 * KB) * self.character_rom_size_multiplier]
+        self.character_rom = self.raw_bytes[self.rom_header.character_rom_start : self.rom_header.end]
 
-    def validate(self, rom_path: FilePath) -> bytearray:
+    def validate(self, rom_path: FilePath) -> memoryview:
         # Only accept either iNes or NES2.0 type files
         # https://www.nesdev.org/wiki/NES_2.0
-
-        with open(rom_path, "rb") as _raw_bytes:
-            raw_bytes = _raw_bytes.read()
+        self.rom = self.open(rom_path)
 
         # this is true of ALL the NES rom formats - if this true then the ROM file provided is upto spec
-        if not (chr(raw_bytes[0]) == "N" and chr(raw_bytes[1]) == "E" and chr(raw_bytes[2]) == "S" and raw_bytes[3] == 0x1A):
-            self.logger.critical(f"The provided ROM file {rom_path} can't be identified")
-            sys.exit(1)
+        if len(self.rom) < HEADER_SIZE or self.rom[:4] != MAGIC:
+            self.logger.critical("The provided ROM file %s can't be identified", rom_path)
+            raise ValueError(f"The ROM file {rom_path} is not in the iNES or NES2.0 format")
 
-        return bytearray(raw_bytes)
+        return memoryview(self.rom)
 
-    def identify(self) -> CartridgeFormat:
-        """Recommended detection procedure:
+    def open(self, rom_path: FilePath) -> Union[bytes, mmap.mmap]:
+        with open(rom_path, "rb") as rom_file:
+            if not self.memory_map:
+                return rom_file.read()
 
-        If byte 7 AND $0C = $08, and the size taking into account byte 9 does not exceed the actual size of the ROM
-            image, then NES 2.0.
-        If byte 7 AND $0C = $04, archaic iNES.
-        If byte 7 AND $0C = $00, and bytes 12-15 are all 0, then iNES.
-        Otherwise, iNES 0.7 or archaic iNES.
+            # the mapping outlives the file being closed, an empty file can't be mapped
+            try:
+                return mmap.mmap(rom_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return b""
+
+    def close(self) -> None:
+        """Release the views of the ROM and unmap a memory mapped one - the PRG and CHR ROM can't be used after.
+
+        The views a mapper took of the ROM when the cartridge was loaded keep the mapping alive, it's unmapped once the
+        last of them goes rather than pulled out from under the memory they're mapped into.
+        """
+        for view in (self.header, self.program_rom, self.character_rom, self.raw_bytes):
+            view.release()
+
+        if isinstance(self.rom, mmap.mmap):
+            try:
+                self.rom.close()
+            except BufferError:
+                self.logger.debug("The ROM at %s is still mapped into memory, it's unmapped with the memory", self.rom_path)
+
+    def __enter__(self) -> "Cartridge":
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def program_rom_bank(self, bank: int, size: int = PROGRAM_ROM_BANK_SIZE) -> memoryview:
+        """A zero-copy view of a bank of PRG ROM - the bank number wraps around the ROM like the address lines would.
+
+        Args:
+            bank (int): The bank number
+            size (int): The size of a bank
+
+        Returns:
+            memoryview: The bank
         """
-        type = CartridgeFormat.ines07
+        start = (bank * size) % len(self.program_rom)
+        return self.program_rom[start : start + size]
 
-        if (self.raw_bytes[7] & 0x0C) == 0x08:
-            type = CartridgeFormat.nes20
+    def character_rom_bank(self, bank: int, size: int = CHARACTER_ROM_BANK_SIZE) -> memoryview:
+        """A zero-copy view of a bank of CHR ROM - the bank number wraps around the ROM like the address lines would.
 
-        if (self.raw_bytes[7] & 0x0C) == 0x04:
-            type = CartridgeFormat.archaicines
+        Args:
+            bank (int): The bank number
+            size (int): The size of a bank
 
-        if (self.raw_bytes[7] & 0x0C) == 0x00 and self.raw_bytes[13] == 0x00 and self.raw_bytes[14] == 0x00 and self.raw_bytes[15] == 0x00 and self.raw_bytes[16] == 0x00:
-            type = CartridgeFormat.ines
+        Raises:
+            ValueError: if the cartridge has CHR RAM rather than CHR ROM, the mapper holds the RAM
+
+        Returns:
+            memoryview: The bank
+        """
+        if not len(self.character_rom):
+            raise ValueError(f"The ROM {self.rom_path} has CHR RAM, there are no CHR ROM banks")
 
-        return type
+        start = (bank * size) % len(self.character_rom)
+        return self.character_rom[start : start + size]
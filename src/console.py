@@ -1,22 +1,92 @@
 import argparse
+import sys
 from pathlib import Path
+from types import TracebackType
+from typing import Optional, Type
 from cartridge import Cartridge
+from constants import StopReason
 from cpu import CPU
+from mappers import Mapper, create_mapper
 from memory import Memory
+from ppu import PPU
 
 
 class Console:
     cartrige: Cartridge
     memory: Memory
+    mapper: Mapper
+    ppu: PPU
     cpu: CPU
 
-    def __init__(self, rom_path: Path) -> None:
-        self.cartrige = Cartridge(rom_path=rom_path)
-        self.memory = Memory()
-        self.cpu = CPU(self.memory)
+    def __init__(self, rom_path: Path, translate: bool = False, fast_forward: bool = False, memory_map: bool = False, trace: int = 0) -> None:
+        self.cartrige = Cartridge(rom_path=rom_path, memory_map=memory_map)
+        self.memory = Memory(has_bus=True)
+        self.cpu = CPU(memory=self.memory, translate=translate, fast_forward=fast_forward, trace=trace)
 
     def load_cartridge(self) -> None:
-        self.memory.load_cartridge(self.cartrige)
+        self.mapper = create_mapper(self.cartrige, self.memory)
+        self.ppu = PPU(self.mapper, self.memory, self.cpu)
+        # the reset vector lives in the cartridge's PRG-ROM
+        self.cpu.reset()
+
+    def close(self) -> None:
+        """Close the cartridge - see Cartridge.close"""
+        self.cartrige.close()
+
+    def __enter__(self) -> "Console":
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def run_frame(self, instructions: int = sys.maxsize, until_cycles: int = sys.maxsize) -> StopReason:
+        """Run the CPU until the PPU has finished a frame and entered vblank.
+
+        The CPU runs in batches up to the PPU's next deadline, the PPU catches up at the end of each one and an NMI it
+        raised (or an IRQ the mapper holds) is taken before the next. The PPU catches up by itself whenever the CPU
+        touches its registers in between. An NMI enabled during vblank is only taken at the next deadline, as is an IRQ
+        held while interrupts were disabled.
+
+        Args:
+            instructions (int): Stop once this many instructions have been executed
+            until_cycles (int): Stop once the CPU's cycle counter reaches this value
+
+        Returns:
+            StopReason: CYCLE_BUDGET once the frame is done (or the cycle counter reached until_cycles), or why the CPU
+                stopped before then
+        """
+        cpu = self.cpu
+        ppu = self.ppu
+        frame = ppu.frame
+        end = cpu.executed + instructions
+
+        while ppu.frame == frame:
+            reason = cpu.execute(end - cpu.executed, until_cycles=min(ppu.next_deadline(), until_cycles))
+            ppu.catch_up()
+
+            if ppu.nmi:
+                ppu.nmi = False
+                cpu.nmi()
+
+            # the NMI handler starts with interrupts disabled, so the IRQ waits for it
+            if self.mapper.irq:
+                cpu.irq()
+
+            if reason != StopReason.CYCLE_BUDGET or cpu.cycles >= until_cycles:
+                return reason
+
+        return StopReason.CYCLE_BUDGET
+
+    def run(self, instructions: int = sys.maxsize, until_cycles: int = sys.maxsize) -> StopReason:
+        """Run frames until the CPU stops, or the instruction or cycle budget runs out - see run_frame"""
+        cpu = self.cpu
+        end = cpu.executed + instructions
+
+        while (reason := self.run_frame(end - cpu.executed, until_cycles)) == StopReason.CYCLE_BUDGET:
+            if cpu.cycles >= until_cycles:
+                break
+
+        return reason
 
 
 if __name__ == "__main__":
@@ -27,11 +97,12 @@ if __name__ == "__main__":
         type=str,
         help="The filepath of the rom being loaded into the cartridge",
     )
+    parser.add_argument("-m", "--memory-map", action="store_true", help="mmap the ROM file rather than reading it into memory")
 
     args = parser.parse_args()
-    console = Console(**args.__dict__)
-    console.load_cartridge()
-    console.cpu.run()
+    with Console(**args.__dict__) as console:
+        console.load_cartridge()
+        console.run()
 
     # if __name__ == "__main__":
 #     app = StopwatchApp()
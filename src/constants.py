@@ -1,4 +1,5 @@
 from enum import STRICT, Enum, Flag, IntFlag, auto
+from typing import List
 
 
 class Flags(IntFlag, boundary=STRICT):
@@ -27,6 +28,22 @@ class Flags(IntFlag, boundary=STRICT):
     NEGATIVE = auto()
 
 
+# The status flags as plain ints - the CPU keeps its status register as an int and only converts to Flags at the API
+# edge, as every IntFlag operation builds a new enum instance.
+FLAG_CARRY: int = Flags.CARRY.value
+FLAG_ZERO: int = Flags.ZERO.value
+FLAG_INTERRUPT_DISABLE: int = Flags.INTERRUPT_DISABLE.value
+FLAG_DECIMAL: int = Flags.DECIMAL.value
+FLAG_BREAK: int = Flags.BREAK.value
+FLAG_UNUSED: int = Flags.UNUSED.value
+FLAG_OVERFLOW: int = Flags.OVERFLOW.value
+FLAG_NEGATIVE: int = Flags.NEGATIVE.value
+
+# The zero and negative flags for every 8 bit result, so updating them is a single mask-and-or
+ZERO_NEGATIVE_FLAGS: List[int] = [FLAG_ZERO if value == 0 else value & FLAG_NEGATIVE for value in range(0x100)]
+CLEAR_ZERO_NEGATIVE: int = 0xFF & ~(FLAG_ZERO | FLAG_NEGATIVE)
+
+
 class AddressingMode(Enum):
     IMMEDIATE = "IMMEDIATE"
     ZERO_PAGE = "ZERO_PAGE"
@@ -43,6 +60,22 @@ class AddressingMode(Enum):
     ABSOLUTE_INDIRECT = "ABSOLUTE_INDIRECT"
 
 
+class StopReason(str, Enum):
+    """Why a batch of CPU instructions stopped executing"""
+
+    BRK = "BRK"
+    UNDEFINED_OPCODE = "UNDEFINED_OPCODE"
+    INSTRUCTION_BUDGET = "INSTRUCTION_BUDGET"
+    CYCLE_BUDGET = "CYCLE_BUDGET"
+    PROGRAM_COUNTER = "PROGRAM_COUNTER"
+
+
+# sizes - the iNES header is 16 bytes, PRG-ROM comes in 16KiB banks and CHR-ROM in 8KiB banks
+KB: int = 0x400
+HEX_8: int = 0x08
+HEX_16: int = 0x10
+
+
 class CartridgeFormat(str, Enum):
     ines = "iNES1.0"
     nes20 = "NES2.0"
@@ -50,6 +83,16 @@ class CartridgeFormat(str, Enum):
     archaicines = "ArchaiciNES"
 
 
+class Mirroring(str, Enum):
+    """How the PPU's 2KiB of nametable RAM is arranged across its four nametables"""
+
+    HORIZONTAL = "HORIZONTAL"
+    VERTICAL = "VERTICAL"
+    SINGLE_LOWER = "SINGLE_LOWER"
+    SINGLE_UPPER = "SINGLE_UPPER"
+    FOUR_SCREEN = "FOUR_SCREEN"
+
+
 class HeaderFlags6(Flag):
     """Flags 6
 
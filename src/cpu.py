@@ -1,45 +1,154 @@
+import struct
 import sys
-from copy import copy
-from typing import Any, Callable, Dict, List, Optional, Union
-from constants import AddressingMode, Flags
+from functools import partial
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+from addressing import ADDRESS_RESOLVERS, Resolver
+from constants import (
+    CLEAR_ZERO_NEGATIVE,
+    FLAG_BREAK,
+    FLAG_CARRY,
+    FLAG_DECIMAL,
+    FLAG_INTERRUPT_DISABLE,
+    FLAG_NEGATIVE,
+    FLAG_OVERFLOW,
+    FLAG_UNUSED,
+    FLAG_ZERO,
+    ZERO_NEGATIVE_FLAGS,
+    AddressingMode,
+    Flags,
+    StopReason,
+)
+from disassembler import Disassembler, write_listing
+from idle import IdleLoops
 from logger import get_logger
 from memory import Memory
-from opcodes import Opcode
+from opcodes import INSTRUCTIONS, OPCODES, Opcode
+from tracer import Trace
+from translator import Translator
 
 logger = get_logger(__name__)
 
+# save states - the registers followed by the memory snapshot
+SNAPSHOT_MAGIC: bytes = b"WYNS"
+SNAPSHOT_VERSION: int = 1
+# magic, version, a, x, y, status, stack pointer, program counter, cycles, executed
+SNAPSHOT_HEADER: struct.Struct = struct.Struct("<4sBBBBBHqQQ")
+
 
 # https://www.nesdev.org/obelisk-6502-guide/index.html
 class CPU:
     register_a: int
     register_x: int
     register_y: int
-    status: Flags
+    status: int
     program_counter: int
     memory: Memory
     stack_pointer: int
+    cycles: int
+    # the instructions run by execute (and the batch methods built on it) since the last reset
+    executed: int
 
-    opcodes: Dict[int, Opcode]
+    opcodes: Mapping[int, Opcode]
     opcode: Opcode | None
     program_len: int
 
+    instructions: Tuple[Optional[Opcode], ...]
+    dispatch: List[Optional[Callable[[], Any]]]
+    translator: Optional[Translator]
+    idle_loops: Optional[IdleLoops]
+    trace: Optional[Trace]
+
+    # maps each mnemonic onto the name of the method implementing it
+    HANDLERS: Dict[str, str] = {
+        "ADC": "adc",
+        "AND": "and_",
+        "ASL": "asl",
+        "BCC": "bcc",
+        "BCS": "bcs",
+        "BEQ": "beq",
+        "BIT": "bit",
+        "BMI": "bmi",
+        "BNE": "bne",
+        "BPL": "bpl",
+        "BRK": "brk",
+        "BVC": "bvc",
+        "BVS": "bvs",
+        "CLC": "clc",
+        "CLD": "cld",
+        "CLI": "cli",
+        "CLV": "clv",
+        "CMP": "cmp",
+        "CPX": "cpx",
+        "CPY": "cpy",
+        "DEC": "dec",
+        "DEX": "dex",
+        "DEY": "dey",
+        "EOR": "eor",
+        "INC": "inc",
+        "INX": "inx",
+        "INY": "iny",
+        "JMP": "jump",
+        "JSR": "jsr",
+        "LDA": "lda",
+        "LDX": "ldx",
+        "LDY": "ldy",
+        "LSR": "lsr",
+        "NOP": "nop",
+        "ORA": "ora",
+        "PHA": "pha",
+        "PHP": "php",
+        "PLA": "pla",
+        "PLP": "plp",
+        "ROL": "rol",
+        "ROR": "ror",
+        "RTI": "rti",
+        "RTS": "rts",
+        "SBC": "sbc",
+        "SEC": "sec",
+        "SED": "sed",
+        "SEI": "sei",
+        "STA": "sta",
+        "STX": "stx",
+        "STY": "sty",
+        "TAX": "tax",
+        "TAY": "tay",
+        "TSX": "tsx",
+        "TXA": "txa",
+        "TXS": "txs",
+        "TYA": "tya",
+    }
+
     def __init__(
         self,
         callback: Optional[Callable] = None,
         stack: int = 0x0100,
         program_offset: int = 0x8000,
+        memory: Optional[Memory] = None,
+        translate: bool = False,
+        fast_forward: bool = False,
+        trace: int = 0,
         **kwargs: Dict[str, Union[int, List[Flags]]],
     ):
         self.register_x = 0  # 8 bits
         self.register_a = 0  # 8 bits
-        self.status = Flags.UNUSED | Flags.BREAK  # 8 bits
+        self.register_y = 0  # 8 bits
+        self.status = FLAG_UNUSED | FLAG_BREAK  # 8 bits
 
         self.program_counter = 0x10
 
         self.stack_pointer = 0xFF
 
-        self.memory = Memory()
-        self.opcodes = Opcode.load_opcodes()
+        self.memory = memory if memory is not None else Memory()
+        # the opcode table is parsed once and shared between every CPU
+        self.opcodes = OPCODES
+        self.instructions = INSTRUCTIONS
+        self.dispatch = self.build_dispatch_table()
+        # opt-in - batches run through the basic block translator rather than the interpreter
+        self.translator = Translator(self) if translate else None
+        # opt-in - loops that only burn cycles (delay loops, polling an I/O register) are skipped to their exit state
+        self.idle_loops = IdleLoops() if fast_forward else None
+        # opt-in - the last `trace` instructions executed are recorded, see the tracer module
+        self.trace = Trace(self, trace) if trace else None
 
         self.callback = callback
 
@@ -49,6 +158,8 @@ class CPU:
 
         self.opcode = None
         self.program_len = 0
+        self.cycles = 0
+        self.executed = 0
 
     def load_kwargs(self, **kwargs: Dict[str, Union[int, List[Flags]]]) -> None:
         """Load the kwargs into the CPU object - mainly used for testing purposes
@@ -64,18 +175,24 @@ class CPU:
             if key == "status" and isinstance(value, list):
                 for flag in value:
                     self.set_flag(flag)
+            elif key == "status":
+                self.status = int(value)
             else:
                 setattr(self, key, value)
 
-    # Flag operations
+    # Flag operations - the status register is a plain int internally, these convert from Flags at the API edge
+    @property
+    def flags(self) -> Flags:
+        return Flags(self.status)
+
     def set_flag(self, flag: Flags) -> None:
-        self.status |= flag
+        self.status |= int(flag)
 
     def clear_flag(self, flag: Flags) -> None:
-        self.status &= ~flag
+        self.status &= ~int(flag)
 
     def get_flag(self, flag: Flags) -> bool:
-        return self.status & flag != 0
+        return self.status & int(flag) != 0
 
     def stack_pop(self) -> int:
         self.stack_pointer = (self.stack_pointer + 1) & 0xFFFF
@@ -97,64 +214,66 @@ class CPU:
 
         return hi << 8 | low
 
-    # Addressing
-    def read_with_offset(self, offset: int, u8: bool = True) -> int:
-        reader = self.memory.read_u16
-        width = 0xFFFF
-        if u8:
-            reader = self.memory.read
-            width = 0xFF
-
-        base = reader(self.program_counter)
-        addr = (base + offset) & width
-
-        return addr
-
-    def get_operand_address(self, mode: AddressingMode) -> Any:
-        match mode:
-            case AddressingMode.IMMEDIATE:
-                return self.program_counter
-
-            case AddressingMode.ZERO_PAGE:
-                return self.memory.read(self.program_counter)
-
-            case AddressingMode.ABSOLUTE:
-                return self.memory.read_u16(self.program_counter)
-
-            case AddressingMode.X_INDEXED_ZERO_PAGE:
-                return self.read_with_offset(self.register_x, u8=True)
+    def snapshot(self) -> bytes:
+        """Serialise the CPU (registers, cycle and instruction counters and memory) to a versioned binary blob - cheap
+        enough to take every frame.
 
-            case AddressingMode.Y_INDEXED_ZERO_PAGE:
-                return self.read_with_offset(self.register_y, u8=True)
-
-            case AddressingMode.X_INDEXED_ABSOLUTE:
-                return self.read_with_offset(self.register_x, u8=False)
-
-            case AddressingMode.Y_INDEXED_ABSOLUTE:
-                return self.read_with_offset(self.register_y, u8=False)
-
-            case AddressingMode.X_INDEXED_ZERO_PAGE_INDIRECT:
-                i = (self.memory.read(self.program_counter) + self.register_x) & 0xFF
-                address = ((self.memory.read((i + 1) & 0xFF) << 8) + self.memory.read(i)) & 0xFFFF
-                return address
-
-            case AddressingMode.ZERO_PAGE_INDIRECT_Y_INDEXED:
-                i = self.memory.read(self.program_counter)
-                address = (self.memory.read(i) + (self.memory.read((i + 1) & 0xFF) << 8) + self.register_y) & 0xFFFF
-
-                return address
-
-            case AddressingMode.RELATIVE:
-                return self.memory.read(self.program_counter)
+        Returns:
+            bytes: The snapshot
+        """
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            self.register_a,
+            self.register_x,
+            self.register_y,
+            self.status,
+            self.stack_pointer,
+            self.program_counter,
+            self.cycles,
+            self.executed,
+        )
+
+        return header + self.memory.snapshot()
+
+    def restore(self, snapshot: Union[bytes, memoryview]) -> None:
+        """Restore the CPU from a snapshot taken by CPU.snapshot - memory is restored in place.
 
-            case AddressingMode.ACCUMULATOR:
-                return self.register_a
+        Args:
+            snapshot (Union[bytes, memoryview]): The snapshot
 
-            case AddressingMode.IMPLIED:
-                return None
+        Returns:
+            None
+        """
+        view = memoryview(snapshot)
+        if len(view) < SNAPSHOT_HEADER.size:
+            raise ValueError("Not a CPU snapshot: too short")
+
+        magic, version, *registers = SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a CPU snapshot")
+
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported CPU snapshot version {version}, expected {SNAPSHOT_VERSION}")
+
+        # memory first - it checks the rest of the snapshot before anything is changed
+        self.memory.restore(view[SNAPSHOT_HEADER.size :])
+
+        (
+            self.register_a,
+            self.register_x,
+            self.register_y,
+            self.status,
+            self.stack_pointer,
+            self.program_counter,
+            self.cycles,
+            self.executed,
+        ) = registers
+        self.opcode = None
 
-            case AddressingMode.ABSOLUTE_INDIRECT:
-                return None
+    # Addressing
+    def get_operand_address(self, mode: AddressingMode) -> Any:
+        return ADDRESS_RESOLVERS[mode](self)
 
     def pre_load(self, program: List[int], **kwargs: Dict[str, Union[int, List[Flags]]]) -> None:
         self.program_len = len(program)
@@ -177,398 +296,253 @@ class CPU:
         self.register_a = 0
         self.register_y = 0
         self.register_x = 0
-        self.status = Flags.UNUSED | Flags.BREAK
+        self.status = FLAG_UNUSED | FLAG_BREAK
         self.stack_pointer = 0xFF
         self.program_counter = self.memory.read_u16(0xFFFC)
         self.opcode = None
+        # the reset sequence takes 7 cycles before the first instruction is fetched
+        self.cycles = 7
+        self.executed = 0
 
         self.load_kwargs(**kwargs)
 
     def update_negative_flag(self, result: int):
-        if result & 0x80:
-            self.set_flag(Flags.NEGATIVE)
-        else:
-            self.clear_flag(Flags.NEGATIVE)
+        # the negative flag is bit 7 of the status register, so it's copied straight from the result
+        self.status = (self.status & ~FLAG_NEGATIVE) | (result & FLAG_NEGATIVE)
 
     def update_zero_and_negative_flags(self, result: int):
-        # Set zero flag if a is 0
-        if result == 0:
-            self.set_flag(Flags.ZERO)
-        else:
-            self.clear_flag(Flags.ZERO)
-
-        self.update_negative_flag(result)
+        self.status = (self.status & CLEAR_ZERO_NEGATIVE) | ZERO_NEGATIVE_FLAGS[result & 0xFF]
 
     def deassemble(self) -> None:
-        intial_pc = self.program_counter
-        tick = 1
+        """Print a listing of the loaded program - see the disassembler module"""
+        disassembler = Disassembler.from_memory(self.memory, self.program_counter, self.program_counter + self.program_len)
+        write_listing(disassembler.linear())
+
+    def build_dispatch_table(self) -> List[Optional[Callable[[], Any]]]:
+        """Build the 256 entry dispatch table indexed by the opcode byte.
+
+        Each entry is the instruction handler pre-bound to the opcodes address resolver, so executing an instruction is a
+        single list index and call. Accumulator forms get their own handler rather than checking the addressing mode
+        at runtime. Bytes that aren't a defined opcode are left as None.
+
+        Returns:
+            List[Optional[Callable[[], Any]]]: The dispatch table
+        """
+        table: List[Optional[Callable[[], Any]]] = [None] * 0x100
+        for code, opcode in self.opcodes.items():
+            name = self.HANDLERS[opcode.mnemonic.split()[0]]
+
+            if opcode.addressing_mode == AddressingMode.ACCUMULATOR:
+                table[code] = getattr(self, f"{name}_accumulator")
+            elif opcode.addressing_mode in (AddressingMode.IMPLIED, AddressingMode.RELATIVE):
+                table[code] = getattr(self, name)
+            else:
+                table[code] = partial(getattr(self, name), opcode.resolver)
+
+        return table
+
+    def run(self) -> Any:
+        memory = self.memory
+        dispatch = self.dispatch
+        instructions = self.instructions
+        trace = self.trace
+
         while True:
-            code = self.memory.read(self.program_counter)
-            self.program_counter += 1
-            program_counter_state = copy(self.program_counter)
-            self.opcode = self.opcodes.get(code)
+            program_counter = self.program_counter
+            code = memory.read(program_counter)
+            program_counter += 1
+            self.program_counter = program_counter
+
+            opcode = instructions[code]
 
-            if not self.opcode:
+            if opcode is None:
                 logger.info("undefined opcode")
                 sys.exit(-1)
 
-            self.opcode.opcode_params = self.get_operand_address(self.opcode.addressing_mode)
+            self.opcode = opcode
 
-            # string = self.mnemonic.replace("nn", f"{self.opcode_params:0{2}X}")
+            if trace is not None:
+                trace.record(program_counter - 1, code)
 
-            program_mem_string = f"{(self.program_counter - 1):#0{6}X}".replace("X", "x")
-            print(f"{program_mem_string}\t{tick}\t{self.opcode.string(self.memory)}")
+            if self.callback:
+                self.callback()
 
-            if program_counter_state == self.program_counter:
-                self.program_counter += self.opcode.length - 1
+            # only BRK returns a value - it signals the end of the program
+            if dispatch[code]():
+                return
 
-            # check if we have reached the end of the program
-            if (intial_pc + self.program_len) <= self.program_counter:
-                break
+            if program_counter == self.program_counter:
+                self.program_counter = program_counter + opcode.length - 1
 
-            tick += 1
+            self.cycles += opcode.cycles
 
-    def run(self) -> Any:
+    def step(self) -> int:
+        """Execute a single instruction.
+
+        Returns:
+            int: The number of cycles the instruction took (including any page crossing or branch penalty), or 0 if the
+                CPU stopped - on BRK or an undefined opcode
+        """
+        cycles = self.cycles
+
+        program_counter = self.program_counter
+        code = self.memory.read(program_counter)
+        program_counter += 1
+        self.program_counter = program_counter
+
+        opcode = self.instructions[code]
+
+        if opcode is None:
+            logger.info("undefined opcode")
+            return 0
+
+        self.opcode = opcode
+
+        if self.trace is not None:
+            self.trace.record(program_counter - 1, code)
+
+        if self.dispatch[code]():
+            return 0
+
+        if program_counter == self.program_counter:
+            self.program_counter = program_counter + opcode.length - 1
+
+        self.cycles += opcode.cycles
+
+        return self.cycles - cycles
+
+    def execute(self, instructions: int, until_pc: int = -1, until_cycles: int = sys.maxsize) -> StopReason:
+        """Execute a batch of instructions and hand control back to the host with the reason the batch stopped.
+
+        Unlike run, the callback (if set) is called once at the start of the batch rather than before every
+        instruction, and an undefined opcode stops the batch instead of exiting the process.
+
+        Args:
+            instructions (int): The maximum number of instructions to execute
+            until_pc (int): Stop before executing the instruction at this address
+            until_cycles (int): Stop before executing the next instruction once the cycle counter reaches this value
+
+        Returns:
+            StopReason: Why the batch stopped
+        """
+        if self.callback:
+            self.callback()
+
+        if self.idle_loops is not None:
+            self.idle_loops.batch += 1
+
+        if self.translator is not None:
+            return self.translator.execute(instructions, until_pc, until_cycles)
+
+        return self.interpret(instructions, until_pc, until_cycles)
+
+    def interpret(self, instructions: int, until_pc: int = -1, until_cycles: int = sys.maxsize) -> StopReason:
+        """The interpreter loop behind execute - fetches, decodes and dispatches one instruction at a time."""
+        memory = self.memory
+        dispatch = self.dispatch
+        table = self.instructions
+        idle_loops = self.idle_loops
+        trace = self.trace
+        ring = trace.ring if trace is not None else None
+        mask = trace.mask if trace is not None else 0
+
+        remaining = instructions
         while True:
-            code = self.memory.read(self.program_counter)
-            self.program_counter += 1
+            for executed in range(remaining):
+                program_counter = self.program_counter
 
-            program_counter_state = copy(self.program_counter)
-            self.opcode = self.opcodes.get(code)
+                if program_counter == until_pc:
+                    self.executed += instructions - remaining + executed
+                    return StopReason.PROGRAM_COUNTER
 
-            if not self.opcode:
-                logger.info("undefined opcode")
-                sys.exit(-1)
+                if self.cycles >= until_cycles:
+                    self.executed += instructions - remaining + executed
+                    return StopReason.CYCLE_BUDGET
 
-            if self.callback:
-                self.callback()
+                code = memory.read(program_counter)
+                program_counter += 1
+                self.program_counter = program_counter
+
+                opcode = table[code]
+
+                if opcode is None:
+                    logger.info("undefined opcode")
+                    self.executed += instructions - remaining + executed
+                    return StopReason.UNDEFINED_OPCODE
+
+                self.opcode = opcode
+
+                # Trace.record, inline
+                if ring is not None:
+                    recorded = trace.recorded
+                    ring[recorded & mask] = (program_counter - 1, code, self.register_a, self.register_x, self.register_y, self.status, self.stack_pointer, self.cycles)
+                    trace.recorded = recorded + 1
+
+                if dispatch[code]():
+                    self.executed += instructions - remaining + executed + 1
+                    return StopReason.BRK
 
-            # Opcodematch opcode.code:
-            match self.opcode.code:
-                # ADC
-                case 0x69 | 0x65 | 0x75 | 0x6D | 0x7D | 0x79 | 0x61 | 0x71:
-                    self.adc(self.opcode.addressing_mode)
-
-                # AND
-                case 0x29 | 0x25 | 0x35 | 0x2D | 0x3D | 0x39 | 0x21 | 0x31:
-                    self.and_(self.opcode.addressing_mode)
-
-                # ASL
-                case 0x0A | 0x06 | 0x16 | 0x0E | 0x1E:
-                    self.asl(self.opcode.addressing_mode)
-
-                # BCC
-                case 0x90:
-                    if not self.get_flag(Flags.CARRY):
-                        self.branch()
-
-                # BCS
-                case 0xB0:
-                    if self.get_flag(Flags.CARRY):
-                        self.branch()
-
-                # BEQ
-                case 0xF0:
-                    if self.get_flag(Flags.ZERO):
-                        self.branch()
-
-                # BIT
-                case 0x24 | 0x2C:
-                    self.bit(self.opcode.addressing_mode)
-
-                # BMI
-                case 0x30:
-                    if self.get_flag(Flags.NEGATIVE):
-                        self.branch()
-
-                # BNE
-                case 0xD0:
-                    if not self.get_flag(Flags.ZERO):
-                        self.branch()
-
-                # BPL
-                case 0x10:
-                    if not self.get_flag(Flags.NEGATIVE):
-                        self.branch()
-
-                # BREAK
-                case 0x00:
-                    return
-
-                # BVC
-                case 0x50:
-                    if not self.get_flag(Flags.OVERFLOW):
-                        self.branch()
-
-                # BVS
-                case 0x70:
-                    if self.get_flag(Flags.OVERFLOW):
-                        self.branch()
-
-                # CLC
-                case 0x18:
-                    self.clear_flag(Flags.CARRY)
-
-                # CLD
-                case 0xD8:
-                    self.clear_flag(Flags.DECIMAL)
-
-                # CLI
-                case 0x58:
-                    self.clear_flag(Flags.INTERRUPT_DISABLE)
-
-                # CLV
-                case 0xB8:
-                    self.clear_flag(Flags.OVERFLOW)
-
-                # CMP
-                case 0xC9 | 0xC5 | 0xD5 | 0xCD | 0xDD | 0xD9 | 0xC1 | 0xD1:
-                    self.compare(self.opcode.addressing_mode, self.register_a)
-
-                # CPX
-                case 0xE0 | 0xE4 | 0xEC:
-                    self.compare(self.opcode.addressing_mode, self.register_x)
-
-                # CPY
-                case 0xC0 | 0xC4 | 0xCC:
-                    self.compare(self.opcode.addressing_mode, self.register_y)
-
-                # DEC
-                case 0xC6 | 0xD6 | 0xCE | 0xDE:
-                    addr = self.get_operand_address(self.opcode.addressing_mode)
-                    value = self.memory.read(addr)
-                    value = (value - 1) & 0xFF
-                    self.update_zero_and_negative_flags(value)
-                    self.memory.write(addr, value)
-
-                # DEX
-                case 0xCA:
-                    self.register_x = (self.register_x - 1) & 0xFF
-                    self.update_zero_and_negative_flags(self.register_x)
-
-                # DEY
-                case 0x88:
-                    self.register_y = (self.register_y - 1) & 0xFF
-                    self.update_zero_and_negative_flags(self.register_y)
-
-                # EOR
-                case 0x49 | 0x45 | 0x55 | 0x4D | 0x5D | 0x59 | 0x41 | 0x51:
-                    addr = self.get_operand_address(self.opcode.addressing_mode)
-                    value = self.memory.read(addr)
-                    self.register_a ^= value
-                    self.update_zero_and_negative_flags(self.register_a)
-
-                # INC
-                case 0xE6 | 0xF6 | 0xEE | 0xFE:
-                    addr = self.get_operand_address(self.opcode.addressing_mode)
-                    value = self.memory.read(addr)
-                    value = (value + 1) & 0xFF
-                    self.memory.write(addr, value)
-                    self.update_zero_and_negative_flags(value)
-
-                # INX
-                case 0xE8:
-                    self.inx()
-
-                # INY
-                case 0xC8:
-                    self.register_y = (self.register_y + 1) & 0xFF
-                    self.update_zero_and_negative_flags(self.register_y)
-
-                # JMP ABSOLUTE
-                case 0x4C:
-                    mem_address = self.memory.read_u16(self.program_counter)
-                    self.program_counter = mem_address
-
-                # JMP INDIRECT
-                case 0x6C:
-                    mem_address = self.memory.read_u16(self.program_counter)
-
-                    if self.opcode.addressing_mode == AddressingMode.ABSOLUTE_INDIRECT:
-                        if mem_address & 0x00FF == 0x00FF:
-                            lo = self.memory.read(mem_address)
-                            hi = self.memory.read(mem_address & 0xFF00)
-                            indirect_ref = (hi << 8) | lo
-                        else:
-                            indirect_ref = self.memory.read_u16(mem_address)
-
-                        mem_address = indirect_ref
-
-                    self.program_counter = mem_address
-                # JSR
-                case 0x20:
-                    self.stack_push_u16(self.program_counter + 2 - 1)
-                    target_address = self.memory.read_u16(self.program_counter)
-                    self.program_counter = target_address
-
-                # LDA
-                case 0xA9 | 0xA5 | 0xB5 | 0xAD | 0xBD | 0xB9 | 0xA1 | 0xB1:
-                    addr = self.get_operand_address(self.opcode.addressing_mode)
-                    value = self.memory.read(addr)
-                    self.register_a = value
-                    self.update_zero_and_negative_flags(self.register_a)
-
-                # LDX
-                case 0xA2 | 0xA6 | 0xB6 | 0xAE | 0xBE:
-                    self.register_x = self.memory.read(self.get_operand_address(self.opcode.addressing_mode))
-                    self.update_zero_and_negative_flags(self.register_x)
-
-                # LDY
-                case 0xA0 | 0xA4 | 0xB4 | 0xAC | 0xBC:
-                    self.register_y = self.memory.read(self.get_operand_address(self.opcode.addressing_mode))
-                    self.update_zero_and_negative_flags(self.register_y)
-
-                # LSR
-                case 0x4A | 0x46 | 0x56 | 0x4E | 0x5E:
-                    self.lsr(self.opcode.addressing_mode)
-
-                # NOP
-                case 0xEA:
-                    pass
-
-                # ORA
-                case 0x09 | 0x05 | 0x15 | 0x0D | 0x1D | 0x19 | 0x01 | 0x11:
-                    addr = self.get_operand_address(self.opcode.addressing_mode)
-                    value = self.memory.read(addr)
-                    self.register_a |= value
-
-                # PHA
-                case 0x48:
-                    self.stack_push(self.register_a)
-
-                # PHP
-                case 0x08:
-                    # <//http://wiki.nesdev.com/w/index.php/CPU_status_flag_behavior
-                    flags = copy(self.status)
-                    flags = flags | Flags.BREAK | Flags.UNUSED
-                    self.stack_push(flags)
-
-                # PLA
-                case 0x68:
-                    self.register_a = self.stack_pop()
-
-                # PLP
-                case 0x28:
-                    self.status = Flags(self.stack_pop())
-                    self.clear_flag(Flags.BREAK)
-                    self.set_flag(Flags.UNUSED)
-
-                # ROL
-                case 0x2A | 0x26 | 0x36 | 0x2E | 0x3E:
-                    self.rol(self.opcode.addressing_mode)
-
-                # ROR
-                case 0x6A | 0x66 | 0x76 | 0x6E | 0x7E:
-                    self.ror(self.opcode.addressing_mode)
-
-                # RTI
-                case 0x40:
-                    self.status = self.stack_pop()
-                    self.clear_flag(Flags.BREAK)
-                    self.set_flag(Flags.UNUSED)
-
-                    self.program_counter = self.stack_pop_u16()
-
-                # RTS
-                case 0x60:
-                    self.program_counter = self.stack_pop_u16() + 1
-
-                # SBC
-                case 0xE9 | 0xE5 | 0xF5 | 0xED | 0xFD | 0xF9 | 0xE1 | 0xF1:
-                    self.sbc(self.opcode.addressing_mode)
-
-                # SEC
-                case 0x38:
-                    self.set_flag(Flags.CARRY)
-
-                # SED
-                case 0xF8:
-                    self.set_flag(Flags.DECIMAL)
-
-                # SEI
-                case 0x78:
-                    self.set_flag(Flags.INTERRUPT_DISABLE)
-
-                # STA
-                case 0x85 | 0x95 | 0x8D | 0x9D | 0x99 | 0x81 | 0x91:
-                    self.memory.write(self.get_operand_address(self.opcode.addressing_mode), self.register_a)
-
-                # STX
-                case 0x86 | 0x96 | 0x8E:
-                    self.memory.write(self.get_operand_address(self.opcode.addressing_mode), self.register_x)
-
-                # STY
-                case 0x84 | 0x94 | 0x8C:
-                    self.memory.write(self.get_operand_address(self.opcode.addressing_mode), self.register_y)
-
-                # TAX
-                case 0xAA:
-                    self.tax()
-
-                # TAY
-                case 0xA8:
-                    self.tay()
-
-                # TSX
-                case 0xBA:
-                    self.tsx()
-
-                # TXA
-                case 0x8A:
-                    self.txa()
-
-                # TXS
-                case 0x9A:
-                    self.txs()
-
-                # TYA
-                case 0x98:
-                    self.tya()
-
-                case _:
-                    logger.info("Not implemented")
-                    exit(-1)
-
-            if program_counter_state == self.program_counter:
-                self.program_counter += self.opcode.length - 1
+                if program_counter == self.program_counter:
+                    self.program_counter = program_counter + opcode.length - 1
 
-    def sbc(self, mode: AddressingMode) -> None:
-        addr = self.get_operand_address(mode)
+                self.cycles += opcode.cycles
+
+                # a jump backwards may have closed a loop that only burns cycles
+                if idle_loops is not None and self.program_counter < program_counter:
+                    skipped = idle_loops.skip(self, remaining - executed - 1, until_pc, until_cycles)
+                    if skipped:
+                        remaining -= executed + 1 + skipped
+                        break
+            else:
+                self.executed += instructions
+                return StopReason.INSTRUCTION_BUDGET
+
+    def run_for(self, instructions: int) -> StopReason:
+        """Execute up to the given number of instructions."""
+        return self.execute(instructions)
+
+    def run_until(self, program_counter: int, instructions: int = sys.maxsize) -> StopReason:
+        """Execute until the program counter reaches the given address (without executing the instruction there)."""
+        return self.execute(instructions, until_pc=program_counter)
+
+    def run_until_cycles(self, cycles: int) -> StopReason:
+        """Execute until the cycle counter reaches the given value, so other devices (PPU/APU) can be stepped in
+        lockstep with the CPU. The last instruction can overshoot the target by a few cycles."""
+        return self.execute(sys.maxsize, until_cycles=cycles)
+
+    def sbc(self, resolve: Resolver) -> None:
+        addr = resolve(self)
         value = self.memory.read(addr)
         self.add_to_register_a((value ^ 0xFF) & 0xFF)
 
-    def adc(self, mode: AddressingMode) -> None:
-        addr = self.get_operand_address(mode)
+    def adc(self, resolve: Resolver) -> None:
+        addr = resolve(self)
         value = self.memory.read(addr)
         self.add_to_register_a(value)
 
-    def and_(self, mode: AddressingMode) -> None:
-        addr = self.get_operand_address(mode)
+    def and_(self, resolve: Resolver) -> None:
+        addr = resolve(self)
         value = self.memory.read(addr)
 
         self.register_a &= value
 
         self.update_zero_and_negative_flags(self.register_a)
 
-    def asl(self, mode: AddressingMode) -> None:
-        addr = self.get_operand_address(mode)
-        if mode != AddressingMode.ACCUMULATOR:
-            value = self.memory.read(addr)
-        else:
-            value = copy(self.register_a)
+    def shift_left(self, value: int) -> int:
+        carry = value >> 7 & FLAG_CARRY
+        self.status = (self.status & ~FLAG_CARRY) | carry
 
-        if value >> 7 == 1:
-            self.set_flag(Flags.CARRY)
-        else:
-            self.clear_flag(Flags.CARRY)
+        return ((value << 1) | carry) & 0xFF
 
-        data = (value << 1) | self.get_flag(Flags.CARRY)
+    def asl(self, resolve: Resolver) -> None:
+        addr = resolve(self)
+        data = self.shift_left(self.memory.read(addr))
 
-        if mode == AddressingMode.ACCUMULATOR:
-            self.register_a = data
-        else:
-            self.update_negative_flag(data)
-            self.memory.write(addr, data)
+        self.update_negative_flag(data)
+        self.memory.write(addr, data)
+
+    def asl_accumulator(self) -> None:
+        self.register_a = self.shift_left(self.register_a)
 
     def unsigned_to_signed(self, unsigned_value: int, bit_width: int) -> int:
         max_signed_value = 2**bit_width - 1
@@ -582,107 +556,80 @@ class CPU:
         return unsigned_value
 
     def branch(self):
+        # the offset is relative to the instruction after the branch
+        next_instruction = self.program_counter + self.opcode.length - 1
         jump = self.memory.read(self.program_counter)
-        jump_address = self.unsigned_to_signed(jump, 8) + self.program_counter
-        self.program_counter = jump_address
+        self.program_counter = self.unsigned_to_signed(jump, 8) + next_instruction
 
-        # required to skip the next byte
-        self.program_counter += self.opcode.length - 1
-
-    def bit(self, mode: AddressingMode) -> None:
-        addr = self.get_operand_address(mode)
-        value = self.memory.read(addr)
-
-        result = self.register_a & value
-
-        if result == 0:
-            self.set_flag(Flags.ZERO)
-        else:
-            self.clear_flag(Flags.ZERO)
-
-        if value & 0b10000000 != 0:
-            self.set_flag(Flags.NEGATIVE)
+        # a taken branch costs a cycle, and another if it lands on a different page to the next instruction
+        if (next_instruction ^ self.program_counter) & 0xFF00:
+            self.cycles += 2
         else:
-            self.clear_flag(Flags.NEGATIVE)
+            self.cycles += 1
 
-        if value & 0b01000000 != 0:
-            self.set_flag(Flags.OVERFLOW)
-        else:
-            self.clear_flag(Flags.OVERFLOW)
+    def bit(self, resolve: Resolver) -> None:
+        addr = resolve(self)
+        value = self.memory.read(addr)
 
-    def jump(self, mode: AddressingMode) -> None:
-        mem_address = self.memory.read_u16(self.program_counter)
+        status = self.status & ~(FLAG_ZERO | FLAG_OVERFLOW | FLAG_NEGATIVE)
 
-        if mode == AddressingMode.ABSOLUTE_INDIRECT:
-            if mem_address & 0x00FF == 0x00FF:
-                lo = self.memory.read(mem_address)
-                hi = self.memory.read(mem_address & 0xFF00)
-                indirect_ref = (hi << 8) | lo
-            else:
-                indirect_ref = self.memory.read_u16(mem_address)
+        if self.register_a & value == 0:
+            status |= FLAG_ZERO
 
-            mem_address = indirect_ref
+        # bits 7 and 6 of the value are copied into the negative and overflow flags
+        self.status = status | (value & (FLAG_NEGATIVE | FLAG_OVERFLOW))
 
-        self.program_counter = mem_address
+    def jump(self, resolve: Resolver) -> None:
+        # the absolute indirect resolver follows the pointer (including the page wrap bug)
+        self.program_counter = resolve(self)
 
     def add_to_register_a(self, value) -> None:
-        sum = self.register_a + value + self.get_flag(Flags.CARRY)
-        carry = sum > 0xFF
+        status = self.status
+        sum = self.register_a + value + (status & FLAG_CARRY)
+        status &= ~(FLAG_CARRY | FLAG_ZERO | FLAG_OVERFLOW | FLAG_NEGATIVE)
 
-        if carry:
-            self.set_flag(Flags.CARRY)
-        else:
-            self.clear_flag(Flags.CARRY)
+        if sum > 0xFF:
+            status |= FLAG_CARRY
 
         result = sum & 0xFF
 
         if (value ^ result) & (result ^ self.register_a) & 0x80 != 0:
-            self.set_flag(Flags.OVERFLOW)
-        else:
-            self.clear_flag(Flags.OVERFLOW)
+            status |= FLAG_OVERFLOW
 
-        self.update_zero_and_negative_flags(result)
+        self.status = status | ZERO_NEGATIVE_FLAGS[result]
 
         self.register_a = result
 
-    def compare(self, mode: AddressingMode, compare_with: int) -> None:
-        addr = self.get_operand_address(mode)
+    def compare(self, resolve: Resolver, compare_with: int) -> None:
+        addr = resolve(self)
         value = self.memory.read(addr)
-        if value <= compare_with:
-            self.set_flag(Flags.CARRY)
-        else:
-            self.clear_flag(Flags.CARRY)
-
-        self.update_zero_and_negative_flags(compare_with - value)
+        status = self.status & CLEAR_ZERO_NEGATIVE & ~FLAG_CARRY
 
-    def lsr(self, mode: AddressingMode):
-        addr = self.get_operand_address(mode)
-        if mode != AddressingMode.ACCUMULATOR:
-            value = self.memory.read(addr)
-        else:
-            value = copy(self.register_a)
+        if value <= compare_with:
+            status |= FLAG_CARRY
 
-        if value & 1 == 1:
-            self.set_flag(Flags.CARRY)
-        else:
-            self.clear_flag(Flags.CARRY)
+        self.status = status | ZERO_NEGATIVE_FLAGS[(compare_with - value) & 0xFF]
 
+    def shift_right(self, value: int) -> int:
         data = value >> 1
+        self.status = (self.status & CLEAR_ZERO_NEGATIVE & ~FLAG_CARRY) | (value & FLAG_CARRY) | ZERO_NEGATIVE_FLAGS[data & 0xFF]
 
-        self.update_zero_and_negative_flags(data)
+        return data
 
-        if mode == AddressingMode.ACCUMULATOR:
-            self.register_a = data
-        else:
-            self.memory.write(addr, data)
+    def lsr(self, resolve: Resolver):
+        addr = resolve(self)
+        self.memory.write(addr, self.shift_right(self.memory.read(addr)))
+
+    def lsr_accumulator(self):
+        self.register_a = self.shift_right(self.register_a)
 
-    def lda(self, mode: AddressingMode):
-        addr = self.get_operand_address(mode)
+    def lda(self, resolve: Resolver):
+        addr = resolve(self)
         self.register_a = self.memory.read(addr)
         self.update_zero_and_negative_flags(self.register_a)
 
-    def sta(self, mode: AddressingMode):
-        addr = self.get_operand_address(mode)
+    def sta(self, resolve: Resolver):
+        addr = resolve(self)
         self.memory.write(addr, self.register_a)
 
     def inx(self):
@@ -713,47 +660,220 @@ class CPU:
         self.register_x = self.stack_pointer
         self.update_zero_and_negative_flags(self.register_x)
 
-    def rol(self, mode: AddressingMode):
-        addr = self.get_operand_address(mode)
-        if mode != AddressingMode.ACCUMULATOR:
-            value = self.memory.read(addr)
-        else:
-            value = copy(self.register_a)
+    def rotate_left(self, value: int) -> int:
+        status = self.status
+        data = ((value << 1) | (status & FLAG_CARRY)) & 0xFF
+        self.status = (status & ~FLAG_CARRY) | (value >> 7 & FLAG_CARRY)
 
-        carry = self.get_flag(Flags.CARRY)
-        self.clear_flag(Flags.CARRY)
+        return data
 
-        data = (value << 1) | carry
+    def rol(self, resolve: Resolver):
+        addr = resolve(self)
+        data = self.rotate_left(self.memory.read(addr))
 
-        if value >> 7 == 1:
-            self.set_flag(Flags.CARRY)
+        self.update_negative_flag(data)
+        self.memory.write(addr, data)
 
-        if mode == AddressingMode.ACCUMULATOR:
-            self.register_a = data
-        else:
-            self.update_negative_flag(data)
-            self.memory.write(addr, data)
+    def rol_accumulator(self):
+        self.register_a = self.rotate_left(self.register_a)
 
-    def ror(self, mode: AddressingMode) -> None:
-        addr = self.get_operand_address(mode)
-        if mode != AddressingMode.ACCUMULATOR:
-            value = self.memory.read(addr)
-        else:
-            value = copy(self.register_a)
+    def rotate_right(self, value: int) -> int:
+        status = self.status
+        data = value >> 1
+        if status & FLAG_CARRY:
+            data |= 0b10000000
 
-        old_carry = self.get_flag(Flags.CARRY)
+        self.status = (status & ~FLAG_CARRY) | (value & FLAG_CARRY)
 
-        if value & 1 == 1:
-            self.set_flag(Flags.CARRY)
-        else:
-            self.clear_flag(Flags.CARRY)
+        return data
 
-        data = value >> 1
-        if old_carry:
-            data |= 0b10000000
+    def ror(self, resolve: Resolver) -> None:
+        addr = resolve(self)
+        data = self.rotate_right(self.memory.read(addr))
 
-        if mode == AddressingMode.ACCUMULATOR:
-            self.register_a = data
-        else:
-            self.memory.write(addr, data)
-            self.update_negative_flag(data)
+        self.memory.write(addr, data)
+        self.update_negative_flag(data)
+
+    def ror_accumulator(self) -> None:
+        self.register_a = self.rotate_right(self.register_a)
+
+    def brk(self) -> bool:
+        # the end of the program - returning True stops the run loop
+        return True
+
+    def nop(self) -> None:
+        pass
+
+    def nmi(self) -> None:
+        """Take a non-maskable interrupt (the PPU entering vblank) between instructions - pushes the program counter and
+        the status (with the break flag clear) and jumps through the NMI vector, RTI returns"""
+        self.interrupt(0xFFFA)
+
+    def irq(self) -> bool:
+        """Take an interrupt request (a mapper's scanline counter) between instructions, unless interrupts are disabled
+        - as nmi, through the IRQ vector. The line stays held until the device is acknowledged, so the host calls this
+        again for as long as it is.
+
+        Returns:
+            bool: Whether the interrupt was taken
+        """
+        if self.status & FLAG_INTERRUPT_DISABLE:
+            return False
+
+        self.interrupt(0xFFFE)
+        return True
+
+    def interrupt(self, vector: int) -> None:
+        self.stack_push_u16(self.program_counter)
+        self.stack_push((self.status & ~FLAG_BREAK) | FLAG_UNUSED)
+        self.status |= FLAG_INTERRUPT_DISABLE
+        self.program_counter = self.memory.read_u16(vector)
+        self.opcode = None
+        self.cycles += 7
+
+    # Branches
+    def bcc(self) -> None:
+        if not self.status & FLAG_CARRY:
+            self.branch()
+
+    def bcs(self) -> None:
+        if self.status & FLAG_CARRY:
+            self.branch()
+
+    def beq(self) -> None:
+        if self.status & FLAG_ZERO:
+            self.branch()
+
+    def bmi(self) -> None:
+        if self.status & FLAG_NEGATIVE:
+            self.branch()
+
+    def bne(self) -> None:
+        if not self.status & FLAG_ZERO:
+            self.branch()
+
+    def bpl(self) -> None:
+        if not self.status & FLAG_NEGATIVE:
+            self.branch()
+
+    def bvc(self) -> None:
+        if not self.status & FLAG_OVERFLOW:
+            self.branch()
+
+    def bvs(self) -> None:
+        if self.status & FLAG_OVERFLOW:
+            self.branch()
+
+    # Flags
+    def clc(self) -> None:
+        self.status &= ~FLAG_CARRY
+
+    def cld(self) -> None:
+        self.status &= ~FLAG_DECIMAL
+
+    def cli(self) -> None:
+        self.status &= ~FLAG_INTERRUPT_DISABLE
+
+    def clv(self) -> None:
+        self.status &= ~FLAG_OVERFLOW
+
+    def sec(self) -> None:
+        self.status |= FLAG_CARRY
+
+    def sed(self) -> None:
+        self.status |= FLAG_DECIMAL
+
+    def sei(self) -> None:
+        self.status |= FLAG_INTERRUPT_DISABLE
+
+    # Comparisons
+    def cmp(self, resolve: Resolver) -> None:
+        self.compare(resolve, self.register_a)
+
+    def cpx(self, resolve: Resolver) -> None:
+        self.compare(resolve, self.register_x)
+
+    def cpy(self, resolve: Resolver) -> None:
+        self.compare(resolve, self.register_y)
+
+    # Increments and decrements
+    def dec(self, resolve: Resolver) -> None:
+        addr = resolve(self)
+        value = self.memory.read(addr)
+        value = (value - 1) & 0xFF
+        self.update_zero_and_negative_flags(value)
+        self.memory.write(addr, value)
+
+    def dex(self) -> None:
+        self.register_x = (self.register_x - 1) & 0xFF
+        self.update_zero_and_negative_flags(self.register_x)
+
+    def dey(self) -> None:
+        self.register_y = (self.register_y - 1) & 0xFF
+        self.update_zero_and_negative_flags(self.register_y)
+
+    def inc(self, resolve: Resolver) -> None:
+        addr = resolve(self)
+        value = self.memory.read(addr)
+        value = (value + 1) & 0xFF
+        self.memory.write(addr, value)
+        self.update_zero_and_negative_flags(value)
+
+    def iny(self) -> None:
+        self.register_y = (self.register_y + 1) & 0xFF
+        self.update_zero_and_negative_flags(self.register_y)
+
+    # Logical
+    def eor(self, resolve: Resolver) -> None:
+        addr = resolve(self)
+        value = self.memory.read(addr)
+        self.register_a ^= value
+        self.update_zero_and_negative_flags(self.register_a)
+
+    def ora(self, resolve: Resolver) -> None:
+        addr = resolve(self)
+        value = self.memory.read(addr)
+        self.register_a |= value
+
+    # Loads and stores
+    def ldx(self, resolve: Resolver) -> None:
+        self.register_x = self.memory.read(resolve(self))
+        self.update_zero_and_negative_flags(self.register_x)
+
+    def ldy(self, resolve: Resolver) -> None:
+        self.register_y = self.memory.read(resolve(self))
+        self.update_zero_and_negative_flags(self.register_y)
+
+    def stx(self, resolve: Resolver) -> None:
+        self.memory.write(resolve(self), self.register_x)
+
+    def sty(self, resolve: Resolver) -> None:
+        self.memory.write(resolve(self), self.register_y)
+
+    # Stack
+    def pha(self) -> None:
+        self.stack_push(self.register_a)
+
+    def php(self) -> None:
+        # <//http://wiki.nesdev.com/w/index.php/CPU_status_flag_behavior
+        self.stack_push(self.status | FLAG_BREAK | FLAG_UNUSED)
+
+    def pla(self) -> None:
+        self.register_a = self.stack_pop()
+
+    def plp(self) -> None:
+        self.status = (self.stack_pop() & ~FLAG_BREAK) | FLAG_UNUSED
+
+    # Subroutines and interrupts
+    def jsr(self, resolve: Resolver) -> None:
+        self.stack_push_u16(self.program_counter + 2 - 1)
+        target_address = resolve(self)
+        self.program_counter = target_address
+
+    def rti(self) -> None:
+        self.status = (self.stack_pop() & ~FLAG_BREAK) | FLAG_UNUSED
+
+        self.program_counter = self.stack_pop_u16()
+
+    def rts(self) -> None:
+        self.program_counter = self.stack_pop_u16() + 1
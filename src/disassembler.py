@@ -0,0 +1,290 @@
+"""
+Disassembler - decodes 6502 code into immutable Instruction records without touching a CPU.
+
+The code is decoded from a buffer (a program, a PRG ROM bank, or a copy of a range of memory) placed at an origin
+address. Decoded instructions are cached by address, so a range is only ever decoded once however many times it's
+disassembled, and the text of an instruction is only formatted when it's asked for.
+
+Two modes:
+
+* linear - a sweep from one address to another, decoding every byte as the start of an instruction. Data mixed in with
+  the code comes out as instructions (or .byte for the bytes that aren't an opcode).
+* recursive - descends from entry points (the reset vector, say) following the flow of control through branches,
+  JMP and JSR, so only the bytes that can be reached as code are decoded. It can't see through indirect jumps or
+  jump tables.
+
+Both are generators, so a large ROM streams out an instruction at a time rather than being built up and printed a line
+at a time.
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from constants import AddressingMode
+from memory import MEMORY_SIZE
+from opcodes import INSTRUCTIONS, LENGTHS, MODES
+
+# the format of the operand of each instruction, built from the mnemonic in opcodes.txt ("LDA #$nn")
+FORMATS: Tuple[Optional[str], ...] = tuple(
+    None if opcode is None else opcode.mnemonic.strip().replace("nnnn", "{0:04X}").replace("nn", "{0:04X}" if opcode.addressing_mode == AddressingMode.RELATIVE else "{0:02X}")
+    for opcode in INSTRUCTIONS
+)
+RELATIVE: Tuple[bool, ...] = tuple(mode == AddressingMode.RELATIVE for mode in MODES)
+
+
+# a byte that isn't an instruction
+BYTE_FORMAT: str = "{0:04X}  {1:02X}        .byte ${1:02X}"
+
+
+def line_format(code: int) -> str:
+    # a line of a listing - the address, the bytes and the assembly, formatted with the address, the operand's low and
+    # high bytes and the operand (the target for a branch)
+    opcode = INSTRUCTIONS[code]
+    if opcode is None:
+        return BYTE_FORMAT.replace("{1:02X}", f"{code:02X}")
+
+    encoded = " ".join([f"{code:02X}", "{1:02X}", "{2:02X}"][: opcode.length])
+    return "{0:04X}  " + encoded + " " * (9 - 3 * opcode.length) + "  " + FORMATS[code].replace("{0:", "{3:")
+
+
+LINE_FORMATS: Tuple[str, ...] = tuple(line_format(code) for code in range(0x100))
+
+JSR: int = 0x20
+JMP_ABSOLUTE: int = 0x4C
+# the instructions after which the next byte isn't (necessarily) code
+STOPS: Tuple[int, ...] = (
+    0x00,  # BRK
+    0x40,  # RTI
+    0x4C,  # JMP $nnnn
+    0x60,  # RTS
+    0x6C,  # JMP ($nnnn)
+)
+
+
+class Instruction(NamedTuple):
+    """A decoded instruction"""
+
+    address: int
+    code: int
+    # the operand byte or word as it's encoded, None for single byte instructions
+    operand: Optional[int]
+    length: int
+    # where a branch, JMP $nnnn or JSR can go, the absolute address for a branch
+    target: Optional[int]
+
+    @property
+    def defined(self) -> bool:
+        # an opcode cut off by the end of the code is a byte like an undefined opcode
+        return INSTRUCTIONS[self.code] is not None and self.length == LENGTHS[self.code]
+
+    def encoded(self) -> bytes:
+        if self.length == 1:
+            return bytes([self.code])
+
+        return bytes([self.code]) + self.operand.to_bytes(self.length - 1, "little")
+
+    def text(self) -> str:
+        """The instruction in assembly, i.e. LDA #$05 or BNE $0610"""
+        if not self.defined:
+            return f".byte ${self.code:02X}"
+
+        return FORMATS[self.code].format(self.target if RELATIVE[self.code] else self.operand)
+
+    def line(self) -> str:
+        """The address, the bytes and the assembly - a line of a listing"""
+        code = self.code
+        operand = self.operand
+        if operand is None:
+            # a single byte instruction, or a byte that isn't one
+            return LINE_FORMATS[code].format(self.address) if LENGTHS[code] == 1 else BYTE_FORMAT.format(self.address, code)
+
+        return LINE_FORMATS[code].format(self.address, operand & 0xFF, operand >> 8, self.target if RELATIVE[code] else operand)
+
+
+class Disassembler:
+    """Decodes the code in a buffer, caching every instruction decoded.
+
+    Args:
+        data (Union[bytes, bytearray, memoryview]): The code
+        origin (int): The address the first byte of the buffer is at
+    """
+
+    data: Union[bytes, bytearray, memoryview]
+    origin: int
+    end: int
+    # the decoded instructions by address
+    cache: Dict[int, Instruction]
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview], origin: int = 0) -> None:
+        self.data = data
+        self.origin = origin
+        self.end = origin + len(data)
+        self.cache = {}
+
+    @classmethod
+    def from_memory(cls, memory: "Memory", start: int, end: int) -> "Disassembler":
+        """Disassemble a range of memory - flat memory is viewed rather than copied, so invalidate the cache if the
+        code is changed. On the bus the range is copied as it is now."""
+        if memory.has_bus:
+            return cls(bytes(memory.read(addr) for addr in range(start, end)), start)
+
+        return cls(memory.view(start, end), start)
+
+    def invalidate(self, start: Optional[int] = None, end: Optional[int] = None) -> None:
+        """Forget the cached instructions that start between start and end (all of them by default), after the code
+        there has changed"""
+        if start is None and end is None:
+            self.cache.clear()
+            return
+
+        start = self.origin if start is None else start
+        end = self.end if end is None else end
+        # an instruction starting up to 2 bytes before the range has its operand in it
+        for address in [address for address in self.cache if start - 2 <= address < end]:
+            del self.cache[address]
+
+    def decode(self, address: int) -> Instruction:
+        """The instruction at an address, decoded once and then cached.
+
+        Args:
+            address (int): An address inside the buffer
+
+        Returns:
+            Instruction: The instruction, undefined opcodes (and instructions cut off by the end of the buffer) are a
+                single byte instruction with no operand
+        """
+        instruction = self.cache.get(address)
+        if instruction is not None:
+            return instruction
+
+        if not self.origin <= address < self.end:
+            raise ValueError(f"Can't decode {hex(address)}: outside {hex(self.origin)}-{hex(self.end)}")
+
+        data = self.data
+        offset = address - self.origin
+        code = data[offset]
+        length = LENGTHS[code]
+        operand = None
+        target = None
+
+        if offset + length > len(data):
+            instruction = Instruction(address, code, None, 1, None)
+            self.cache[address] = instruction
+            return instruction
+
+        if length == 2:
+            operand = data[offset + 1]
+            if RELATIVE[code]:
+                target = (address + 2 + (operand - 0x100 if operand & 0x80 else operand)) & 0xFFFF
+        elif length == 3:
+            operand = data[offset + 1] | data[offset + 2] << 8
+            if code == JSR or code == JMP_ABSOLUTE:
+                target = operand
+
+        instruction = Instruction(address, code, operand, length, target)
+        self.cache[address] = instruction
+        return instruction
+
+    def linear(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Instruction]:
+        """Decode every instruction from start up to end, each one starting where the last one ended.
+
+        Args:
+            start (Optional[int]): The first address, the start of the buffer by default
+            end (Optional[int]): The address to stop before, the end of the buffer by default
+
+        Yields:
+            Instruction: The instructions in address order
+        """
+        address = self.origin if start is None else start
+        end = self.end if end is None else min(end, self.end)
+
+        # decode inlined, this is the loop a whole ROM goes through
+        cache = self.cache
+        data = self.data
+        origin = self.origin
+        size = len(data)
+        # skips the argument handling of Instruction's __new__
+        record = tuple.__new__
+        while address < end:
+            instruction = cache.get(address)
+            if instruction is None:
+                offset = address - origin
+                code = data[offset]
+                length = LENGTHS[code]
+                if length == 1 or offset + length > size:
+                    instruction = record(Instruction, (address, code, None, 1, None))
+                elif length == 2:
+                    operand = data[offset + 1]
+                    target = (address + 2 + (operand - 0x100 if operand & 0x80 else operand)) & 0xFFFF if RELATIVE[code] else None
+                    instruction = record(Instruction, (address, code, operand, 2, target))
+                else:
+                    operand = data[offset + 1] | data[offset + 2] << 8
+                    instruction = record(Instruction, (address, code, operand, 3, operand if code == JSR or code == JMP_ABSOLUTE else None))
+                cache[address] = instruction
+
+            yield instruction
+            address += instruction.length
+
+    def recursive(self, entries: Iterable[int]) -> Iterator[Instruction]:
+        """Decode the code reachable from the entry points, following branches (both ways), JMP $nnnn and JSR (into
+        the subroutine and on past it). A path ends at RTS, RTI, BRK, an indirect JMP, an undefined opcode or when it
+        leaves the buffer.
+
+        Args:
+            entries (Iterable[int]): The addresses execution can start at
+
+        Yields:
+            Instruction: Each instruction reached, once, in the order they were reached - sort by address for a listing
+        """
+        decode = self.decode
+        seen = set()
+        pending: List[int] = [entry for entry in entries if self.origin <= entry < self.end]
+
+        while pending:
+            address = pending.pop()
+
+            while address not in seen and self.origin <= address < self.end:
+                seen.add(address)
+                instruction = decode(address)
+                yield instruction
+
+                if not instruction.defined or instruction.code in STOPS:
+                    if instruction.code == JMP_ABSOLUTE:
+                        pending.append(instruction.target)
+                    break
+
+                if instruction.target is not None:
+                    pending.append(instruction.target)
+
+                address += instruction.length
+
+
+def write_listing(instructions: Iterable[Instruction], output=sys.stdout) -> None:
+    output.writelines(f"{instruction.line()}\n" for instruction in instructions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="A raw 6502 program, or an iNES ROM")
+    parser.add_argument("-o", "--origin", type=lambda value: int(value, 16), help="The address the program is loaded at, in hex - by default it ends at $FFFF")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Only disassemble the code reachable from the vectors at the end of the program")
+
+    args = parser.parse_args()
+
+    data: Union[bytes, memoryview] = args.path.read_bytes()
+    if args.path.suffix.lower() == ".nes":
+        # the cartridge loader has dependencies of its own, only needed for ROMs
+        from cartridge import Cartridge
+
+        with Cartridge(rom_path=args.path) as cartridge:
+            data = bytes(cartridge.program_rom)
+
+    # a PRG ROM bigger than the address space is listed by its offsets
+    origin = args.origin if args.origin is not None else max(MEMORY_SIZE - len(data), 0)
+    disassembler = Disassembler(data, origin)
+    if args.recursive:
+        # the NMI, reset and IRQ vectors
+        vectors = [int.from_bytes(data[offset : offset + 2], "little") for offset in range(len(data) - 6, len(data), 2)]
+        write_listing(sorted(disassembler.recursive(vectors)))
+    else:
+        write_listing(disassembler.linear())
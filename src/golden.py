@@ -0,0 +1,215 @@
+"""
+Golden log comparator - checks the CPU against a reference trace in the nestest.log format, i.e.
+
+    C000  4C F5 C5  JMP $C5F5                       A:00 X:00 Y:00 P:24 SP:FD PPU:  0, 21 CYC:7
+
+The reference log is streamed a line at a time and the CPU runs alongside it in batches with a trace (see the tracer
+module), each batch's records are checked against the next lines of the log. The CPU starts from the state on the first
+line of the log, and the comparison stops at the first line the CPU disagrees with - the program counter, A, X, Y, P,
+SP or the cycle count (when the log has one) - with the registers that differ and the last instructions that matched.
+
+P is compared without the break and unused bits, they aren't flags the CPU keeps (the reference logs show P as it
+would be pushed by PHP/an interrupt, the CPU keeps them as they were last set).
+
+The CPU has to be built with a trace big enough for a batch, and without fast-forwarding - skipped idle loops don't
+appear in the trace.
+"""
+import argparse
+import re
+import sys
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from constants import FLAG_BREAK, FLAG_UNUSED, StopReason
+from tracer import Record, render
+
+# older logs have the PPU dot as CYC, followed by the scanline as SL - they have no cycle count
+LINE = re.compile(r"^([0-9A-Fa-f]{4})\s.*?A:([0-9A-Fa-f]{2}) X:([0-9A-Fa-f]{2}) Y:([0-9A-Fa-f]{2}) P:([0-9A-Fa-f]{2}) SP:([0-9A-Fa-f]{2})(?:.*CYC:\s*(\d+)\b(?!\s+SL:))?")
+REGISTERS: Tuple[str, ...] = ("PC", "A", "X", "Y", "P", "SP", "CYC")
+STATUS_MASK: int = ~(FLAG_BREAK | FLAG_UNUSED) & 0xFF
+
+# the instructions run between checks against the log
+BATCH_SIZE: int = 1024
+HISTORY: int = 10
+
+
+class Entry(NamedTuple):
+    """A line of the reference log"""
+
+    line_number: int
+    program_counter: int
+    register_a: int
+    register_x: int
+    register_y: int
+    status: int
+    stack_pointer: int
+    # None when the log has no cycle counts
+    cycles: Optional[int]
+    text: str
+
+
+class Divergence(NamedTuple):
+    """Where the CPU first disagreed with the log"""
+
+    entry: Entry
+    # what the CPU did instead - None if it stopped before it got to the line
+    record: Optional[Record]
+    # the registers that differ as name: (expected, actual), or why the CPU stopped
+    differences: Dict[str, Tuple[int, int]]
+    reason: Optional[str]
+    # the log lines of the instructions before it, oldest first
+    history: List[str]
+
+    def report(self) -> str:
+        lines = [f"Diverged at line {self.entry.line_number}:", *(f"  {line}" for line in self.history), f"> {self.entry.text}"]
+
+        if self.record is not None:
+            lines.append(f"< {render(self.record)}")
+        if self.reason is not None:
+            lines.append(f"The CPU stopped: {self.reason}")
+        for name, (expected, actual) in self.differences.items():
+            # the cycle count is decimal in the log, the registers hex
+            lines.append(f"{name}: expected {expected}, got {actual}" if name == "CYC" else f"{name}: expected {expected:02X}, got {actual:02X}")
+
+        return "\n".join(lines)
+
+
+def parse(line: str, line_number: int = 0) -> Optional[Entry]:
+    """A line of the reference log, None if it isn't a trace line"""
+    match = LINE.match(line)
+    if match is None:
+        return None
+
+    program_counter, a, x, y, status, stack_pointer, cycles = match.groups()
+    return Entry(
+        line_number,
+        int(program_counter, 16),
+        int(a, 16),
+        int(x, 16),
+        int(y, 16),
+        int(status, 16),
+        int(stack_pointer, 16),
+        int(cycles) if cycles is not None else None,
+        line.rstrip("\n"),
+    )
+
+
+def read_log(log: Iterable[str]) -> Iterator[Entry]:
+    """Stream the trace lines of a reference log - the lines of an open file, say - skipping any others"""
+    for line_number, line in enumerate(log, start=1):
+        entry = parse(line, line_number)
+        if entry is not None:
+            yield entry
+
+
+def differences(entry: Entry, record: Record) -> Dict[str, Tuple[int, int]]:
+    program_counter, _, a, x, y, status, stack_pointer, cycles = record
+    expected = (entry.program_counter, entry.register_a, entry.register_x, entry.register_y, entry.status & STATUS_MASK, entry.stack_pointer, entry.cycles)
+    actual = (program_counter, a, x, y, status & STATUS_MASK, stack_pointer, cycles)
+
+    return {
+        name: (wanted, got)
+        for name, wanted, got in zip(REGISTERS, expected, actual)
+        # a log without cycle counts can't disagree about them
+        if wanted is not None and wanted != got
+    }
+
+
+def start(cpu: "CPU", entry: Entry) -> None:
+    """Put the CPU in the state on a line of the log"""
+    cpu.program_counter = entry.program_counter
+    cpu.register_a = entry.register_a
+    cpu.register_x = entry.register_x
+    cpu.register_y = entry.register_y
+    cpu.status = entry.status
+    cpu.stack_pointer = entry.stack_pointer
+    if entry.cycles is not None:
+        cpu.cycles = entry.cycles
+    cpu.opcode = None
+
+
+def compare(cpu: "CPU", entries: Iterable[Entry], history: int = HISTORY, batch_size: int = BATCH_SIZE) -> Tuple[int, Optional[Divergence]]:
+    """Run the CPU alongside a reference log until they disagree or the log ends.
+
+    Args:
+        cpu (CPU): The CPU with the program loaded, built with a trace of at least batch_size instructions
+        entries (Iterable[Entry]): The lines of the log, see read_log
+        history (int): The number of lines before a divergence to report
+        batch_size (int): The number of instructions run between checks against the log
+
+    Returns:
+        Tuple[int, Optional[Divergence]]: The number of lines that matched, and where the CPU diverged (None if it
+            matched the whole log)
+    """
+    if cpu.trace is None or cpu.trace.capacity < batch_size:
+        raise ValueError(f"The CPU needs a trace of at least {batch_size} instructions to be compared against a log")
+
+    if cpu.idle_loops is not None:
+        raise ValueError("The CPU can't be compared against a log while fast-forwarding idle loops")
+
+    entries = iter(entries)
+    recent: Deque[str] = deque(maxlen=history)
+    matched = 0
+
+    first = next(entries, None)
+    if first is None:
+        return matched, None
+
+    start(cpu, first)
+    batch = [first, *islice(entries, batch_size - 1)]
+
+    while batch:
+        cpu.trace.clear()
+        try:
+            reason = cpu.execute(len(batch))
+            error = None
+        except ValueError as e:
+            # a memory access that isn't mapped - the instruction that made it was recorded before it ran
+            reason = None
+            error = f"{e.__class__.__name__}: {e}"
+
+        records = list(cpu.trace.records())
+        for index, (entry, record) in enumerate(zip(batch, records)):
+            different = differences(entry, record)
+            # the instruction that raised matched the log up to running it
+            if different or (error is not None and index == len(records) - 1):
+                return matched, Divergence(entry, record, different, error if not different else None, list(recent))
+
+            recent.append(entry.text)
+            matched += 1
+
+        if len(records) < len(batch) or reason != StopReason.INSTRUCTION_BUDGET:
+            # the CPU stopped (at BRK or an undefined opcode) before the log did
+            following = batch[len(records)] if len(records) < len(batch) else next(entries, None)
+            if following is None:
+                return matched, None
+
+            return matched, Divergence(following, None, {}, reason.value if reason is not None else error, list(recent))
+
+        batch = list(islice(entries, batch_size))
+
+    return matched, None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rom", type=Path, help="The iNES ROM the log was made with, i.e. nestest.nes")
+    parser.add_argument("log", type=Path, help="The reference log, i.e. nestest.log")
+    parser.add_argument("-n", "--history", type=int, default=HISTORY, help="The number of matching lines to show before a divergence")
+
+    args = parser.parse_args()
+
+    # the cartridge loader has dependencies of its own
+    from console import Console
+
+    with Console(rom_path=args.rom, trace=BATCH_SIZE) as console, open(args.log, "r") as log:
+        console.load_cartridge()
+        matched, divergence = compare(console.cpu, read_log(log), args.history)
+
+    if divergence is not None:
+        print(divergence.report())
+        print(f"{matched} lines matched")
+        sys.exit(1)
+
+    print(f"All {matched} lines matched")
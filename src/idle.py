@@ -0,0 +1,234 @@
+"""
+Idle loop detection - fast-forwards loops that only burn cycles.
+
+Two kinds of loop are recognised, both closed by a branch (or an absolute JMP) back to the first instruction of the
+loop with nothing but straight-line code in between:
+
+* countdown loops - a body of NOP/INX/INY/DEX/DEY closed by BNE on the last register stepped, like the delay loop at
+  the end of the snake program. The number of iterations left follows from the counter, so the exit state (registers,
+  flags and cycles) is computed directly.
+* polling loops - a body that doesn't write memory, like LDA $2002 / BPL waiting for vblank or a JMP to itself. When
+  the loop head is reached twice in a row within a batch with the same registers, every further iteration reads the same values and
+  takes the same path, so the loop can only end when something outside the CPU changes memory - the iterations up to
+  the batch budget are skipped. On the bus the skipped reads of I/O registers are elided. Only an arrival exactly an
+  iteration's instructions after the last one counts as going round the loop - a branch inside the body that isn't
+  taken, followed by a JMP back to the head, also comes back to the head but on a longer path than the one analysed.
+
+Both are exact for the batch - skipping never runs past the instruction, cycle or program counter budget the batch
+was given, a partial iteration at the end of the budget is left to the interpreter.
+"""
+from typing import Dict, List, Optional, Tuple
+from constants import CLEAR_ZERO_NEGATIVE, ZERO_NEGATIVE_FLAGS
+from logger import get_logger
+from opcodes import Opcode
+
+logger = get_logger(__name__)
+
+MAX_LOOP_INSTRUCTIONS: int = 16
+
+BRANCHES = {"BCC", "BCS", "BEQ", "BMI", "BNE", "BPL", "BVC", "BVS"}
+COUNTERS: Dict[str, Tuple[str, int]] = {"INX": ("register_x", 1), "INY": ("register_y", 1), "DEX": ("register_x", -1), "DEY": ("register_y", -1)}
+# instructions that write memory or the stack (or leave the loop), a loop containing one of these is never idle
+WRITES = {"STA", "STX", "STY", "INC", "DEC", "PHA", "PHP", "PLA", "PLP", "JSR", "RTS", "RTI", "BRK", "TXS"}
+SHIFTS = {"ASL", "LSR", "ROL", "ROR"}
+
+
+class Loop:
+    """The analysis of the code at a loop head"""
+
+    __slots__ = ("head", "code", "kind", "length", "cycles", "min_cycles", "max_cycles", "penalty", "addresses", "steps", "closing", "arrival")
+
+    head: int
+    code: bytes
+    # "countdown", "polling" or None when the loop isn't idle
+    kind: Optional[str]
+    length: int
+    # the static cycles of an iteration, including the taken branch
+    cycles: int
+    # the range an iteration of a polling loop can take with page crossing penalties
+    min_cycles: int
+    max_cycles: int
+    # the cycles a taken branch adds
+    penalty: int
+    addresses: List[int]
+    # countdown loops: the (register, step) of each counter the body steps, the last one is tested by the branch
+    steps: List[Tuple[str, int]]
+    closing: Optional[Opcode]
+    # polling loops: the batch, registers, cycle counter and instructions left in the batch the last time the head was
+    # reached
+    arrival: Optional[Tuple[int, ...]]
+
+    def __init__(self, head: int, code: bytes) -> None:
+        self.head = head
+        self.code = code
+        self.kind = None
+        self.length = 0
+        self.cycles = 0
+        self.min_cycles = 0
+        self.max_cycles = 0
+        self.penalty = 0
+        self.addresses = []
+        self.steps = []
+        self.closing = None
+        self.arrival = None
+
+
+class IdleLoops:
+    loops: Dict[int, Loop]
+    # counts the batches - memory can change between them, so a polling loop is only skipped on arrivals at its head
+    # within the same batch
+    batch: int
+
+    def __init__(self) -> None:
+        self.loops = {}
+        self.batch = 0
+
+    def analyse(self, cpu: "CPU", head: int) -> Loop:
+        memory = cpu.memory
+        table = cpu.instructions
+
+        body: List[Tuple[int, Opcode, int]] = []
+        address = head
+        closing = None
+        while len(body) < MAX_LOOP_INSTRUCTIONS and address < 0xFFFE:
+            opcode = table[memory.read(address)]
+            if opcode is None:
+                break
+
+            mnemonic = opcode.mnemonic.split()[0]
+            operand = memory.read(address + 1) if opcode.length == 2 else memory.read_u16(address + 1) if opcode.length == 3 else 0
+            body.append((address, opcode, operand))
+            address += opcode.length
+
+            if mnemonic in BRANCHES or mnemonic == "JMP":
+                closing = (mnemonic, opcode, operand)
+                break
+
+        loop = Loop(head, bytes(memory.slice(head, address)))
+        if closing is None:
+            return loop
+
+        mnemonic, opcode, operand = closing
+        if mnemonic in BRANCHES:
+            target = (operand - 0x100 if operand & 0x80 else operand) + address
+            penalty = 2 if (address ^ target) & 0xFF00 else 1
+        elif opcode.code == 0x4C:
+            target = operand
+            penalty = 0
+        else:
+            return loop
+
+        if target != head:
+            return loop
+
+        mnemonics = []
+        for _, instruction, _ in body[:-1]:
+            name = instruction.mnemonic.split()[0]
+            # the accumulator forms of the shifts are the only ones that leave memory alone
+            if name in WRITES or (name in SHIFTS and instruction.length > 1):
+                return loop
+
+            mnemonics.append(name)
+
+        loop.length = len(body)
+        loop.cycles = sum(opcode.cycles for _, opcode, _ in body) + penalty
+        loop.min_cycles = loop.cycles
+        loop.max_cycles = loop.cycles + sum(opcode.page_penalty for _, opcode, _ in body)
+        loop.penalty = penalty
+        loop.addresses = [address for address, _, _ in body]
+        loop.closing = body[-1][1]
+
+        if mnemonic == "BNE" and mnemonics and all(name == "NOP" or name in COUNTERS for name in mnemonics) and mnemonics[-1] in COUNTERS:
+            loop.kind = "countdown"
+            loop.steps = [COUNTERS[name] for name in mnemonics if name in COUNTERS]
+        else:
+            loop.kind = "polling"
+
+        logger.debug("%s loop at $%04X, %d instructions and %d cycles an iteration", loop.kind, head, loop.length, loop.cycles)
+
+        return loop
+
+    def lookup(self, cpu: "CPU", head: int) -> Loop:
+        loop = self.loops.get(head)
+        if loop is None or cpu.memory.slice(head, head + len(loop.code)) != loop.code:
+            loop = self.analyse(cpu, head)
+            self.loops[head] = loop
+
+        return loop
+
+    def skip(self, cpu: "CPU", instructions: int, until_pc: int, until_cycles: int) -> int:
+        """Fast-forward the loop at the program counter, if it is idle.
+
+        Args:
+            cpu (CPU): The CPU, with the program counter on the loop head
+            instructions (int): The instructions left in the batch, the most that can be skipped
+            until_pc (int): The program counter the batch stops at
+            until_cycles (int): The cycle counter the batch stops at
+
+        Returns:
+            int: The number of instructions skipped
+        """
+        loop = self.lookup(cpu, cpu.program_counter)
+
+        if loop.kind is None or until_pc in loop.addresses:
+            return 0
+
+        if loop.kind == "countdown":
+            return self.skip_countdown(cpu, loop, instructions, until_cycles)
+
+        return self.skip_polling(cpu, loop, instructions, until_cycles)
+
+    def skip_countdown(self, cpu: "CPU", loop: Loop, instructions: int, until_cycles: int) -> int:
+        counter, _ = loop.steps[-1]
+        step = sum(step for register, step in loop.steps if register == counter)
+        if step not in (1, -1):
+            return 0
+
+        # the iterations until the counter wraps round to zero and the branch falls through - the last one doesn't pay
+        # for the taken branch
+        value = getattr(cpu, counter)
+        iterations = ((-value if step == 1 else value) & 0xFF) or 0x100
+        falls_through = iterations * loop.length <= instructions and cpu.cycles + iterations * loop.cycles - loop.penalty <= until_cycles
+
+        if not falls_through:
+            # as many whole iterations as fit the budgets, back round to the head
+            iterations = min(instructions // loop.length, (until_cycles - cpu.cycles) // loop.cycles)
+            if iterations <= 0:
+                return 0
+
+        for register in {register for register, _ in loop.steps}:
+            total = sum(step for name, step in loop.steps if name == register)
+            setattr(cpu, register, (getattr(cpu, register) + iterations * total) & 0xFF)
+
+        cpu.status = (cpu.status & CLEAR_ZERO_NEGATIVE) | ZERO_NEGATIVE_FLAGS[getattr(cpu, counter)]
+        cpu.cycles += iterations * loop.cycles
+        cpu.opcode = loop.closing
+
+        if falls_through:
+            cpu.cycles -= loop.penalty
+            cpu.program_counter = loop.addresses[-1] + loop.closing.length
+
+        return iterations * loop.length
+
+    def skip_polling(self, cpu: "CPU", loop: Loop, instructions: int, until_cycles: int) -> int:
+        registers = (self.batch, cpu.register_a, cpu.register_x, cpu.register_y, cpu.status, cpu.stack_pointer)
+        previous = loop.arrival
+        loop.arrival = (*registers, cpu.cycles, instructions)
+
+        if previous is None or previous[:-2] != registers:
+            return 0
+
+        # only a back to back arrival through the closing instruction repeats the iteration, not one where the loop was
+        # left and re-entered or one that came back round another way
+        cycles = cpu.cycles - previous[-2]
+        if previous[-1] - instructions != loop.length or not loop.min_cycles <= cycles <= loop.max_cycles:
+            return 0
+
+        iterations = min(instructions // loop.length, (until_cycles - cpu.cycles) // cycles)
+        if iterations <= 0:
+            return 0
+
+        cpu.cycles += iterations * cycles
+        loop.arrival = (*registers, cpu.cycles, instructions - iterations * loop.length)
+
+        return iterations * loop.length
@@ -0,0 +1,205 @@
+"""
+ROM library indexer - scans a directory tree of iNES/NES2.0 ROMs into an SQLite cache.
+
+Only the 16 byte header of each ROM is parsed, the PRG and CHR ROM are streamed through CRC32 and SHA-1 in chunks
+rather than read whole. Every ROM's format, mapper, mirroring, battery, trainer, TV system, sizes and hashes are kept
+in the cache keyed on its path, along with its modification time and size - a re-scan only reads the ROMs that were
+added or changed since the last one, and drops the ones that have gone. New and changed ROMs are indexed in parallel
+across a pool of worker processes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from cartridge import HEADER_SIZE, RomHeader, parse_header
+from constants import CartridgeFormat, HeaderFlags6, HeaderFlags9iNES
+
+ROM_SUFFIX: str = ".nes"
+CHUNK_SIZE: int = 0x10000
+# the number of ROMs sent to a worker at a time
+ROMS_PER_TASK: int = 16
+
+COLUMNS: Tuple[str, ...] = (
+    "path",
+    "modified",
+    "size",
+    "format",
+    "mapper",
+    "mirroring",
+    "battery",
+    "trainer",
+    "tv_system",
+    "program_rom_size",
+    "character_rom_size",
+    "program_rom_crc32",
+    "program_rom_sha1",
+    "character_rom_crc32",
+    "character_rom_sha1",
+    "error",
+)
+
+SCHEMA: str = f"CREATE TABLE IF NOT EXISTS roms ({', '.join(column + ' PRIMARY KEY' if column == 'path' else column for column in COLUMNS)})"
+
+# the NES2.0 timing in byte 12
+NES20_TV_SYSTEMS: Tuple[str, ...] = ("NTSC", "PAL", "MULTIPLE", "DENDY")
+
+
+def tv_system(header: RomHeader, raw_header: bytes) -> str:
+    if header.type == CartridgeFormat.nes20:
+        return NES20_TV_SYSTEMS[raw_header[12] & 0x03]
+
+    return "PAL" if HeaderFlags9iNES.PAL in HeaderFlags9iNES(raw_header[9]) else "NTSC"
+
+
+def stream_hashes(rom_file: BinaryIO, size: int) -> Tuple[str, str]:
+    """CRC32 and SHA-1 of the next size bytes of the file, read a chunk at a time.
+
+    Returns:
+        Tuple[str, str]: The CRC32 and SHA-1 as hex
+    """
+    crc32 = 0
+    sha1 = hashlib.sha1()
+
+    while size > 0:
+        chunk = rom_file.read(min(size, CHUNK_SIZE))
+        if not chunk:
+            raise ValueError("The ROM is shorter than its header says")
+
+        crc32 = zlib.crc32(chunk, crc32)
+        sha1.update(chunk)
+        size -= len(chunk)
+
+    return f"{crc32:08x}", sha1.hexdigest()
+
+
+def index_rom(path: Path) -> Dict[str, Any]:
+    """Index a single ROM - this is what each worker process runs.
+
+    Args:
+        path (Path): The ROM
+
+    Returns:
+        Dict[str, Any]: The row for the ROM, a ROM that can't be read or parsed has its error set
+    """
+    stat = path.stat()
+    row: Dict[str, Any] = dict.fromkeys(COLUMNS)
+    row.update({"path": str(path), "modified": stat.st_mtime_ns, "size": stat.st_size})
+
+    try:
+        with open(path, "rb") as rom_file:
+            raw_header = rom_file.read(HEADER_SIZE)
+            header = parse_header(raw_header, stat.st_size)
+
+            row.update(
+                {
+                    "format": header.type.value,
+                    "mapper": header.mapper,
+                    "mirroring": header.mirroring.value,
+                    "battery": bool(header.flags_6 & HeaderFlags6.BATTERY.value),
+                    "trainer": header.trainer,
+                    "tv_system": tv_system(header, raw_header),
+                    "program_rom_size": header.program_rom_size,
+                    "character_rom_size": header.character_rom_size,
+                }
+            )
+
+            rom_file.seek(header.program_rom_start)
+            row["program_rom_crc32"], row["program_rom_sha1"] = stream_hashes(rom_file, header.program_rom_size)
+            row["character_rom_crc32"], row["character_rom_sha1"] = stream_hashes(rom_file, header.character_rom_size)
+    except (OSError, ValueError) as e:
+        row["error"] = f"{e.__class__.__name__}: {e}"
+
+    return row
+
+
+def find_roms(directory: Path) -> List[Path]:
+    return sorted(path for path in directory.rglob("*") if path.is_file() and path.suffix.lower() == ROM_SUFFIX)
+
+
+class RomIndex:
+    """The SQLite cache of indexed ROMs.
+
+    Args:
+        database (Path): The SQLite database, created if it doesn't exist
+    """
+
+    connection: sqlite3.Connection
+
+    def __init__(self, database: Path) -> None:
+        self.connection = sqlite3.connect(database)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "RomIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def scan(self, directory: Path, workers: Optional[int] = None) -> Dict[str, int]:
+        """Bring the index up to date with the ROMs under the directory.
+
+        Args:
+            directory (Path): The root of the ROM library
+            workers (Optional[int]): The number of worker processes, defaults to the number of CPUs
+
+        Returns:
+            Dict[str, int]: How many ROMs were indexed, were unchanged and were removed from the index
+        """
+        # keyed on the absolute path, so the same library scanned from anywhere shares its entries
+        directory = directory.resolve()
+        cached = {row["path"]: (row["modified"], row["size"]) for row in self.connection.execute("SELECT path, modified, size FROM roms") if Path(row["path"]).is_relative_to(directory)}
+
+        found = set()
+        changed = []
+        for path in find_roms(directory):
+            found.add(str(path))
+            stat = path.stat()
+            if cached.get(str(path)) != (stat.st_mtime_ns, stat.st_size):
+                changed.append(path)
+
+        rows = []
+        if changed:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rows = list(executor.map(index_rom, changed, chunksize=ROMS_PER_TASK))
+
+        removed = [(path,) for path in cached.keys() - found]
+
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO roms ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(row[column] for column in COLUMNS) for row in rows],
+            )
+            self.connection.executemany("DELETE FROM roms WHERE path = ?", removed)
+
+        return {"indexed": len(rows), "unchanged": len(found) - len(rows), "removed": len(removed)}
+
+    def roms(self) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.connection.execute(f"SELECT {', '.join(COLUMNS)} FROM roms ORDER BY path")]
+
+    def get(self, path: Path) -> Optional[Dict[str, Any]]:
+        row = self.connection.execute(f"SELECT {', '.join(COLUMNS)} FROM roms WHERE path = ?", (str(path.resolve()),)).fetchone()
+        return dict(row) if row is not None else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path, help="The root of the ROM library")
+    parser.add_argument("-d", "--database", type=Path, default=Path("roms.sqlite"), help="The SQLite cache")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="The number of worker processes")
+    parser.add_argument("-l", "--list", action="store_true", help="Print every indexed ROM rather than a summary of the scan")
+
+    args = parser.parse_args()
+
+    with RomIndex(args.database) as index:
+        summary = index.scan(args.directory, workers=args.workers)
+        print(json.dumps(index.roms() if args.list else summary, indent=2))
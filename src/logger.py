@@ -1,8 +1,20 @@
-import functools
+"""
+Logging for the emulator.
+
+Every logger shares a single handler writing to the console, added once however many times get_logger is called.
+Log calls in code that runs often pass their values as arguments (logger.debug("at $%04X", address)) rather than
+formatting them first, so a message below the logger's level costs a level check and nothing else. Messages that
+need work to build even their arguments are guarded with logger.isEnabledFor.
+
+Set LOGGING_LEVEL to change the level of every logger, and LOGGING_ASYNC to write the log from a background thread -
+records are put on a queue and formatted and written by a QueueListener, so the emulation doesn't wait on the console.
+"""
+import atexit
 import logging
 import os
-from copy import copy
-from typing import Dict
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Dict, Optional
 
 
 class ColoredFormatter(logging.Formatter):
@@ -22,39 +34,106 @@ class ColoredFormatter(logging.Formatter):
     PREFIX: str = "\033["
     SUFFIX: str = "\033[0m"
 
+    # a plain formatter per level with the level name and message colored in its format, so a record is formatted
+    # once as it is rather than copied and recolored
+    formatters: Dict[str, logging.Formatter]
+    default: logging.Formatter
+
     def __init__(self, fmt=None, datefmt=None):
         logging.Formatter.__init__(self, fmt=fmt, datefmt=datefmt)
 
+        self.formatters = {levelname: self.colored(datefmt, seq) for levelname, seq in self.MAPPING.items()}
+        self.default = self.colored(datefmt, 37)  # default white
+
+    def colored(self, datefmt: Optional[str], seq: int) -> logging.Formatter:
+        # the format given, or the default one
+        fmt = self._style._fmt
+        for field in ("%(levelname)s", "%(message)s"):
+            fmt = fmt.replace(field, f"{self.PREFIX}{seq}m{field}{self.SUFFIX}")
+
+        return logging.Formatter(fmt=fmt, datefmt=datefmt)
+
     def format(self, record: logging.LogRecord) -> str:
-        colored_record = copy(record)
-        levelname = colored_record.levelname
-        message = colored_record.msg
+        return self.formatters.get(record.levelname, self.default).format(record)
+
+
+FORMAT: str = "%(asctime)s.%(msecs)03d | %(name)s {%(filename)s:%(lineno)d} | %(levelname)s | %(message)s"
+DATE_FORMAT: str = "%Y-%m-%d %H:%M:%S"
+
+# the loggers handed out, by name
+loggers: Dict[str, logging.Logger] = {}
+console_handler: Optional[logging.Handler] = None
+# while logging asynchronously, the handler putting records on the queue and the thread taking them off
+queue_handler: Optional[QueueHandler] = None
+listener: Optional[QueueListener] = None
+
+
+def get_console_handler() -> logging.Handler:
+    global console_handler
+
+    if console_handler is None:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.DEBUG)
+        console_handler.setFormatter(ColoredFormatter(fmt=FORMAT, datefmt=DATE_FORMAT))
 
-        seq = self.MAPPING.get(levelname, 37)  # default white
-        seq = self.MAPPING.get(levelname, 37)  # default white
-        colored_message = ("{0}{1}m{2}{3}").format(self.PREFIX, seq, message, self.SUFFIX)
-        colored_levelname = ("{0}{1}m{2}{3}").format(self.PREFIX, seq, levelname, self.SUFFIX)
+    return console_handler
 
-        colored_record.levelname = colored_levelname
-        colored_record.msg = colored_message
-        return logging.Formatter.format(self, colored_record)
+
+def get_handler() -> logging.Handler:
+    """The handler every logger shares - the queue while logging asynchronously, otherwise the console"""
+    return queue_handler if queue_handler is not None else get_console_handler()
+
+
+def start_async() -> None:
+    """Write the log from a background thread until stop_async (or exit)"""
+    global queue_handler, listener
+
+    if listener is not None:
+        return
+
+    queue = SimpleQueue()
+    # the message is still merged with its arguments when the record is queued, as they may change by the time the
+    # listener gets to it (the CPU's registers, say) - only records that pass the level check get that far
+    queue_handler = QueueHandler(queue)
+    console = get_console_handler()
+    listener = QueueListener(queue, console, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_async)
+
+    for logger in loggers.values():
+        logger.removeHandler(console)
+        logger.addHandler(queue_handler)
+
+
+def stop_async() -> None:
+    """Write out the records still queued and go back to writing the log as it's logged"""
+    global queue_handler, listener
+
+    if listener is None:
+        return
+
+    for logger in loggers.values():
+        logger.removeHandler(queue_handler)
+        logger.addHandler(get_console_handler())
+
+    # waits for the queue to be written out
+    listener.stop()
+    listener = None
+    queue_handler = None
+    atexit.unregister(stop_async)
 
 
-@functools.lru_cache
 def get_logger(name: str, level: str = "INFO") -> logging.Logger:
+    """The logger for a module or class, set to a level (or LOGGING_LEVEL) - the handler is only added the first time"""
     logger = logging.getLogger(name)
     logging_level = os.environ.get("LOGGING_LEVEL", level)
     logger.setLevel(getattr(logging, logging_level))
 
-    consoleHandler = logging.StreamHandler()
-    consoleHandler.setLevel(logging.DEBUG)
-
-    logger.addHandler(consoleHandler)
+    if name not in loggers:
+        if os.environ.get("LOGGING_ASYNC"):
+            start_async()
 
-    formatter = ColoredFormatter(
-        fmt="%(asctime)s.%(msecs)03d | %(name)s {%(filename)s:%(lineno)d} | %(levelname)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    consoleHandler.setFormatter(formatter)
+        logger.addHandler(get_handler())
+        loggers[name] = logger
 
     return logger
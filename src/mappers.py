@@ -0,0 +1,399 @@
+"""
+Cartridge mappers - the bank switching hardware on the cartridge.
+
+A mapper splits the cartridge's PRG ROM into page views once, when it's loaded, and a bank switch rebinds the CPU's
+page table entries for the switched range to the views of the new bank (see Memory.map_pages) - no bytes are copied,
+so switching banks costs the same whatever the bank size. CHR ROM (or CHR RAM) is split into 1KiB views the same way
+and the PPU's pattern tables are the eight views in character_pages.
+
+Writes to $8000-$FFFF go to the mapper's registers (Mapper.write), and the registers are saved in save states (see
+Mapper.state). New mappers subclass Mapper, list their registers in REGISTERS, switch their banks in from them in update
+and are registered in MAPPERS against their iNES mapper number.
+
+A mapper that raises interrupts (the MMC3's scanline counter) holds irq set until the game acknowledges it, the
+console takes the IRQ while it's held (see Console.run_frame).
+"""
+from copy import copy
+from typing import Dict, List, Tuple, Type, Union
+from constants import KB, Mirroring
+from memory import MEMORY_SIZE, PAGE_SIZE, PRG_ROM, Memory, page_views
+
+CHARACTER_PAGE_SIZE: int = KB
+CHARACTER_SIZE: int = 8 * KB
+# the mirroring in a save state, by index
+MIRRORINGS: List[Mirroring] = list(Mirroring)
+
+
+class Mapper:
+    """NROM (mapper 0) - up to 32KiB of PRG ROM and 8KiB of CHR ROM, no bank switching. A 16KiB PRG ROM is mirrored
+    into both banks.
+
+    Args:
+        cartridge (Cartridge): The cartridge
+        memory (Memory): The CPU's memory, with a bus
+    """
+
+    number: int = 0
+    # the attributes holding the mapper's registers, each saved as a byte in a save state
+    REGISTERS: Tuple[str, ...] = ()
+    # whether scanline can raise an IRQ, the PPU then catches up a scanline at a time
+    SCANLINE_IRQ: bool = False
+
+    memory: Memory
+    mirroring: Mirroring
+    # the PRG ROM as CPU pages, and the CHR ROM/RAM as 1KiB PPU pages
+    program_pages: List[memoryview]
+    character_banks: List[memoryview]
+    character_ram: bool
+    # the PPU's pattern tables, $0000-$1FFF in 1KiB pages, and the index into character_banks of each page
+    character_pages: List[memoryview]
+    character_page_banks: List[int]
+    # the IRQ line, held by mappers that raise interrupts
+    irq: bool = False
+
+    def __init__(self, cartridge: "Cartridge", memory: Memory) -> None:
+        self.memory = memory
+        self.mirroring = cartridge.rom_header.mirroring
+
+        # maps SRAM, and the PRG ROM as NROM would until the mapper sets up its banks
+        memory.load_cartridge(cartridge)
+
+        self.program_pages = page_views(cartridge.program_rom)
+
+        # without CHR ROM the cartridge has 8KiB of CHR RAM
+        self.character_ram = not len(cartridge.character_rom)
+        character: Union[memoryview, bytearray] = bytearray(CHARACTER_SIZE) if self.character_ram else cartridge.character_rom
+        view = memoryview(character)
+        self.character_banks = [view[offset : offset + CHARACTER_PAGE_SIZE] for offset in range(0, len(view), CHARACTER_PAGE_SIZE)]
+        self.character_pages = self.character_banks[: CHARACTER_SIZE // CHARACTER_PAGE_SIZE]
+        self.character_page_banks = list(range(len(self.character_pages)))
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Map the banks the mapper powers up with and its registers"""
+        self.update()
+
+    def update(self) -> None:
+        """Switch in the banks the registers select"""
+        self.map_program(PRG_ROM, 0, MEMORY_SIZE - PRG_ROM)
+
+    def state(self) -> bytes:
+        """The mapper's registers and mirroring, for a save state - see Memory.snapshot"""
+        return bytes([MIRRORINGS.index(self.mirroring), *(getattr(self, name) for name in self.REGISTERS)])
+
+    def restore_state(self, state: bytes) -> None:
+        """Restore the registers saved by state and switch the banks they select back in"""
+        if len(state) != 1 + len(self.REGISTERS):
+            raise ValueError(f"Not the state of a {self.__class__.__name__} mapper: {len(state)} bytes")
+
+        self.mirroring = MIRRORINGS[state[0]]
+        for name, value in zip(self.REGISTERS, state[1:]):
+            # booleans (IRQ flags) stay booleans
+            setattr(self, name, type(getattr(self, name))(value))
+
+        self.update()
+
+    def write(self, addr: int, data: int) -> None:
+        """A CPU write to $8000-$FFFF - NROM has no registers, so the write is ignored like any other write to ROM"""
+        pass
+
+    def fork(self, memory: Memory) -> "Mapper":
+        """A copy of the mapper driving a fork of its memory - see Memory.fork. The copy has its own registers and
+        pattern tables, so a bank switch through the fork only switches the fork's banks. CHR RAM stays shared with
+        the PPU, which draws from this mapper."""
+        child = copy(self)
+        child.memory = memory
+        child.character_pages = self.character_pages.copy()
+        child.character_page_banks = self.character_page_banks.copy()
+
+        return child
+
+    def map_program(self, start: int, bank: int, size: int) -> None:
+        """Switch a bank of PRG ROM into the CPU address space.
+
+        Args:
+            start (int): The CPU address of the bank
+            bank (int): The bank number in units of size, negative numbers count back from the last bank and bank
+                numbers wrap around the ROM
+            size (int): The size of the bank
+
+        Returns:
+            None
+        """
+        pages = size // PAGE_SIZE
+        first = (bank * pages) % len(self.program_pages)
+        views = self.program_pages[first : first + pages]
+        # a ROM smaller than the bank is mirrored across it
+        while len(views) < pages:
+            views = views + self.program_pages[: pages - len(views)]
+
+        self.memory.map_pages(start, views, self.write)
+
+    def map_character(self, start: int, bank: int, size: int) -> None:
+        """Switch a bank of CHR ROM into the PPU's pattern tables.
+
+        Args:
+            start (int): The PPU address of the bank
+            bank (int): The bank number in units of size, bank numbers wrap around the ROM
+            size (int): The size of the bank
+
+        Returns:
+            None
+        """
+        pages = size // CHARACTER_PAGE_SIZE
+        first = (bank * pages) % len(self.character_banks)
+        page = start // CHARACTER_PAGE_SIZE
+
+        self.character_pages[page : page + pages] = self.character_banks[first : first + pages]
+        self.character_page_banks[page : page + pages] = range(first, first + pages)
+
+    def read_character(self, addr: int) -> int:
+        return self.character_pages[addr >> 10][addr & 0x3FF]
+
+    def write_character(self, addr: int, data: int) -> None:
+        # writes to CHR ROM are ignored
+        if self.character_ram:
+            self.character_pages[addr >> 10][addr & 0x3FF] = data
+
+    def scanline(self) -> None:
+        """Called by the PPU at the end of each visible scanline, for mappers that count them"""
+        pass
+
+
+class MMC1(Mapper):
+    """MMC1 (mapper 1) - 16 or 32KiB PRG banks, 4 or 8KiB CHR banks and switchable mirroring, all written a bit at a
+    time through a serial port.
+
+    https://www.nesdev.org/wiki/MMC1
+    """
+
+    number: int = 1
+    REGISTERS: Tuple[str, ...] = ("shift", "control", "character_bank_0", "character_bank_1", "program_bank")
+
+    MIRRORING: List[Mirroring] = [Mirroring.SINGLE_LOWER, Mirroring.SINGLE_UPPER, Mirroring.VERTICAL, Mirroring.HORIZONTAL]
+
+    def reset(self) -> None:
+        self.shift = 0x10
+        # power up with the last PRG bank fixed at $C000
+        self.control = 0x0C
+        self.character_bank_0 = 0
+        self.character_bank_1 = 0
+        self.program_bank = 0
+
+        self.update()
+
+    def write(self, addr: int, data: int) -> None:
+        # writing a value with bit 7 set resets the shift register
+        if data & 0x80:
+            self.shift = 0x10
+            self.control |= 0x0C
+            self.update()
+            return
+
+        # the 1 the shift register is reset to reaches bit 0 on the fourth write, so the fifth write completes it
+        complete = self.shift & 0x01
+        self.shift = (self.shift >> 1) | ((data & 0x01) << 4)
+        if not complete:
+            return
+
+        value = self.shift
+        self.shift = 0x10
+
+        match (addr >> 13) & 0x03:
+            case 0:
+                self.control = value
+            case 1:
+                self.character_bank_0 = value
+            case 2:
+                self.character_bank_1 = value
+            case 3:
+                self.program_bank = value & 0x0F
+
+        self.update()
+
+    def update(self) -> None:
+        self.mirroring = self.MIRRORING[self.control & 0x03]
+
+        match (self.control >> 2) & 0x03:
+            case 0 | 1:
+                # 32KiB, the low bit of the bank number is ignored
+                self.map_program(PRG_ROM, self.program_bank >> 1, 0x8000)
+            case 2:
+                self.map_program(0x8000, 0, 0x4000)
+                self.map_program(0xC000, self.program_bank, 0x4000)
+            case 3:
+                self.map_program(0x8000, self.program_bank, 0x4000)
+                self.map_program(0xC000, -1, 0x4000)
+
+        if self.control & 0x10:
+            self.map_character(0x0000, self.character_bank_0, 0x1000)
+            self.map_character(0x1000, self.character_bank_1, 0x1000)
+        else:
+            self.map_character(0x0000, self.character_bank_0 >> 1, 0x2000)
+
+
+class UxROM(Mapper):
+    """UxROM (mapper 2) - a switchable 16KiB PRG bank at $8000 and the last bank fixed at $C000.
+
+    https://www.nesdev.org/wiki/UxROM
+    """
+
+    number: int = 2
+    REGISTERS: Tuple[str, ...] = ("program_bank",)
+
+    def reset(self) -> None:
+        self.program_bank = 0
+        self.update()
+
+    def write(self, addr: int, data: int) -> None:
+        self.program_bank = data
+        self.map_program(0x8000, data, 0x4000)
+
+    def update(self) -> None:
+        self.map_program(0x8000, self.program_bank, 0x4000)
+        self.map_program(0xC000, -1, 0x4000)
+
+
+class CNROM(Mapper):
+    """CNROM (mapper 3) - fixed PRG ROM like NROM and a switchable 8KiB CHR bank.
+
+    https://www.nesdev.org/wiki/CNROM
+    """
+
+    number: int = 3
+    REGISTERS: Tuple[str, ...] = ("character_bank",)
+
+    def reset(self) -> None:
+        self.character_bank = 0
+        self.update()
+
+    def write(self, addr: int, data: int) -> None:
+        self.character_bank = data
+        self.map_character(0x0000, data, 0x2000)
+
+    def update(self) -> None:
+        super().update()
+        self.map_character(0x0000, self.character_bank, 0x2000)
+
+
+class MMC3(Mapper):
+    """MMC3 (mapper 4) - 8KiB PRG banks, 1 and 2KiB CHR banks, switchable mirroring and a scanline counter that
+    raises an IRQ.
+
+    https://www.nesdev.org/wiki/MMC3
+    """
+
+    number: int = 4
+    REGISTERS: Tuple[str, ...] = ("bank_select", "irq_latch", "irq_counter", "irq_reload", "irq_enabled", "irq")
+    SCANLINE_IRQ: bool = True
+
+    def reset(self) -> None:
+        self.bank_select = 0
+        # R0-R7
+        self.registers = [0, 2, 4, 5, 6, 7, 0, 1]
+
+        self.irq_latch = 0
+        self.irq_counter = 0
+        self.irq_reload = False
+        self.irq_enabled = False
+        self.irq = False
+
+        self.update()
+
+    def fork(self, memory: Memory) -> "MMC3":
+        child = super().fork(memory)
+        child.registers = self.registers.copy()
+
+        return child
+
+    def state(self) -> bytes:
+        # R0-R7 follow the rest
+        return super().state() + bytes(self.registers)
+
+    def restore_state(self, state: bytes) -> None:
+        super().restore_state(state[: -len(self.registers)])
+        self.registers = list(state[-len(self.registers) :])
+        self.update()
+
+    def write(self, addr: int, data: int) -> None:
+        even = not addr & 0x01
+
+        match addr & 0xE000:
+            case 0x8000 if even:
+                self.bank_select = data
+            case 0x8000:
+                self.registers[self.bank_select & 0x07] = data
+            case 0xA000 if even:
+                if self.mirroring != Mirroring.FOUR_SCREEN:
+                    self.mirroring = Mirroring.HORIZONTAL if data & 0x01 else Mirroring.VERTICAL
+                return
+            case 0xA000:
+                # PRG RAM protect
+                return
+            case 0xC000 if even:
+                self.irq_latch = data
+                return
+            case 0xC000:
+                self.irq_counter = 0
+                self.irq_reload = True
+                return
+            case 0xE000 if even:
+                # disabling also acknowledges a pending IRQ
+                self.irq_enabled = False
+                self.irq = False
+                return
+            case 0xE000:
+                self.irq_enabled = True
+                return
+
+        self.update()
+
+    def update(self) -> None:
+        registers = self.registers
+
+        # PRG mode 1 swaps $8000 and $C000
+        if self.bank_select & 0x40:
+            self.map_program(0x8000, -2, 0x2000)
+            self.map_program(0xC000, registers[6], 0x2000)
+        else:
+            self.map_program(0x8000, registers[6], 0x2000)
+            self.map_program(0xC000, -2, 0x2000)
+        self.map_program(0xA000, registers[7], 0x2000)
+        self.map_program(0xE000, -1, 0x2000)
+
+        # CHR A12 inversion swaps the 2KiB and the 1KiB banks between the pattern tables
+        inverted = 0x1000 if self.bank_select & 0x80 else 0x0000
+        self.map_character(0x0000 ^ inverted, registers[0] >> 1, 0x0800)
+        self.map_character(0x0800 ^ inverted, registers[1] >> 1, 0x0800)
+        for i, register in enumerate(registers[2:6]):
+            self.map_character((0x1000 + i * 0x0400) ^ inverted, register, 0x0400)
+
+    def scanline(self) -> None:
+        if self.irq_counter == 0 or self.irq_reload:
+            self.irq_counter = self.irq_latch
+            self.irq_reload = False
+        else:
+            self.irq_counter -= 1
+
+        if self.irq_counter == 0 and self.irq_enabled:
+            self.irq = True
+
+
+MAPPERS: Dict[int, Type[Mapper]] = {mapper.number: mapper for mapper in (Mapper, MMC1, UxROM, CNROM, MMC3)}
+
+
+def create_mapper(cartridge: "Cartridge", memory: Memory) -> Mapper:
+    """Load the cartridge into memory through the mapper its header asks for.
+
+    Args:
+        cartridge (Cartridge): The cartridge
+        memory (Memory): The CPU's memory, with a bus
+
+    Returns:
+        Mapper: The mapper
+    """
+    if cartridge.mapper not in MAPPERS:
+        raise ValueError(f"Mapper {cartridge.mapper} is not supported, only mappers {sorted(MAPPERS)} are")
+
+    return MAPPERS[cartridge.mapper](cartridge, memory)
@@ -1,4 +1,7 @@
-from typing import List
+import struct
+from copy import copy
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from apu import APU
 
 # //  _______________ $10000  _______________
 # // | PRG-ROM       |       |               |
@@ -29,49 +32,580 @@ from typing import List
 # // |_______________| $0000 |_______________|
 
 RAM: int = 0x0000
+RAM_SIZE: int = 0x0800
 RAM_MIRRORS_END: int = 0x1FFF
 PPU_REGISTERS: int = 0x2000
 PPU_REGISTERS_MIRRORS_END: int = 0x3FFF
-MEMORY_SIZE: int = 0xFFFF
+IO_REGISTERS: int = 0x4000
+EXPANSION_ROM: int = 0x4020
+SRAM: int = 0x6000
+SRAM_SIZE: int = 0x2000
+PRG_ROM: int = 0x8000
+MEMORY_SIZE: int = 0x10000
+
+PAGE_SIZE: int = 0x100
+PAGE_COUNT: int = MEMORY_SIZE // PAGE_SIZE
+
+# save states - a header followed by each of the writable regions (flat memory, or RAM and SRAM on the bus) and then
+# the state of each device that has any (the mapper's registers), all as a length and the raw bytes
+SNAPSHOT_MAGIC: bytes = b"WYMM"
+SNAPSHOT_VERSION: int = 2
+SNAPSHOT_HEADER: struct.Struct = struct.Struct("<4sBB")  # magic, version, has_bus
+REGION_HEADER: struct.Struct = struct.Struct("<I")  # length
+
+ReadHandler = Callable[[int], int]
+WriteHandler = Callable[[int, int], None]
+
+
+def page_views(buffer: Union[bytes, bytearray, memoryview]) -> List[memoryview]:
+    """Split a buffer into zero-copy views of each of its pages - see Memory.map_pages.
+
+    Args:
+        buffer (Union[bytes, bytearray, memoryview]): The buffer, a multiple of the page size
+
+    Returns:
+        List[memoryview]: A view of each page
+    """
+    view = memoryview(buffer)
+    if not len(view) or len(view) % PAGE_SIZE:
+        raise ValueError(f"Can't split a buffer of {len(view)} bytes into pages: it must be a multiple of the page size")
+
+    return [view[offset : offset + PAGE_SIZE] for offset in range(0, len(view), PAGE_SIZE)]
+
+
+class Watch:
+    """A watched range of addresses - a write anywhere in the range sets the dirty flag of the cell it lands in, so a
+    renderer can redraw only the cells (pixels, tiles) written since it last cleared them, and skip frames where
+    nothing was. Mapping something else onto the range (a bank switch) marks the cells it covers too.
+
+    Args:
+        start (int): The first address watched
+        end (int): The address after the last one watched
+        granularity (int): The size of a cell in bytes, a power of two - 1 for a flag per byte, PAGE_SIZE for a flag
+            per page
+    """
+
+    start: int
+    end: int
+    shift: int
+    # a flag per cell, 1 once it's been written to
+    dirty: bytearray
+    # whether any cell has been written to
+    changed: bool
+
+    def __init__(self, start: int, end: int, granularity: int = 1) -> None:
+        if end <= start:
+            raise ValueError(f"Can't watch {hex(start)}-{hex(end)}: the range is empty")
+
+        if granularity <= 0 or granularity & (granularity - 1):
+            raise ValueError(f"Can't watch in cells of {granularity} bytes: the granularity must be a power of two")
+
+        self.start = start
+        self.end = end
+        self.shift = granularity.bit_length() - 1
+        self.dirty = bytearray((end - start + granularity - 1) >> self.shift)
+        self.changed = False
+
+    def mark(self, addr: int) -> None:
+        if self.start <= addr < self.end:
+            self.dirty[(addr - self.start) >> self.shift] = 1
+            self.changed = True
+
+    def mark_range(self, start: int, end: int) -> None:
+        start = max(start, self.start)
+        end = min(end, self.end)
+        if start < end:
+            first = (start - self.start) >> self.shift
+            last = ((end - 1 - self.start) >> self.shift) + 1
+            self.dirty[first:last] = b"\x01" * (last - first)
+            self.changed = True
+
+    def mark_all(self) -> None:
+        self.mark_range(self.start, self.end)
+
+    def cells(self) -> List[int]:
+        """The index of every dirty cell, in address order"""
+        if not self.changed:
+            return []
+
+        return [cell for cell, dirty in enumerate(self.dirty) if dirty]
+
+    def clear(self) -> None:
+        if self.changed:
+            self.dirty[:] = bytes(len(self.dirty))
+            self.changed = False
 
 
 class Memory:
+    """The CPU address space.
+
+    Without a bus the memory is a flat 64KiB buffer. With a bus the address space is split into 256 pages of 256 bytes,
+    each page either points straight into a backing buffer (RAM, SRAM, PRG-ROM) or at a pair of read/write handlers
+    (PPU registers, APU/IO). Reads and writes through a buffer page are a single index, so a device only costs a
+    function call on the pages it actually owns.
+
+    Memory can be forked (see Memory.fork) to branch execution from a single state, and ranges of it watched for
+    writes (see Memory.watch).
+    """
+
+    read_pages: List[Optional[memoryview]]
+    write_pages: List[Optional[memoryview]]
+    read_handlers: List[ReadHandler]
+    write_handlers: List[WriteHandler]
+    # the APU and I/O registers on the bus
+    apu: Optional[APU]
+    # the writable buffers mapped into the address space as (start, end, buffer)
+    buffers: List[Tuple[int, int, Union[bytearray, memoryview]]]
+    # the watched ranges, and on the bus the write page and handler each watched page had before watched_write took
+    # it over
+    watches: List[Watch]
+    unwatched_pages: Dict[int, Tuple[Optional[memoryview], WriteHandler]]
+
     def __init__(self, has_bus: bool = False, *args, **kwargs):
         super(Memory, self).__init__(*args, **kwargs)
 
         self.has_bus = has_bus
 
+        # flat memory is the whole 64KiB address space in a single buffer, so windows into it can be handed out as
+        # memoryviews without copying
+        if not self.has_bus:
+            self.data = bytearray(MEMORY_SIZE)
+            self.cpu_vram = bytearray()
+        else:
+            self.data = bytearray()
+            self.cpu_vram = bytearray(RAM_SIZE)
+
+        # mapped by load_cartridge
+        self.sram = bytearray()
+
+        self.read_pages = [None] * PAGE_COUNT
+        self.write_pages = [None] * PAGE_COUNT
+        self.read_handlers = [self.unmapped_read] * PAGE_COUNT
+        self.write_handlers = [self.unmapped_write] * PAGE_COUNT
+        self.buffers = []
+        self.watches = []
+        self.unwatched_pages = {}
+        self.apu = None
+
+        if self.has_bus:
+            self.map_buffer(RAM, RAM_MIRRORS_END + 1, self.cpu_vram)
+            self.map_handlers(PPU_REGISTERS, PPU_REGISTERS_MIRRORS_END + 1, self.unmapped_ppu_read, self.unmapped_ppu_write)
+            self.apu = APU()
+            self.map_handlers(IO_REGISTERS, IO_REGISTERS + PAGE_SIZE, self.apu.read, self.apu.write)
+
+    def map_buffer(self, start: int, end: int, buffer: Union[bytes, bytearray, memoryview], writable: bool = True) -> None:
+        """Map the pages from start to end onto a backing buffer.
+
+        The buffer is mirrored across the range when it is smaller than it, i.e. the 2KiB of RAM repeats four times
+        across $0000-$1FFF.
+
+        Args:
+            start (int): The first address of the range, page aligned
+            end (int): The address after the end of the range, page aligned
+            buffer (Union[bytes, bytearray, memoryview]): The backing buffer, a multiple of the page size
+            writable (bool): If False writes to the range are ignored (ROM)
+
+        Returns:
+            None
+        """
+        self.bind_buffer(start, end, buffer, writable)
+        self.remapped(start, end)
+
+    def bind_buffer(self, start: int, end: int, buffer: Union[bytes, bytearray, memoryview], writable: bool = True) -> None:
+        # map_buffer without marking the watches, for a copy of the buffer already mapped
+        if start % PAGE_SIZE or end % PAGE_SIZE or not len(buffer) or len(buffer) % PAGE_SIZE:
+            raise ValueError(f"Can't map a buffer of {len(buffer)} bytes onto {hex(start)}-{hex(end)}: both must be page aligned")
+
+        view = memoryview(buffer)
+        if view.readonly:
+            writable = False
+
+        first_page = start // PAGE_SIZE
+        for page in range(first_page, end // PAGE_SIZE):
+            offset = ((page - first_page) * PAGE_SIZE) % len(view)
+            page_view = view[offset : offset + PAGE_SIZE]
+
+            self.read_pages[page] = page_view
+            self.write_pages[page] = page_view if writable else None
+            self.write_handlers[page] = self.unmapped_write if writable else self.read_only_write
+
+        self.forget_buffers(start, end)
+        if writable:
+            self.buffers.append((start, end, buffer))
+
+        self.watch_pages(start, end)
+
+    def map_handlers(self, start: int, end: int, read: ReadHandler, write: WriteHandler) -> None:
+        """Map the pages from start to end onto a device - every access to the range calls the handler with the full
+        address, so the device is responsible for its own mirroring.
+
+        Args:
+            start (int): The first address of the range, page aligned
+            end (int): The address after the end of the range, page aligned
+            read (ReadHandler): Called as read(addr) and returns the byte at the address
+            write (WriteHandler): Called as write(addr, data)
+
+        Returns:
+            None
+        """
+        if start % PAGE_SIZE or end % PAGE_SIZE:
+            raise ValueError(f"Can't map handlers onto {hex(start)}-{hex(end)}: the range must be page aligned")
+
+        for page in range(start // PAGE_SIZE, end // PAGE_SIZE):
+            self.read_pages[page] = None
+            self.write_pages[page] = None
+            self.read_handlers[page] = read
+            self.write_handlers[page] = write
+
+        self.forget_buffers(start, end)
+        self.watch_pages(start, end)
+        self.remapped(start, end)
+
+    def map_pages(self, start: int, pages: List[memoryview], write: Optional[WriteHandler] = None) -> None:
+        """Point the pages from start at read-only page views made by page_views - this is how a mapper switches banks,
+        the page table entries are rebound and nothing is copied.
+
+        Args:
+            start (int): The first address of the range, page aligned
+            pages (List[memoryview]): The views to map, one per page
+            write (Optional[WriteHandler]): Called as write(addr, data) for writes to the range (a mapper's
+                registers), by default they are ignored
+
+        Returns:
+            None
+        """
+        if start % PAGE_SIZE:
+            raise ValueError(f"Can't map pages onto {hex(start)}: the range must be page aligned")
+
+        first_page = start // PAGE_SIZE
+        last_page = first_page + len(pages)
+
+        self.read_pages[first_page:last_page] = pages
+        self.write_pages[first_page:last_page] = [None] * len(pages)
+        self.write_handlers[first_page:last_page] = [write or self.read_only_write] * len(pages)
+
+        if self.buffers:
+            self.forget_buffers(start, last_page * PAGE_SIZE)
+
+        if self.watches:
+            self.watch_pages(start, last_page * PAGE_SIZE)
+            self.remapped(start, last_page * PAGE_SIZE)
+
+    def forget_buffers(self, start: int, end: int) -> None:
+        # the range has been remapped, so any buffer that was mapped onto it no longer is
+        self.buffers = [mapping for mapping in self.buffers if mapping[1] <= start or mapping[0] >= end]
+
+    def fork(self) -> "Memory":
+        """A copy of memory to branch execution from - writes to the fork aren't seen by this memory and vice versa.
+
+        On the bus the fork shares the ROM, and the writable buffers (RAM, SRAM) are copy on write: they are shared
+        until either memory writes to one, only then is it copied. The devices mapped with handlers that have state of
+        their own to fork (the mapper's bank registers, the APU) have a fork(memory) method, the fork gets a copy of
+        each made by it with its handlers bound to the copy, so a bank switch through the fork only remaps the fork.
+        Devices without one (the PPU) are shared. Flat memory is a single 64KiB buffer which is copied straight away -
+        a copy is a single memcpy, cheaper than building a page table to share it.
+
+        Returns:
+            Memory: The fork
+        """
+        child = copy(self)
+        if not self.has_bus:
+            child.data = bytearray(self.data)
+            return child
+
+        child.read_pages = self.read_pages.copy()
+        child.write_pages = self.write_pages.copy()
+        child.read_handlers = self.read_handlers.copy()
+        child.write_handlers = self.write_handlers.copy()
+        child.buffers = self.buffers.copy()
+
+        # the watches belong to this memory, the fork starts without any
+        child.watches = []
+        child.unwatched_pages = {}
+        for page, (write_page, write_handler) in self.unwatched_pages.items():
+            child.write_pages[page] = write_page
+            child.write_handlers[page] = write_handler
+
+        # the handlers of this memory and its devices, rebound to the fork and the devices' forks
+        forks = {id(self): child}
+        child.read_handlers = [self.fork_handler(handler, child, forks) for handler in child.read_handlers]
+        child.write_handlers = [self.fork_handler(handler, child, forks) for handler in child.write_handlers]
+        child.apu = forks.get(id(self.apu), self.apu)
+
+        self.share_buffers()
+        child.share_buffers()
+
+        return child
+
+    @staticmethod
+    def fork_handler(handler: Callable, child: "Memory", forks: Dict[int, object]) -> Callable:
+        # a handler bound to a device that can be forked is bound to its fork instead, each device is forked once
+        device = getattr(handler, "__self__", None)
+        if device is None:
+            return handler
+
+        forked = forks.get(id(device))
+        if forked is None:
+            if not hasattr(device, "fork"):
+                return handler
+
+            forked = forks[id(device)] = device.fork(child)
+
+        return getattr(forked, handler.__name__)
+
+    def share_buffers(self) -> None:
+        # writes to a shared buffer go to copy_on_write, which copies it before the write goes through
+        copy_on_write = self.copy_on_write
+        for start, end, _ in self.buffers:
+            pages = (end - start) // PAGE_SIZE
+            self.write_pages[start // PAGE_SIZE : end // PAGE_SIZE] = [None] * pages
+            self.write_handlers[start // PAGE_SIZE : end // PAGE_SIZE] = [copy_on_write] * pages
+
+            self.watch_pages(start, end)
+
+    def unshare_buffer(self, addr: int) -> None:
+        """Give this memory its own copy of the shared buffer mapped at the address.
+
+        Args:
+            addr (int): An address in the range the buffer is mapped onto
+
+        Returns:
+            None
+        """
+        for start, end, buffer in self.buffers:
+            if start <= addr < end:
+                break
+        else:
+            raise ValueError(f"No buffer is mapped at address {addr}")
+
+        copied = bytearray(buffer)
+        self.bind_buffer(start, end, copied)
+
+        if self.cpu_vram is buffer:
+            self.cpu_vram = copied
+        if self.sram is buffer:
+            self.sram = copied
+
+    def is_shared(self, addr: int) -> bool:
+        """Whether the buffer mapped at the address is shared with a fork, and is copied on the next write"""
+        page = addr // PAGE_SIZE
+        write = self.unwatched_pages[page][1] if page in self.unwatched_pages else self.write_handlers[page]
+
+        return write == self.copy_on_write
+
+    def copy_on_write(self, addr: int, data: int) -> None:
+        self.unshare_buffer(addr)
+        self.write(addr, data)
+
+    def watch(self, start: int, end: int, granularity: int = 1) -> Watch:
+        """Watch a range of addresses for writes - see Watch.
+
+        On the bus the watched pages lose the single index fast path, writes to them go through watched_write, so only
+        writes to the watched pages pay for it. Flat memory has no page table, every write checks for watches while
+        there are any.
+
+        Args:
+            start (int): The first address to watch
+            end (int): The address after the last one to watch
+            granularity (int): The size of a cell in bytes, a power of two
+
+        Returns:
+            Watch: The watch, clear its dirty flags once the writes have been dealt with
+        """
+        if not 0 <= start < end <= MEMORY_SIZE:
+            raise ValueError(f"Can't watch {hex(start)}-{hex(end)}: the range must be inside the address space")
+
+        watch = Watch(start, end, granularity)
+        self.watches.append(watch)
+        self.watch_pages(start, end)
+
+        return watch
+
+    def unwatch(self, watch: Watch) -> None:
+        """Stop watching a range watched with Memory.watch - pages no other watch covers get their fast path back."""
+        self.watches.remove(watch)
+
+        for page in list(self.unwatched_pages):
+            address = page * PAGE_SIZE
+            if not any(other.start < address + PAGE_SIZE and address < other.end for other in self.watches):
+                self.write_pages[page], self.write_handlers[page] = self.unwatched_pages.pop(page)
+
+    def watch_pages(self, start: int, end: int) -> None:
+        # (re)direct writes to the watched pages in the range to watched_write - called whenever the range is mapped
         if not self.has_bus:
-            self.data = [0] * MEMORY_SIZE
-            self.cpu_vram = []
+            return
+
+        watched_write = self.watched_write
+        for watch in self.watches:
+            for page in range(max(start, watch.start) // PAGE_SIZE, (min(end, watch.end) - 1) // PAGE_SIZE + 1):
+                if self.write_handlers[page] != watched_write:
+                    self.unwatched_pages[page] = (self.write_pages[page], self.write_handlers[page])
+                    self.write_pages[page] = None
+                    self.write_handlers[page] = watched_write
+
+    def remapped(self, start: int, end: int) -> None:
+        # what's read from the range has changed as if it had all been written
+        for watch in self.watches:
+            watch.mark_range(start, end)
+
+    def watched_write(self, addr: int, data: int) -> None:
+        for watch in self.watches:
+            watch.mark(addr)
+
+        page, handler = self.unwatched_pages[addr >> 8]
+        if page is not None:
+            page[addr & 0xFF] = data
         else:
-            self.data = []
-            self.cpu_vram = [0] * 0x800
+            handler(addr, data)
+
+    def load_cartridge(self, cartridge: "Cartridge") -> None:
+        """Map the cartridge's SRAM and PRG-ROM into the address space - a 16KiB PRG-ROM is mirrored into both
+        banks."""
+        if not self.has_bus:
+            raise ValueError("A cartridge can only be loaded into memory with a bus")
+
+        self.sram = bytearray(SRAM_SIZE)
+        self.map_buffer(SRAM, PRG_ROM, self.sram)
+        self.map_buffer(PRG_ROM, MEMORY_SIZE, cartridge.program_rom, writable=False)
+
+    def unmapped_read(self, addr: int) -> int:
+        raise ValueError(f"Not implemented for address {addr}")
+
+    def unmapped_write(self, addr: int, data: int) -> None:
+        raise ValueError(f"Not implemented for address {addr}")
+
+    def unmapped_ppu_read(self, addr: int) -> int:
+        raise ValueError(f"Not implemented for PPU: address {addr}")
+
+    def unmapped_ppu_write(self, addr: int, data: int) -> None:
+        raise ValueError(f"Not implemented for PPU: address {addr}")
+
+    def read_only_write(self, addr: int, data: int) -> None:
+        # writes to ROM are ignored on the real hardware
+        pass
+
+    def regions(self) -> List[bytearray]:
+        """The buffers holding the writable state of memory"""
+        if not self.has_bus:
+            return [self.data]
+
+        return [self.cpu_vram, self.sram]
+
+    def stateful_devices(self) -> List[object]:
+        """The devices mapped with handlers that have state to save (a state method), each once in address order"""
+        devices: Dict[int, object] = {}
+        for page in range(PAGE_COUNT):
+            write = self.unwatched_pages[page][1] if page in self.unwatched_pages else self.write_handlers[page]
+            for handler in (self.read_handlers[page], write):
+                device = getattr(handler, "__self__", None)
+                if device is not None and device is not self and hasattr(device, "state"):
+                    devices.setdefault(id(device), device)
+
+        return list(devices.values())
+
+    def snapshot(self) -> bytes:
+        """Serialise the contents of memory to a versioned binary blob.
+
+        The writable regions are saved, and the state of the devices mapped into memory that have a state method -
+        the mapper's bank registers, so the PRG ROM banks switched in are switched back in on restore. The ROM isn't
+        saved and has to be the same when the snapshot is restored, and neither is the state of the PPU (including
+        CHR RAM) or the APU stub.
+
+        Returns:
+            bytes: The snapshot
+        """
+        parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.has_bus)]
+        for region in [*self.regions(), *(device.state() for device in self.stateful_devices())]:
+            parts.append(REGION_HEADER.pack(len(region)))
+            parts.append(region)
+
+        return b"".join(parts)
+
+    def restore(self, snapshot: Union[bytes, memoryview]) -> None:
+        """Restore the contents of memory from a snapshot.
+
+        The buffers are overwritten in place, so the page table and any views handed out stay valid. The snapshot is
+        checked in full before anything is written.
+
+        Args:
+            snapshot (Union[bytes, memoryview]): A snapshot taken by Memory.snapshot
+
+        Returns:
+            None
+        """
+        view = memoryview(snapshot)
+        if len(view) < SNAPSHOT_HEADER.size:
+            raise ValueError("Not a memory snapshot: too short")
+
+        magic, version, has_bus = SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a memory snapshot")
+
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported memory snapshot version {version}, expected {SNAPSHOT_VERSION}")
+
+        if bool(has_bus) != self.has_bus:
+            raise ValueError("The memory snapshot doesn't match the memory layout: has_bus differs")
+
+        devices = self.stateful_devices()
+
+        offset = SNAPSHOT_HEADER.size
+        contents = []
+        for expected in [*map(len, self.regions()), *(len(device.state()) for device in devices)]:
+            if len(view) < offset + REGION_HEADER.size:
+                raise ValueError("The memory snapshot is truncated")
+
+            (length,) = REGION_HEADER.unpack_from(view, offset)
+            offset += REGION_HEADER.size
+
+            if length != expected:
+                raise ValueError(f"The memory snapshot doesn't match the memory layout: a region of {length} bytes, expected {expected}")
+
+            if len(view) < offset + length:
+                raise ValueError("The memory snapshot is truncated")
+
+            contents.append(view[offset : offset + length])
+            offset += length
+
+        # restoring writes straight into the buffers, so the ones shared with a fork are copied first
+        for start, _, _ in list(self.buffers):
+            if self.is_shared(start):
+                self.unshare_buffer(start)
+
+        regions = self.regions()
+        for region, content in zip(regions, contents):
+            region[:] = content
+
+        for device, content in zip(devices, contents[len(regions) :]):
+            device.restore_state(bytes(content))
+
+        for watch in self.watches:
+            watch.mark_all()
 
     def read(self, addr: int) -> int:
         if not self.has_bus:
             return self.data[addr]
 
-        match addr:
-            case _ if addr >= RAM and addr <= RAM_MIRRORS_END:
-                return self.cpu_vram[addr & 0b00000111_11111111]
-            case _ if addr >= PPU_REGISTERS and addr <= PPU_REGISTERS_MIRRORS_END:
-                raise ValueError(f"Not implemented for PPU: address {addr}")
-            case _:
-                raise ValueError(f"Not implemented for address {addr}")
+        page = self.read_pages[addr >> 8]
+        if page is not None:
+            return page[addr & 0xFF]
+
+        return self.read_handlers[addr >> 8](addr)
 
     def write(self, addr: int, data: int) -> None:
         if not self.has_bus:
             self.data[addr] = data
+            if self.watches:
+                for watch in self.watches:
+                    watch.mark(addr)
+            return
+
+        page = self.write_pages[addr >> 8]
+        if page is not None:
+            page[addr & 0xFF] = data
             return
 
-        match addr:
-            case _ if addr >= RAM and addr <= RAM_MIRRORS_END:
-                self.cpu_vram[addr & 0b11111111111] = data
-            case _ if addr >= PPU_REGISTERS and addr <= PPU_REGISTERS_MIRRORS_END:
-                raise ValueError(f"Not implemented for PPU: address {addr}")
-            case _:
-                raise ValueError(f"Not implemented for address {addr}")
+        self.write_handlers[addr >> 8](addr, data)
 
     def read_u16(self, pos: int) -> int:
         low = self.read(pos)
@@ -85,9 +619,29 @@ class Memory:
         self.write(pos, low)
         self.write(pos + 1, hi)
 
-    def slice(self, start: int, end: int) -> list:
-        return [self.read(x) for x in range(start, end)]
+    def view(self, start: int, end: int) -> memoryview:
+        """A zero-copy window onto flat memory - writes to memory are visible through the view (and vice versa)."""
+        if self.has_bus:
+            raise ValueError("Memory views are only available on flat memory")
+
+        return memoryview(self.data)[start:end]
+
+    def slice(self, start: int, end: int) -> memoryview:
+        if not self.has_bus:
+            return self.view(start, end)
+
+        return memoryview(bytearray(self.read(x) for x in range(start, end)))
 
     def load(self, start: int, end: int, data: List[int]) -> None:
+        if not self.has_bus:
+            if len(data) < end - start:
+                raise ValueError(f"Not enough data to load {hex(start)}-{hex(end)}: got {len(data)} bytes")
+
+            # a bytearray slice assignment resizes when the lengths differ, hence the check above
+            self.data[start:end] = bytes(data[: end - start])
+            for watch in self.watches:
+                watch.mark_range(start, end)
+            return
+
         for i in range(start, end):
             self.write(i, data[i - start])
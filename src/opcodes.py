@@ -1,53 +1,80 @@
+import hashlib
 from pathlib import Path
-from typing import Dict, List
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from addressing import ADDRESS_RESOLVERS, PAGE_CROSSING_RESOLVERS, Resolver
 from constants import AddressingMode
 
+OPCODES_FILE: Path = Path(__file__).parent.resolve() / "opcodes.txt"
+# the opcode table precompiled into a python module (see generate_table) - optional, opcodes.txt is parsed if it is
+# missing or out of date
+GENERATED_TABLE: Path = Path(__file__).parent.resolve() / "opcode_table.py"
+
 
 class Opcode:
+    """An entry in the opcode table - immutable, so a single table can be shared by every CPU in the process (and
+    across threads). Nothing about the instruction being executed is kept on it, operands are read from memory by the
+    resolver and passed around as values."""
+
+    __slots__ = ("code", "mnemonic", "length", "cycles", "page_penalty", "branch_penalty", "addressing_mode", "resolver")
+
     code: int
     mnemonic: str
     length: int
     cycles: int
+    page_penalty: bool
+    branch_penalty: bool
     addressing_mode: AddressingMode
-    opcode_params: int
-
-    def __init__(self, code, mnemonic, length, cycles, mode, opcode_params=0):
-        self.code = code
-        self.mnemonic = mnemonic
-        self.length = length
-        self.cycles = cycles
-        self.addressing_mode = mode
-
-        self.opcode_params = opcode_params
-
-    def string(self, memory: "Memory") -> str:
-        """
-        I always forget this stuff
-        {   # Format identifier
-        0:  # first parameter
-        0   # fill with zeroes
-        {1} # to a length of n characters (including 0x), defined by the second parameter
-        x   # hexadecimal number, using lowercase letters for a-f
-        }   # End of format identifier
+    resolver: Resolver
+
+    def __init__(self, code, mnemonic, length, cycles, mode, page_penalty=False, branch_penalty=False):
+        fields = {
+            "code": code,
+            "mnemonic": mnemonic,
+            "length": length,
+            # the base cycles - the penalties below are added on top when they apply
+            "cycles": cycles,
+            # +p: one more cycle when the indexed address crosses a page boundary
+            "page_penalty": page_penalty,
+            # +t: one more cycle when the branch is taken (a further one if it lands on another page)
+            "branch_penalty": branch_penalty,
+            "addressing_mode": mode,
+            # resolved once here so executing the opcode needs no AddressingMode comparisons
+            "resolver": PAGE_CROSSING_RESOLVERS[mode] if page_penalty else ADDRESS_RESOLVERS[mode],
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Opcode {self.code:#04x} is immutable, can't set {name}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"Opcode {self.code:#04x} is immutable, can't delete {name}")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # copy and pickle rebuild the opcode rather than setting its slots
+        return (Opcode, (self.code, self.mnemonic, self.length, self.cycles, self.addressing_mode, self.page_penalty, self.branch_penalty))
+
+    def string(self, operand: int = 0) -> str:
+        """The instruction in assembly with the operand filled in, i.e. LDA #$05 - see the disassembler module for
+        whole listings.
+
+        Args:
+            operand (int): The operand byte or word, or for a branch the address it goes to
+
+        Returns:
+            str: The instruction
         """
         if self.length == 1:
-            string = self.mnemonic
-        elif self.length == 2:
-            # string = self.mnemonic.replace("nn", f"{(program_offset - self.opcode_params):0{2}X}")
-            params = self.opcode_params
-            if self.addressing_mode == AddressingMode.IMMEDIATE:
-                params = memory.read(self.opcode_params)
-            string = self.mnemonic.replace("nn", f"{(params):0{2}X}")
-        elif self.length == 3:
-            # string = self.mnemonic.replace("nnnn", f"{(program_offset - self.opcode_params):0{4}X}")
-            string = self.mnemonic.replace("nnnn", f"{(self.opcode_params):0{4}X}")
-        else:
-            raise ValueError("Invalid length")
-
-        return string
+            return self.mnemonic.strip()
+
+        if self.length == 3 or self.addressing_mode == AddressingMode.RELATIVE:
+            return self.mnemonic.replace("nnnn", f"{operand:04X}")
+
+        return self.mnemonic.replace("nn", f"{operand:02X}")
 
     @staticmethod
-    def load_opcodes(file_path: Path = Path(__file__).parent.resolve() / "opcodes.txt") -> Dict[int, "Opcode"]:
+    def load_opcodes(file_path: Path = OPCODES_FILE) -> Dict[int, "Opcode"]:
         """
         Reads in the file instructions.txt and parses the opcode table.
 
@@ -69,11 +96,19 @@ class Opcode:
                 # it to an int
                 code = int("".join(row["Opcode"][1:]), 16)
                 addressing_mode = getattr(AddressingMode, row["Addressing Mode"].replace(" ", "_").replace("-", "_").upper())
-                cycles = int(row["No. Cycles"].split("+")[0])
+                cycles, *penalties = row["No. Cycles"].split("+")
                 length = int(row["No. Bytes"])
                 mnemonic = row["Assembly Language Form"]
 
-                opcodes[code] = Opcode(code=code, mode=addressing_mode, cycles=cycles, mnemonic=mnemonic, length=length)
+                opcodes[code] = Opcode(
+                    code=code,
+                    mode=addressing_mode,
+                    cycles=int(cycles),
+                    mnemonic=mnemonic,
+                    length=length,
+                    page_penalty="p" in penalties,
+                    branch_penalty="t" in penalties,
+                )
             return opcodes
 
         with open(file_path, "r") as f:
@@ -88,4 +123,64 @@ class Opcode:
         return _opcodes
 
 
-# from cpu import Memory
+def source_hash(file_path: Path = OPCODES_FILE) -> str:
+    return hashlib.sha1(file_path.read_bytes()).hexdigest()
+
+
+def generate_table(opcodes: Mapping[int, Opcode], file_path: Path = GENERATED_TABLE) -> None:
+    """Write the opcode table out as a python module of plain tuples, so loading it is an import rather than parsing
+    opcodes.txt. The module records the hash of opcodes.txt it was generated from so a stale table is ignored."""
+    rows = [
+        f"    ({code:#04x}, {opcode.mnemonic!r}, {opcode.length}, {opcode.cycles}, {opcode.addressing_mode.name!r}, {opcode.page_penalty}, {opcode.branch_penalty}),"
+        for code, opcode in sorted(opcodes.items())
+    ]
+
+    lines = [
+        '"""Generated from opcodes.txt by `python src/opcodes.py` - do not edit"""',
+        f"SOURCE_HASH = {source_hash()!r}",
+        "",
+        "# (code, mnemonic, length, cycles, addressing mode, page penalty, branch penalty)",
+        "ROWS = (",
+        *rows,
+        ")",
+    ]
+
+    file_path.write_text("\n".join(lines) + "\n")
+
+
+def load_table() -> Mapping[int, Opcode]:
+    """Load the opcode table from the generated module if it is there and up to date, otherwise parse opcodes.txt.
+
+    Returns:
+        Mapping[int, Opcode]: A read only mapping of the opcode byte to the opcode
+    """
+    try:
+        import opcode_table
+    except ImportError:
+        opcode_table = None
+
+    if opcode_table is not None and opcode_table.SOURCE_HASH == source_hash():
+        opcodes = {
+            code: Opcode(code, mnemonic, length, cycles, AddressingMode[mode], page_penalty=page_penalty, branch_penalty=branch_penalty)
+            for code, mnemonic, length, cycles, mode, page_penalty, branch_penalty in opcode_table.ROWS
+        }
+    else:
+        opcodes = Opcode.load_opcodes()
+
+    return MappingProxyType(opcodes)
+
+
+# The opcode table is loaded once per process and shared by every CPU - OPCODES by opcode byte and INSTRUCTIONS as a
+# 256 entry tuple, None for the bytes that aren't an opcode
+OPCODES: Mapping[int, Opcode] = load_table()
+INSTRUCTIONS: Tuple[Optional[Opcode], ...] = tuple(OPCODES.get(code) for code in range(0x100))
+# the same table as parallel arrays by opcode byte, for code that only needs one field - the bytes that aren't an opcode
+# are a single byte that takes no cycles
+LENGTHS: Tuple[int, ...] = tuple(opcode.length if opcode is not None else 1 for opcode in INSTRUCTIONS)
+CYCLES: Tuple[int, ...] = tuple(opcode.cycles if opcode is not None else 0 for opcode in INSTRUCTIONS)
+MODES: Tuple[Optional[AddressingMode], ...] = tuple(opcode.addressing_mode if opcode is not None else None for opcode in INSTRUCTIONS)
+
+
+if __name__ == "__main__":
+    generate_table(Opcode.load_opcodes())
+    print(f"wrote {GENERATED_TABLE}")
@@ -0,0 +1,539 @@
+"""
+The picture processing unit (2C02) - renders a scanline at a time with NumPy.
+
+The pattern tables are decoded from 2bpp planes into 8x8 pixels once, when the cartridge is loaded, into a tile cache
+covering the whole of the CHR ROM - bank switching only changes which tiles the pattern tables index, so it never
+decodes anything. Writes to CHR RAM mark their tile dirty and the dirty tiles are decoded again, together, before the
+next scanline is rendered.
+
+A scanline is rendered as a handful of array operations: the 33 tiles of background under the scroll are gathered from
+the nametables and the tile cache at once, each of the (up to 8) sprites on the line is a slice, and the line goes
+through the palette into a preallocated 256x240 framebuffer of NES colour indices (0-63, see SYSTEM_PALETTE for RGB).
+
+Given the CPU, the PPU is synchronised by catching up rather than being stepped 3 dots for every CPU cycle: it keeps
+its own place in the frame and only runs forward to the CPU's cycle counter when the CPU touches one of its registers
+(including OAM DMA), or when the host reaches a deadline from next_deadline (vblank, where the NMI is raised). Running
+forward renders the scanlines finished in between, so a change to the scroll mid-frame lands on the right scanline.
+
+https://www.nesdev.org/wiki/PPU
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from constants import KB, Mirroring
+from mappers import CHARACTER_PAGE_SIZE, Mapper
+from memory import PAGE_SIZE, PPU_REGISTERS, PPU_REGISTERS_MIRRORS_END, Memory, Watch
+
+WIDTH: int = 256
+HEIGHT: int = 240
+TILE_SIZE: int = 16
+TILES_PER_PAGE: int = CHARACTER_PAGE_SIZE // TILE_SIZE
+PATTERN_TILES: int = 0x200
+
+OAM_DMA: int = 0x4014
+# the CPU is stalled while OAM DMA copies a page, an extra cycle when it starts on an odd cycle
+OAM_DMA_CYCLES: int = 513
+
+# NTSC timing
+DOTS_PER_CYCLE: int = 3
+DOTS_PER_SCANLINE: int = 341
+SCANLINES: int = 262
+DOTS_PER_FRAME: int = DOTS_PER_SCANLINE * SCANLINES
+VBLANK_SCANLINE: int = 241
+PRE_RENDER_SCANLINE: int = 261
+# a visible scanline is rendered as the PPU reaches the end of its pixels
+RENDER_DOT: int = 256
+
+# PPUCTRL
+CTRL_INCREMENT: int = 0x04
+CTRL_SPRITE_TABLE: int = 0x08
+CTRL_BACKGROUND_TABLE: int = 0x10
+CTRL_SPRITE_SIZE: int = 0x20
+CTRL_NMI: int = 0x80
+# PPUMASK
+MASK_GREYSCALE: int = 0x01
+MASK_BACKGROUND_LEFT: int = 0x02
+MASK_SPRITES_LEFT: int = 0x04
+MASK_BACKGROUND: int = 0x08
+MASK_SPRITES: int = 0x10
+# PPUSTATUS
+STATUS_OVERFLOW: int = 0x20
+STATUS_SPRITE_ZERO: int = 0x40
+STATUS_VBLANK: int = 0x80
+
+# the physical nametable each of the four logical nametables is mirrored onto
+NAMETABLES: Dict[Mirroring, np.ndarray] = {
+    Mirroring.HORIZONTAL: np.array([0, 0, 1, 1]),
+    Mirroring.VERTICAL: np.array([0, 1, 0, 1]),
+    Mirroring.SINGLE_LOWER: np.array([0, 0, 0, 0]),
+    Mirroring.SINGLE_UPPER: np.array([1, 1, 1, 1]),
+    Mirroring.FOUR_SCREEN: np.array([0, 1, 2, 3]),
+}
+
+# the 2C02 palette as RGB
+SYSTEM_PALETTE: np.ndarray = np.array(
+    [
+        (0x54, 0x54, 0x54), (0x00, 0x1E, 0x74), (0x08, 0x10, 0x90), (0x30, 0x00, 0x88), (0x44, 0x00, 0x64), (0x5C, 0x00, 0x30), (0x54, 0x04, 0x00), (0x3C, 0x18, 0x00),
+        (0x20, 0x2A, 0x00), (0x08, 0x3A, 0x00), (0x00, 0x40, 0x00), (0x00, 0x3C, 0x00), (0x00, 0x32, 0x3C), (0x00, 0x00, 0x00), (0x00, 0x00, 0x00), (0x00, 0x00, 0x00),
+        (0x98, 0x96, 0x98), (0x08, 0x4C, 0xC4), (0x30, 0x32, 0xEC), (0x5C, 0x1E, 0xE4), (0x88, 0x14, 0xB0), (0xA0, 0x14, 0x64), (0x98, 0x22, 0x20), (0x78, 0x3C, 0x00),
+        (0x54, 0x5A, 0x00), (0x28, 0x72, 0x00), (0x08, 0x7C, 0x00), (0x00, 0x76, 0x28), (0x00, 0x66, 0x78), (0x00, 0x00, 0x00), (0x00, 0x00, 0x00), (0x00, 0x00, 0x00),
+        (0xEC, 0xEE, 0xEC), (0x4C, 0x9A, 0xEC), (0x78, 0x7C, 0xEC), (0xB0, 0x62, 0xEC), (0xE4, 0x54, 0xEC), (0xEC, 0x58, 0xB4), (0xEC, 0x6A, 0x64), (0xD4, 0x88, 0x20),
+        (0xA0, 0xAA, 0x00), (0x74, 0xC4, 0x00), (0x4C, 0xD0, 0x20), (0x38, 0xCC, 0x6C), (0x38, 0xB4, 0xCC), (0x3C, 0x3C, 0x3C), (0x00, 0x00, 0x00), (0x00, 0x00, 0x00),
+        (0xEC, 0xEE, 0xEC), (0xA8, 0xCC, 0xEC), (0xBC, 0xBC, 0xEC), (0xD4, 0xB2, 0xEC), (0xEC, 0xAE, 0xEC), (0xEC, 0xAE, 0xD4), (0xEC, 0xB4, 0xB0), (0xE4, 0xC4, 0x90),
+        (0xCC, 0xD2, 0x78), (0xB4, 0xDE, 0x78), (0xA8, 0xE2, 0x90), (0x98, 0xE2, 0xB4), (0xA0, 0xD6, 0xE4), (0xA0, 0xA2, 0xA0), (0x00, 0x00, 0x00), (0x00, 0x00, 0x00),
+    ],
+    dtype=np.uint8,
+)  # fmt: skip
+
+# the 33 tiles a scanline of background spans (32 and one more for the fine x scroll), and the tiles of a CHR page
+COLUMNS: np.ndarray = np.arange(33)
+TILE_OFFSETS: np.ndarray = np.arange(TILES_PER_PAGE)
+
+
+def decode_tiles(data) -> np.ndarray:
+    """Decode 2bpp tiles into pixels.
+
+    Each 16 byte tile is two 8x8 bitplanes, the low bit of every pixel in the first 8 bytes and the high bit in the
+    second 8.
+
+    Args:
+        data (Union[bytes, bytearray, memoryview]): The tiles, a multiple of 16 bytes
+
+    Returns:
+        np.ndarray: The pixels (0-3) as an array of shape (tiles, 8, 8)
+    """
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(-1, 2, 8, 1)
+    bits = np.unpackbits(planes, axis=3)
+
+    return bits[:, 0] | (bits[:, 1] << 1)
+
+
+class PPU:
+    """The PPU, connected to the cartridge through its mapper and to the CPU through its registers at $2000-$3FFF
+    (and OAM DMA at $4014).
+
+    Args:
+        mapper (Mapper): The cartridge's mapper - the pattern tables, mirroring and scanline counter
+        memory (Memory): The CPU's memory, with a bus
+    """
+
+    mapper: Mapper
+    memory: Memory
+    cpu: Optional["CPU"]
+
+    framebuffer: np.ndarray
+    tiles: np.ndarray
+    # writes to CHR RAM, across all of its banks, a cell per tile
+    dirty_tiles: Watch
+
+    # the events of a frame as (dot, handler, args), the next one and the dot the current frame started on
+    events: List[Tuple[int, Callable, tuple]]
+    event: int
+    frame_start: int
+    # frames finished (entered vblank) and the CPU cycles lost to OAM DMA - the PPU's clock is the CPU's cycle counter
+    # plus the stalls
+    frame: int
+    stall: int
+
+    def __init__(self, mapper: Mapper, memory: Memory, cpu: Optional["CPU"] = None) -> None:
+        self.mapper = mapper
+        self.memory = memory
+        # without the CPU the PPU isn't synchronised, frames are rendered with render_frame
+        self.cpu = cpu
+
+        self.ctrl = 0
+        self.mask = 0
+        self.status = 0
+        self.oam_address = 0
+        self.data_buffer = 0
+        # the loopy registers - the current and temporary VRAM address, fine x scroll and the write toggle
+        self.v = 0
+        self.t = 0
+        self.x = 0
+        self.w = 0
+        # set when an NMI is raised, cleared by whoever services it
+        self.nmi = False
+
+        # 4 nametables, 2 of them mirrored unless the cartridge has four screen VRAM
+        self.vram = bytearray(4 * KB)
+        self.nametables = np.frombuffer(self.vram, dtype=np.uint8).reshape(4, KB)
+        self.palette_ram = bytearray(0x20)
+        self.palette = np.frombuffer(self.palette_ram, dtype=np.uint8)
+        self.oam = bytearray(PAGE_SIZE)
+        self.sprites = np.frombuffer(self.oam, dtype=np.uint8).reshape(64, 4)
+
+        self.framebuffer = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+
+        self.tiles = decode_tiles(b"".join(mapper.character_banks))
+        self.dirty_tiles = Watch(0, len(mapper.character_banks) * CHARACTER_PAGE_SIZE, TILE_SIZE)
+        self.banks: List[int] = []
+        self.pattern_tiles = np.zeros(PATTERN_TILES, dtype=np.intp)
+
+        self.events = [(y * DOTS_PER_SCANLINE + RENDER_DOT, self.render_scanline, (y,)) for y in range(HEIGHT)]
+        self.events.append((VBLANK_SCANLINE * DOTS_PER_SCANLINE + 1, self.start_vblank, ()))
+        self.events.append((PRE_RENDER_SCANLINE * DOTS_PER_SCANLINE + 1, self.start_frame, ()))
+        self.event = 0
+        self.frame_start = 0
+        self.frame = 0
+        self.stall = 0
+
+        memory.map_handlers(PPU_REGISTERS, PPU_REGISTERS_MIRRORS_END + 1, self.read_register, self.write_register)
+        # the rest of the I/O registers are the APU's
+        memory.apu.map_register(OAM_DMA, self.write_oam_dma)
+
+    # CPU interface
+    def read_register(self, addr: int) -> int:
+        self.catch_up()
+
+        match addr & 0x07:
+            case 2:
+                # the low bits are whatever was last on the PPU's data bus
+                data = self.status | (self.data_buffer & 0x1F)
+                self.status &= ~STATUS_VBLANK
+                self.w = 0
+                return data
+            case 4:
+                return self.oam[self.oam_address]
+            case 7:
+                addr = self.v & 0x3FFF
+                self.v = (self.v + (32 if self.ctrl & CTRL_INCREMENT else 1)) & 0x7FFF
+
+                # reads are delayed through a buffer, except for the palette
+                data = self.data_buffer
+                self.data_buffer = self.read(addr)
+                if addr >= 0x3F00:
+                    # the buffer is filled from the nametable underneath the palette
+                    data = self.data_buffer
+                    self.data_buffer = self.read(addr - 0x1000)
+                return data
+
+        # the write only registers
+        return self.data_buffer
+
+    def write_register(self, addr: int, data: int) -> None:
+        self.catch_up()
+
+        match addr & 0x07:
+            case 0:
+                # enabling NMI during vblank raises one straight away
+                if data & CTRL_NMI and not self.ctrl & CTRL_NMI and self.status & STATUS_VBLANK:
+                    self.nmi = True
+                self.ctrl = data
+                self.t = (self.t & 0x73FF) | ((data & 0x03) << 10)
+            case 1:
+                self.mask = data
+            case 3:
+                self.oam_address = data
+            case 4:
+                self.oam[self.oam_address] = data
+                self.oam_address = (self.oam_address + 1) & 0xFF
+            case 5:
+                if not self.w:
+                    self.t = (self.t & 0x7FE0) | (data >> 3)
+                    self.x = data & 0x07
+                else:
+                    self.t = (self.t & 0x0C1F) | ((data & 0x07) << 12) | ((data >> 3) << 5)
+                self.w ^= 1
+            case 6:
+                if not self.w:
+                    self.t = (self.t & 0x00FF) | ((data & 0x3F) << 8)
+                else:
+                    self.t = (self.t & 0x7F00) | data
+                    self.v = self.t
+                self.w ^= 1
+            case 7:
+                self.write(self.v & 0x3FFF, data)
+                self.v = (self.v + (32 if self.ctrl & CTRL_INCREMENT else 1)) & 0x7FFF
+
+    def write_oam_dma(self, addr: int, data: int) -> None:
+        self.catch_up()
+        self.oam_dma(data)
+
+        if self.cpu is not None:
+            self.stall += OAM_DMA_CYCLES + (self.cpu.cycles & 0x01)
+
+    def oam_dma(self, page: int) -> None:
+        """Copy a page of CPU memory into OAM, starting at the OAM address"""
+        start = page << 8
+        view = self.memory.read_pages[page]
+        data = bytes(view) if view is not None else bytes(self.memory.read(addr) for addr in range(start, start + PAGE_SIZE))
+
+        self.oam[self.oam_address :] = data[: PAGE_SIZE - self.oam_address]
+        self.oam[: self.oam_address] = data[PAGE_SIZE - self.oam_address :]
+
+    # Synchronisation
+    def clock(self) -> int:
+        """The PPU's clock in dots - the CPU's cycle counter plus the cycles the CPU was stalled for"""
+        return (self.cpu.cycles + self.stall) * DOTS_PER_CYCLE
+
+    def catch_up(self) -> None:
+        """Run the PPU forward to the CPU's cycle counter, handling the events (rendered scanlines, vblank and the
+        pre-render scanline) in between"""
+        if self.cpu is None:
+            return
+
+        now = self.clock()
+
+        # whole frames nothing could have looked at (the CPU ran on without touching the PPU) aren't rendered, but
+        # everything else about them still happens - vblank (and the NMI) and the mapper's scanline counter
+        unseen = self.frame_start + ((now - self.frame_start) // DOTS_PER_FRAME - 1) * DOTS_PER_FRAME
+
+        events = self.events
+        render = self.render_scanline
+        while self.frame_start + events[self.event][0] < now:
+            time, handler, args = events[self.event]
+            if handler == render and self.frame_start + time < unseen:
+                if self.rendering:
+                    self.end_scanline()
+            else:
+                handler(*args)
+
+            self.event += 1
+            if self.event == len(events):
+                self.event = 0
+                self.frame_start += DOTS_PER_FRAME
+
+    def next_deadline(self) -> int:
+        """The CPU cycle the host should stop the CPU at and catch up, so the PPU isn't left behind where it matters.
+
+        That's the start of the next vblank, when the NMI is raised. While sprite 0 is on screen and hasn't hit yet the
+        end of the scanlines it covers comes first, so a loop polling for the hit (a status bar split) isn't
+        fast-forwarded past it. With a mapper whose scanline counter raises IRQs the next event comes first, so an IRQ
+        is taken on the scanline it was raised on however the game turns rendering on or sets the counter up in the
+        meantime.
+
+        Returns:
+            int: The CPU cycle
+        """
+        vblank = len(self.events) - 2
+        deadline = self.frame_start + self.events[vblank][0] + (DOTS_PER_FRAME if self.event > vblank else 0)
+
+        if self.rendering and not self.status & STATUS_SPRITE_ZERO:
+            last = self.oam[0] + (16 if self.ctrl & CTRL_SPRITE_SIZE else 8)
+            if last < HEIGHT and self.event <= last:
+                deadline = min(deadline, self.frame_start + self.events[last][0])
+
+        if self.mapper.SCANLINE_IRQ:
+            deadline = min(deadline, self.frame_start + self.events[self.event][0])
+
+        # the event happens once the clock has passed its dot
+        return deadline // DOTS_PER_CYCLE + 1 - self.stall
+
+    # PPU address space
+    def nametable(self, addr: int) -> int:
+        return NAMETABLES[self.mapper.mirroring][(addr >> 10) & 0x03] * KB + (addr & 0x3FF)
+
+    def palette_index(self, addr: int) -> int:
+        # the backdrop entries of the sprite palettes mirror the background's
+        index = addr & 0x1F
+        return index & 0x0F if index & 0x13 == 0x10 else index
+
+    def read(self, addr: int) -> int:
+        if addr < 0x2000:
+            return self.mapper.read_character(addr)
+        if addr < 0x3F00:
+            return self.vram[self.nametable(addr)]
+
+        return self.palette_ram[self.palette_index(addr)]
+
+    def write(self, addr: int, data: int) -> None:
+        if addr < 0x2000:
+            self.mapper.write_character(addr, data)
+            if self.mapper.character_ram:
+                self.dirty_tiles.mark(self.mapper.character_page_banks[addr >> 10] * CHARACTER_PAGE_SIZE + (addr & 0x3FF))
+        elif addr < 0x3F00:
+            self.vram[self.nametable(addr)] = data
+        else:
+            self.palette_ram[self.palette_index(addr)] = data & 0x3F
+
+    # Rendering
+    @property
+    def rendering(self) -> bool:
+        return bool(self.mask & (MASK_BACKGROUND | MASK_SPRITES))
+
+    def update_tiles(self) -> None:
+        """Decode the dirty CHR RAM tiles, and point the pattern tables at the tiles of the banks mapped into them"""
+        if self.dirty_tiles.changed:
+            dirty = np.flatnonzero(np.frombuffer(self.dirty_tiles.dirty, dtype=np.uint8))
+            self.dirty_tiles.clear()
+
+            banks = self.mapper.character_banks
+            data = b"".join(bytes(banks[tile // TILES_PER_PAGE][(tile % TILES_PER_PAGE) * TILE_SIZE :][:TILE_SIZE]) for tile in dirty)
+            self.tiles[dirty] = decode_tiles(data)
+
+        if self.banks != self.mapper.character_page_banks:
+            self.banks = list(self.mapper.character_page_banks)
+            self.pattern_tiles = np.repeat(np.array(self.banks, dtype=np.intp) * TILES_PER_PAGE, TILES_PER_PAGE) + np.tile(TILE_OFFSETS, len(self.banks))
+
+    def start_frame(self) -> None:
+        """The pre-render scanline - clears the flags and reloads the scroll"""
+        self.status &= ~(STATUS_VBLANK | STATUS_SPRITE_ZERO | STATUS_OVERFLOW)
+        if self.rendering:
+            self.v = self.t
+
+    def start_vblank(self) -> None:
+        self.frame += 1
+        self.status |= STATUS_VBLANK
+        if self.ctrl & CTRL_NMI:
+            self.nmi = True
+
+    def render_frame(self) -> np.ndarray:
+        """Render a whole frame and enter vblank.
+
+        Returns:
+            np.ndarray: The framebuffer
+        """
+        self.start_frame()
+        for y in range(HEIGHT):
+            self.render_scanline(y)
+        self.start_vblank()
+
+        return self.framebuffer
+
+    def render_scanline(self, y: int) -> None:
+        """Render a visible scanline into the framebuffer, then move the scroll on to the next one.
+
+        Args:
+            y (int): The scanline, 0-239
+
+        Returns:
+            None
+        """
+        if not self.rendering:
+            self.framebuffer[y] = self.palette[0]
+            return
+
+        self.update_tiles()
+
+        background = self.background(y) if self.mask & MASK_BACKGROUND else np.zeros(WIDTH, dtype=np.uint8)
+        line = self.render_sprites(y, background) if self.mask & MASK_SPRITES else background
+
+        # the transparent pixels of every palette are the backdrop
+        line[(line & 0x03) == 0] = 0
+        colours = self.palette[line]
+        if self.mask & MASK_GREYSCALE:
+            colours = colours & 0x30
+        self.framebuffer[y] = colours
+
+        self.end_scanline()
+
+    def end_scanline(self) -> None:
+        """Move the scroll on to the next line and clock the mapper's scanline counter, as the end of a rendered
+        scanline does"""
+        self.increment_y()
+        # the horizontal scroll is reloaded at the end of each line
+        self.v = (self.v & 0x7BE0) | (self.t & 0x041F)
+        self.mapper.scanline()
+
+    def background(self, y: int) -> np.ndarray:
+        """The background palette indices (0-15) under the scroll, 0 where it's transparent"""
+        v = self.v
+        coarse_y = (v >> 5) & 0x1F
+        fine_y = (v >> 12) & 0x07
+
+        # the 33 tiles from the coarse x scroll, wrapping into the horizontally adjacent nametable
+        columns = (v & 0x1F) + COLUMNS
+        tables = NAMETABLES[self.mapper.mirroring][((v >> 10) & 0x02) | (((v >> 10) & 0x01) ^ ((columns >> 5) & 0x01))]
+        columns &= 0x1F
+
+        tile_ids = self.nametables[tables, coarse_y * 32 + columns]
+        attributes = self.nametables[tables, 0x3C0 + (coarse_y >> 2) * 8 + (columns >> 2)]
+        palettes = (attributes >> (((coarse_y & 0x02) << 1) | (columns & 0x02))) & 0x03
+
+        table = 0x100 if self.ctrl & CTRL_BACKGROUND_TABLE else 0
+        pixels = self.tiles[self.pattern_tiles[table + tile_ids], fine_y].reshape(-1)[self.x : self.x + WIDTH]
+        palettes = np.repeat(palettes, 8)[self.x : self.x + WIDTH]
+
+        line = np.where(pixels != 0, pixels | (palettes << 2), 0).astype(np.uint8)
+        if not self.mask & MASK_BACKGROUND_LEFT:
+            line[:8] = 0
+
+        return line
+
+    def render_sprites(self, y: int, background: np.ndarray) -> np.ndarray:
+        """Draw the sprites on the scanline over (or behind) the background, and check for a sprite zero hit.
+
+        Args:
+            y (int): The scanline
+            background (np.ndarray): The background palette indices
+
+        Returns:
+            np.ndarray: The palette indices of the line, sprites are 16-31
+        """
+        height = 16 if self.ctrl & CTRL_SPRITE_SIZE else 8
+        # sprites are drawn a line below their Y
+        rows = y - 1 - self.sprites[:, 0].astype(np.intp)
+        visible = np.flatnonzero((rows >= 0) & (rows < height))
+        if not len(visible):
+            return background
+
+        if len(visible) > 8:
+            self.status |= STATUS_OVERFLOW
+            visible = visible[:8]
+
+        line = background.copy()
+        # the lowest numbered sprite wins a pixel, even when it is behind the background
+        covered = np.zeros(WIDTH, dtype=bool)
+        opaque_background = (background & 0x03) != 0
+
+        for sprite in visible:
+            _, tile, attributes, left = (int(value) for value in self.sprites[sprite])
+            row = int(rows[sprite])
+            if attributes & 0x80:
+                row = height - 1 - row
+
+            if height == 16:
+                tile = ((tile & 0x01) << 8) | (tile & 0xFE) | (row >> 3)
+                row &= 0x07
+            elif self.ctrl & CTRL_SPRITE_TABLE:
+                tile |= 0x100
+
+            pixels = self.tiles[self.pattern_tiles[tile], row]
+            if attributes & 0x40:
+                pixels = pixels[::-1]
+
+            width = min(8, WIDTH - left)
+            pixels = pixels[:width]
+            span = slice(left, left + width)
+
+            opaque = pixels != 0
+            if left < 8 and not self.mask & MASK_SPRITES_LEFT:
+                opaque[: 8 - left] = False
+
+            if sprite == 0:
+                # a hit needs both opaque, and never happens at x=255
+                hits = opaque & opaque_background[span]
+                if left + width == WIDTH:
+                    hits[-1] = False
+                if hits.any():
+                    self.status |= STATUS_SPRITE_ZERO
+
+            drawn = opaque & ~covered[span]
+            covered[span] |= opaque
+            if attributes & 0x20:
+                drawn &= ~opaque_background[span]
+
+            line[span][drawn] = 0x10 | ((attributes & 0x03) << 2) | pixels[drawn]
+
+        return line
+
+    def increment_y(self) -> None:
+        v = self.v
+        if (v & 0x7000) != 0x7000:
+            self.v = v + 0x1000
+            return
+
+        v &= ~0x7000
+        coarse_y = (v & 0x03E0) >> 5
+        if coarse_y == 29:
+            coarse_y = 0
+            v ^= 0x0800
+        elif coarse_y == 31:
+            coarse_y = 0
+        else:
+            coarse_y += 1
+
+        self.v = (v & ~0x03E0) | (coarse_y << 5)
+
+    def rgb(self) -> np.ndarray:
+        """The framebuffer as RGB, an array of shape (240, 256, 3)"""
+        return SYSTEM_PALETTE[self.framebuffer]
@@ -7,20 +7,27 @@ By default the game will run in a pygame window, but you can also deassemble the
 """
 import argparse
 import asyncio
+import logging
 import random
 import threading
 from typing import List, Optional, Tuple
 import numpy as np
 import pygame
-from pynput.keyboard import Key, Listener
-from constants import Flags
+from constants import Flags, StopReason
 from cpu import CPU
 from logger import get_logger
+from memory import Watch
 
 WIDTH = 32
 HEIGHT = 32
 SCREEN_SIZE = (WIDTH, HEIGHT)
 PIXEL_SIZE = 20
+# the CPU runs in batches - the input is polled and the screen redrawn once per batch (frame)
+INSTRUCTIONS_PER_FRAME = 150
+FRAMES_PER_SECOND = 60
+# the screen is memory mapped, a byte per pixel
+SCREEN_START = 0x0200
+SCREEN_END = SCREEN_START + WIDTH * HEIGHT
 COLORS = {
     0: (0, 0, 0),  # Black
     1: (255, 255, 255),  # White
@@ -88,22 +95,37 @@ class SnakeGame:
     # fmt: off
 
     cpu: CPU
+    # the screen memory as a 32x32 array, indexed [y, x]
+    screen_memory: np.ndarray
+    screen_writes: Watch
+    surface: Optional[pygame.Surface]
 
-    def __init__(self) -> None:
-        self.cpu = CPU(callback=self.callback, program_offset=0x0600)
+    def __init__(self, translate: bool = False) -> None:
+        self.cpu = CPU(callback=self.callback, program_offset=0x0600, translate=translate)
         self.logger = get_logger(self.__class__.__name__)
         self.last_key_pressed = None
-        self.previous_screen = None
+        # a zero-copy view, so it always shows what the program has drawn
+        self.screen_memory = np.frombuffer(self.cpu.memory.view(SCREEN_START, SCREEN_END), dtype=np.uint8).reshape(HEIGHT, WIDTH)
+        self.screen_writes = self.cpu.memory.watch(SCREEN_START, SCREEN_END)
+        self.surface = None
         self.exit = False
 
     async def run(self) -> None:
         pygame.init()
         self.screen = pygame.display.set_mode((WIDTH*PIXEL_SIZE, HEIGHT*PIXEL_SIZE))
+        self.surface = pygame.Surface(SCREEN_SIZE)
 
         key_listener = threading.Thread(target=self.read_input)
         key_listener.start()
 
-        self.cpu.load_and_run(self.CODE)
+        self.cpu.pre_load(self.CODE)
+        # the first frame is drawn whatever is on the screen
+        self.screen_writes.mark_all()
+
+        clock = pygame.time.Clock()
+        while self.cpu.run_for(INSTRUCTIONS_PER_FRAME) == StopReason.INSTRUCTION_BUDGET:
+            self.render()
+            clock.tick(FRAMES_PER_SECOND)
 
         key_listener.join()
         pygame.quit()
@@ -111,28 +133,35 @@ class SnakeGame:
     def deassemble(self):
         self.cpu.load_and_deassemble(self.CODE)
 
-    def colour(self, byte: int) -> Tuple[int, int, int]:
+    @staticmethod
+    def colour(byte: int) -> Tuple[int, int, int]:
         match byte:
             case 0:
                 return (0, 0, 0) # Black
             case 1:
                 return (255, 255, 255) # White
-            case 2, 9:
+            case 2 | 9:
                 return (128, 128, 128) # Gray
-            case 3, 10:
+            case 3 | 10:
                 return (255, 0, 0) # Red
-            case 4, 11:
+            case 4 | 11:
                 return (0, 255, 0) # Green
-            case 5, 12:
+            case 5 | 12:
                 return (0, 0, 255) # Blue
-            case 6, 13:
+            case 6 | 13:
                 return (255, 0, 255) # Magenta
-            case 7, 14:
+            case 7 | 14:
                 return (255, 255, 0) # Yellow
             case _:
                 return (0, 255, 255) # Cyan
 
+    # the RGB colour of every byte value, for mapping the whole screen through at once
+    PALETTE: np.ndarray = np.array(list(map(colour, range(256))), dtype=np.uint8)
+
     def read_input(self) -> Optional[int]:
+        # imported here as pynput needs a running display server on import
+        from pynput.keyboard import Key, Listener
+
         def on_press(key):
             self.logger.debug(key)
             if key == Key.up:
@@ -147,44 +176,41 @@ class SnakeGame:
         with Listener(on_press=on_press, ) as listener:
             listener.join()
 
-    def redraw(self, surface: pygame.Surface) -> None:
-        # Scale the surface up
-        surface = pygame.transform.scale(surface, (WIDTH * PIXEL_SIZE, HEIGHT * PIXEL_SIZE))
+    def frame(self) -> np.ndarray:
+        """The screen as RGB, indexed [x, y] the way pygame.surfarray expects"""
+        return self.PALETTE[self.screen_memory.T]
 
-        self.screen.blit(surface, (0, 0))
+    def render(self) -> None:
+        """Draw the screen, once per frame and only when the program has written to it"""
+        if not self.screen_writes.changed:
+            return
+
+        self.screen_writes.clear()
+
+        pygame.surfarray.blit_array(self.surface, self.frame())
+        pygame.transform.scale(self.surface, (WIDTH * PIXEL_SIZE, HEIGHT * PIXEL_SIZE), self.screen)
         pygame.display.update()
 
     def callback(self) -> None:
-        self.logger.debug(f"Opcode: {getattr(self.cpu.opcode, 'mnemonic', None)} PC: {self.cpu.program_counter}, A: {self.cpu.register_a}, X: {self.cpu.register_x}, Y: {self.cpu.register_y}, SP: {self.cpu.stack_pointer}, Status: {Flags(int(self.cpu.status))}")
+        # building the flags costs something even when the message isn't logged
+        if self.logger.isEnabledFor(logging.DEBUG):
+            cpu = self.cpu
+            self.logger.debug(
+                "Opcode: %s PC: %d, A: %d, X: %d, Y: %d, SP: %d, Status: %s",
+                getattr(cpu.opcode, "mnemonic", None),
+                cpu.program_counter,
+                cpu.register_a,
+                cpu.register_x,
+                cpu.register_y,
+                cpu.stack_pointer,
+                Flags(int(cpu.status)),
+            )
 
         # read user input and write it to mem[0xFF]
         if self.last_key_pressed:
             self.cpu.memory.write(0xff, self.last_key_pressed)
             self.last_key_pressed = None
 
-        # update mem[0xFE] with new Random Number
-        self.cpu.memory.write(0xfe, random.randint(1, 16))
-        # read mem mapped screen state
-
-        self.current_screen = self.cpu.memory.slice(0x0200, 0x0600)
-        if self.previous_screen is None or not np.array_equal(self.current_screen, self.previous_screen):
-            self.previous_screen = self.current_screen
-            # Create a new surface
-            surface = pygame.Surface((WIDTH, HEIGHT))
-
-            # Create a pixel array from the surface
-            pixels = pygame.PixelArray(surface)
-
-            for i, colour in enumerate(self.cpu.memory.slice(0x0200, 0x0600)):
-                x = i % WIDTH
-                y = i // WIDTH
-                pixels[x, y] = self.colour(colour)
-
-            # Delete the pixel array to make the surface usable again
-            del pixels
-
-            self.redraw(surface)
-
         # generate random number between 1-16 and store in memory location 0xfe
         self.cpu.memory.write(0xfe, random.randint(1, 16))
 
@@ -193,6 +219,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
 
     parser.add_argument("-d", "--deassemble", action="store_true", help="Deassemble the code")
+    parser.add_argument("-t", "--translate", action="store_true", help="Run through the basic block translator rather than the interpreter")
 
     args = parser.parse_args()
 
@@ -200,4 +227,4 @@ if __name__ == "__main__":
         SnakeGame().deassemble()
         exit(0)
 
-    asyncio.run(SnakeGame().run())
+    asyncio.run(SnakeGame(translate=args.translate).run())
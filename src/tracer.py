@@ -0,0 +1,158 @@
+"""
+Execution trace recorder - a flight recorder of the last instructions the CPU executed.
+
+Every instruction is recorded as a record (the program counter, the opcode byte, A, X, Y, P, SP and the cycle count,
+all as they were before the instruction ran) in a slot of a preallocated ring, so the trace is cheap enough to leave
+on. The interpreter loop stores the record inline before dispatching the instruction, and blocks compiled by the
+translator while the CPU is tracing store one per instruction from the registers they hold in locals - a CPU that
+isn't tracing pays a single check per instruction in the interpreter and nothing in translated code.
+
+The ring can be dumped to a binary file of fixed size records and rendered offline as a nestest-style log, with the
+operands filled in when the code is at hand (see the disassembler module).
+
+Iterations of idle loops skipped by fast-forwarding aren't recorded, they show up as a jump in the cycle count.
+"""
+import argparse
+import struct
+import sys
+from itertools import chain
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from disassembler import Disassembler
+from opcodes import INSTRUCTIONS
+
+# a record as it's packed in a dump - program counter, opcode, a, x, y, status, stack pointer, cycles
+RECORD: struct.Struct = struct.Struct("<HBBBBBBQ")
+
+# a dump is a header followed by the records, oldest first
+DUMP_MAGIC: bytes = b"WYTR"
+DUMP_VERSION: int = 1
+DUMP_HEADER: struct.Struct = struct.Struct("<4sBxxxQ")  # magic, version, the number of instructions recorded in total
+
+Record = Tuple[int, int, int, int, int, int, int, int]
+
+
+class Trace:
+    """The ring buffer of a CPU's trace.
+
+    Args:
+        cpu (CPU): The CPU to record
+        capacity (int): The number of instructions to keep, rounded up to a power of two
+    """
+
+    cpu: "CPU"
+    capacity: int
+    # the slots of the ring, a record is stored at recorded & mask
+    ring: List[Optional[Record]]
+    mask: int
+    # the number of instructions recorded since the trace started (or was cleared)
+    recorded: int
+
+    def __init__(self, cpu: "CPU", capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError(f"Can't keep a trace of {capacity} instructions")
+
+        self.cpu = cpu
+        self.capacity = 1 << (capacity - 1).bit_length()
+        self.ring = [None] * self.capacity
+        self.mask = self.capacity - 1
+        self.recorded = 0
+
+    def record(self, program_counter: int, code: int) -> None:
+        """Record an instruction about to run - the interpreter and translated blocks inline this"""
+        cpu = self.cpu
+        recorded = self.recorded
+        self.ring[recorded & self.mask] = (program_counter, code, cpu.register_a, cpu.register_x, cpu.register_y, cpu.status, cpu.stack_pointer, cpu.cycles)
+        self.recorded = recorded + 1
+
+    def clear(self) -> None:
+        self.recorded = 0
+
+    def __len__(self) -> int:
+        return min(self.recorded, self.capacity)
+
+    def records(self) -> Iterator[Record]:
+        """The records held, oldest first, as (program counter, opcode, a, x, y, status, stack pointer, cycles)"""
+        if self.recorded <= self.capacity:
+            return iter(self.ring[: self.recorded])
+
+        position = self.recorded & self.mask
+        return chain(self.ring[position:], self.ring[:position])
+
+    def raw(self) -> bytes:
+        """The records held, oldest first, packed as in a dump"""
+        return b"".join(RECORD.pack(*record) for record in self.records())
+
+    def dump(self, path: Path) -> None:
+        """Write the records held to a binary file, see load"""
+        with open(path, "wb") as dump_file:
+            dump_file.write(DUMP_HEADER.pack(DUMP_MAGIC, DUMP_VERSION, self.recorded))
+            dump_file.write(self.raw())
+
+
+def load(path: Path) -> Tuple[int, List[Record]]:
+    """Read a trace dumped by Trace.dump.
+
+    Args:
+        path (Path): The dump
+
+    Returns:
+        Tuple[int, List[Record]]: The number of instructions recorded in total (more than the records when the ring
+            wrapped) and the records, oldest first
+    """
+    data = path.read_bytes()
+    if len(data) < DUMP_HEADER.size:
+        raise ValueError("Not a trace: too short")
+
+    magic, version, recorded = DUMP_HEADER.unpack_from(data)
+    if magic != DUMP_MAGIC:
+        raise ValueError("Not a trace")
+
+    if version != DUMP_VERSION:
+        raise ValueError(f"Unsupported trace version {version}, expected {DUMP_VERSION}")
+
+    if (len(data) - DUMP_HEADER.size) % RECORD.size:
+        raise ValueError("The trace is truncated")
+
+    return recorded, list(RECORD.iter_unpack(memoryview(data)[DUMP_HEADER.size :]))
+
+
+def render(record: Record, disassembler: Optional[Disassembler] = None) -> str:
+    """A record as a line of a nestest-style log - the address, the bytes, the assembly and the registers.
+
+    Args:
+        record (Record): The record
+        disassembler (Optional[Disassembler]): The code that was traced, without it only the opcode is known and the
+            operand is left out
+
+    Returns:
+        str: The line
+    """
+    program_counter, code, a, x, y, status, stack_pointer, cycles = record
+
+    if disassembler is not None and disassembler.origin <= program_counter < disassembler.end:
+        instruction = disassembler.decode(program_counter)
+        line = instruction.line() if instruction.code == code else f"{program_counter:04X}  {code:02X}        (the code has changed)"
+    else:
+        opcode = INSTRUCTIONS[code]
+        line = f"{program_counter:04X}  {code:02X}        {opcode.mnemonic.strip() if opcode is not None else f'.byte ${code:02X}'}"
+
+    return f"{line:<48}A:{a:02X} X:{x:02X} Y:{y:02X} P:{status:02X} SP:{stack_pointer:02X} CYC:{cycles}"
+
+
+def write_log(records: Iterable[Record], disassembler: Optional[Disassembler] = None, output=sys.stdout) -> None:
+    output.writelines(f"{render(record, disassembler)}\n" for record in records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", type=Path, help="A trace dumped by Trace.dump")
+    parser.add_argument("-p", "--program", type=Path, help="The raw 6502 program that was traced, to fill in the operands")
+    parser.add_argument("-o", "--origin", type=lambda value: int(value, 16), default=0x8000, help="The address the program was loaded at, in hex")
+
+    args = parser.parse_args()
+
+    recorded, records = load(args.trace)
+    print(f"{recorded} instructions recorded, the last {len(records)} kept", file=sys.stderr)
+    program: Optional[Union[bytes, memoryview]] = args.program.read_bytes() if args.program else None
+    write_log(records, Disassembler(program, args.origin) if program is not None else None)
@@ -0,0 +1,656 @@
+"""
+Basic block translator - an opt-in execution engine that turns hot straight-line 6502 code into Python functions.
+
+A block starts at a program counter and runs up to (and including) the first instruction that changes the flow of
+control. Once a block has been entered often enough it is decoded and compiled into a single Python function with
+compile()/exec, with the registers held in locals and every operand baked in as a constant, so running the block skips
+the fetch/decode/dispatch the interpreter does for each instruction.
+
+The translated code is exactly equivalent to the interpreter (including its quirks), so the two can be mixed freely -
+anything the translator can't handle (BRK, undefined opcodes, a batch boundary inside a block) falls back to the
+interpreter one instruction at a time.
+
+Blocks are cached by their start address along with a copy of the bytes they were translated from. The pages holding
+translated code are watched for writes (see Memory.watch, a bank switched in over them counts as one), and once a
+page has been written to the blocks on it are checked against memory before the next one is entered - the ones whose
+bytes changed are dropped. A store inside a block that lands on the block's own bytes ends the block there, so
+self-modifying code invalidates the cache rather than running stale code, and a block that isn't written to is run
+without looking at memory.
+
+A block that branches back to its own start (the delay loop at the end of the snake program) loops inside its function
+for as many iterations as the batch's instruction and cycle budgets allow.
+
+While the CPU is tracing, the blocks record each instruction in the trace as the interpreter does (see the tracer
+module).
+
+If a memory access raises part way through a block, the registers are left as they were when the block was entered.
+"""
+import sys
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from constants import ZERO_NEGATIVE_FLAGS, AddressingMode, StopReason
+from logger import get_logger
+from memory import PAGE_SIZE, Memory, Watch
+from opcodes import Opcode
+
+logger = get_logger(__name__)
+
+# the number of times a block has to be entered before it is translated, so code that runs once isn't compiled
+HOT_THRESHOLD: int = 8
+MAX_BLOCK_INSTRUCTIONS: int = 64
+
+BRANCHES: Dict[str, str] = {
+    "BCC": "not p & 0x01",
+    "BCS": "p & 0x01",
+    "BEQ": "p & 0x02",
+    "BMI": "p & 0x80",
+    "BNE": "not p & 0x02",
+    "BPL": "not p & 0x80",
+    "BVC": "not p & 0x40",
+    "BVS": "p & 0x40",
+}
+
+# instructions that end a block - the program counter after them isn't simply the next instruction
+CONTROL_FLOW: Set[str] = {*BRANCHES, "JMP", "JSR", "RTS", "RTI"}
+
+
+class Block:
+    """A translated run of instructions, the function returns the number of instructions it executed"""
+
+    __slots__ = ("start", "end", "code", "function", "length", "max_cycles", "interior", "loops", "source", "first_page", "last_page")
+
+    start: int
+    end: int
+    code: bytes
+    # the watches on the pages the first and the last byte of the code are on, the same one for a block on a single page
+    first_page: Watch
+    last_page: Watch
+    function: Optional[Callable[["CPU", Callable, Callable, int], int]]
+    length: int
+    max_cycles: int
+    interior: Set[int]
+    # whether the block jumps back to its own start
+    loops: bool
+    source: str
+
+    def __init__(self, start: int, end: int, code: bytes, function, length: int, max_cycles: int, interior: Set[int], loops: bool, source: str, first_page: Watch, last_page: Watch) -> None:
+        self.start = start
+        self.end = end
+        self.code = code
+        self.first_page = first_page
+        self.last_page = last_page
+        self.function = function
+        self.length = length
+        self.max_cycles = max_cycles
+        self.interior = interior
+        self.loops = loops
+        self.source = source
+
+
+class Translator:
+    cpu: "CPU"
+    blocks: Dict[int, Block]
+    heat: Dict[int, int]
+    # the memory watched, and the watch on each page holding translated code by page number
+    memory: Memory
+    pages: Dict[int, Watch]
+
+    def __init__(self, cpu: "CPU") -> None:
+        self.cpu = cpu
+        self.blocks = {}
+        self.heat = {}
+        self.memory = cpu.memory
+        self.pages = {}
+
+    def invalidate(self) -> None:
+        self.blocks.clear()
+        self.heat.clear()
+
+    def watch(self, page: int) -> Watch:
+        watch = self.pages.get(page)
+        if watch is None:
+            watch = self.pages[page] = self.memory.watch(page * PAGE_SIZE, (page + 1) * PAGE_SIZE, PAGE_SIZE)
+
+        return watch
+
+    def rewatch(self) -> None:
+        """Move the watches over to the CPU's memory when it has been replaced - the blocks are checked against the new
+        memory before they are run"""
+        for page, watch in self.pages.items():
+            self.memory.unwatch(watch)
+            self.pages[page] = self.cpu.memory.watch(page * PAGE_SIZE, (page + 1) * PAGE_SIZE, PAGE_SIZE)
+            self.pages[page].mark_all()
+
+        for block in self.blocks.values():
+            block.first_page = self.pages[block.start // PAGE_SIZE]
+            block.last_page = self.pages[(block.end - 1) // PAGE_SIZE]
+
+        self.memory = self.cpu.memory
+
+    def revalidate(self) -> None:
+        """Drop the blocks whose bytes have changed on the pages written to since they were last checked"""
+        written = {page for page, watch in self.pages.items() if watch.changed}
+
+        for start, block in list(self.blocks.items()):
+            if (block.start // PAGE_SIZE in written or (block.end - 1) // PAGE_SIZE in written) and self.memory.slice(block.start, block.end) != block.code:
+                del self.blocks[start]
+                self.heat[start] = 0
+
+        for page in written:
+            self.pages[page].clear()
+
+    def lookup(self, program_counter: int) -> Optional[Block]:
+        block = self.blocks.get(program_counter)
+
+        if block is not None and (block.first_page.changed or block.last_page.changed):
+            self.revalidate()
+            block = self.blocks.get(program_counter)
+
+        if block is not None:
+            return block
+
+        heat = self.heat.get(program_counter, 0) + 1
+        self.heat[program_counter] = heat
+
+        if heat < HOT_THRESHOLD:
+            return None
+
+        block = self.translate(program_counter)
+        self.blocks[program_counter] = block
+
+        return block
+
+    def execute(self, instructions: int, until_pc: int = -1, until_cycles: int = sys.maxsize) -> StopReason:
+        """The translating equivalent of CPU.interpret - blocks are only run when the whole block fits inside the batch,
+        otherwise the interpreter steps a single instruction."""
+        cpu = self.cpu
+        memory = cpu.memory
+        read = memory.read
+        write = memory.write
+        blocks = self.blocks
+        interpret = cpu.interpret
+        idle_loops = cpu.idle_loops
+
+        if memory is not self.memory:
+            self.rewatch()
+
+        remaining = instructions
+        while remaining > 0:
+            program_counter = cpu.program_counter
+
+            if program_counter == until_pc:
+                return StopReason.PROGRAM_COUNTER
+
+            if cpu.cycles >= until_cycles:
+                return StopReason.CYCLE_BUDGET
+
+            block = blocks.get(program_counter)
+            if block is None or block.first_page.changed or block.last_page.changed:
+                block = self.lookup(program_counter)
+
+            if block is not None and block.function is not None and until_pc not in block.interior:
+                # the number of times the block fits in the instruction and cycle budgets - it only loops when it
+                # jumps back to its own start, so anything but a looping block runs once
+                iterations = min(remaining // block.length, (until_cycles - 1 - cpu.cycles) // block.max_cycles)
+                if until_pc == program_counter:
+                    iterations = min(iterations, 1)
+
+                if idle_loops is not None and block.loops:
+                    skipped = idle_loops.skip(cpu, remaining, until_pc, until_cycles)
+                    if skipped:
+                        cpu.executed += skipped
+                        remaining -= skipped
+                        continue
+
+                    # a polling loop is recognised by reaching its head twice, so it runs an iteration at a time
+                    if idle_loops.loops[program_counter].kind == "polling":
+                        iterations = min(iterations, 1)
+
+                if iterations > 0:
+                    executed = block.function(cpu, read, write, iterations)
+                    cpu.executed += executed
+                    remaining -= executed
+                    continue
+
+            reason = interpret(1, until_pc, until_cycles)
+            if reason != StopReason.INSTRUCTION_BUDGET:
+                return reason
+
+            remaining -= 1
+
+        return StopReason.INSTRUCTION_BUDGET
+
+    def decode(self, start: int) -> List[Tuple[int, Opcode, int]]:
+        """Decode the straight-line instructions from start as (address, opcode, operand) tuples"""
+        memory = self.cpu.memory
+        table = self.cpu.instructions
+
+        decoded = []
+        address = start
+        while len(decoded) < MAX_BLOCK_INSTRUCTIONS:
+            opcode = table[memory.read(address)]
+
+            # BRK stops the CPU, so it is always left to the interpreter
+            if opcode is None or opcode.code == 0x00 or address + opcode.length > 0x10000:
+                break
+
+            operand = 0
+            if opcode.length == 2:
+                operand = memory.read(address + 1)
+            elif opcode.length == 3:
+                operand = memory.read_u16(address + 1)
+
+            decoded.append((address, opcode, operand))
+            address += opcode.length
+
+            if opcode.mnemonic.split()[0] in CONTROL_FLOW:
+                break
+
+        return decoded
+
+    def translate(self, start: int) -> Block:
+        decoded = self.decode(start)
+        end = decoded[-1][0] + decoded[-1][1].length if decoded else start + 1
+        first_page = self.watch(start // PAGE_SIZE)
+        last_page = self.watch((end - 1) // PAGE_SIZE)
+
+        if not decoded:
+            return Block(start, end, bytes(self.cpu.memory.slice(start, end)), None, 0, 0, set(), False, "", first_page, last_page)
+
+        trace = self.cpu.trace
+        generator = BlockGenerator(start, end, self.cpu.stack, self.cpu.memory.has_bus, trace.mask if trace is not None else None)
+        source = generator.generate(decoded)
+
+        namespace = {"ZN": ZERO_NEGATIVE_FLAGS, "OPCODES": self.cpu.instructions}
+        if trace is not None:
+            namespace.update(TRACE=trace, RING=trace.ring)
+        exec(compile(source, f"<block ${start:04X}>", "exec"), namespace)
+
+        max_cycles = sum(opcode.cycles + opcode.page_penalty + 2 * opcode.branch_penalty for _, opcode, _ in decoded)
+        interior = {address for address, _, _ in decoded[1:]}
+
+        logger.debug("translated %d instructions at $%04X-$%04X", len(decoded), start, end - 1)
+
+        return Block(start, end, bytes(self.cpu.memory.slice(start, end)), namespace["block"], len(decoded), max_cycles, interior, generator.loops, source, first_page, last_page)
+
+
+class BlockGenerator:
+    """Generates the Python source for a block.
+
+    Each instruction is emitted with the same arithmetic (and the same order of memory accesses) as its handler on the
+    CPU. The registers live in the locals a, x, y, p (status) and s (stack pointer), c accumulates the cycle
+    penalties and is folded with the static cycle count when the block exits.
+
+    For a CPU with a trace each instruction stores its record in the trace's ring before it runs, counting them in
+    the local traced - the count is stored back on the trace however the block exits, a memory access that raises
+    included, so the instruction that raised is the last one recorded as it is in the interpreter.
+    """
+
+    lines: List[str]
+    cycles: int
+    count: int
+    code: int
+    depth: int
+    loops: bool
+
+    def __init__(self, start: int, end: int, stack: int, has_bus: bool, trace_mask: Optional[int] = None) -> None:
+        self.start = start
+        self.end = end
+        self.stack = stack
+        # devices on the bus may look at the cycle counter when they are accessed, so keep it current
+        self.has_bus = has_bus
+        # the mask of the trace's ring, None when the CPU isn't tracing
+        self.trace_mask = trace_mask
+
+        self.lines = []
+        self.cycles = 0
+        self.count = 0
+        self.code = 0
+        self.depth = 0
+        self.loops = False
+
+    def generate(self, decoded: List[Tuple[int, Opcode, int]]) -> str:
+        last_address, last_opcode, last_operand = decoded[-1]
+        # a block that jumps back to its own start (a delay or polling loop) loops inside the function, up to the
+        # number of iterations the caller allows
+        self.loops = self.static_target(last_address, last_opcode, last_operand) == self.start
+
+        self.emit("def block(cpu, read, write, iterations):", 0)
+        self.emit("a = cpu.register_a; x = cpu.register_x; y = cpu.register_y; p = cpu.status; s = cpu.stack_pointer")
+        self.emit("c = cpu.cycles")
+
+        if self.trace_mask is not None:
+            self.emit("traced = TRACE.recorded")
+            self.emit("try:")
+            self.depth += 1
+
+        if self.loops:
+            self.emit("n = 0")
+            self.emit(f"limit = (iterations - 1) * {len(decoded)}")
+            self.emit("while True:")
+            self.depth += 1
+
+        program_counter = None
+        for address, opcode, operand in decoded:
+            if self.has_bus:
+                self.emit(f"cpu.cycles = c + {self.cycles}")
+
+            if self.trace_mask is not None:
+                self.emit(f"RING[traced & {self.trace_mask}] = ({address}, {opcode.code}, a, x, y, p, s, c + {self.cycles}); traced += 1")
+
+            self.code = opcode.code
+            program_counter = self.instruction(address, opcode, operand)
+
+            self.cycles += opcode.cycles
+            self.count += 1
+
+        if program_counter is None:
+            program_counter = str(last_address + last_opcode.length)
+
+        if self.loops:
+            self.emit(f"if {program_counter} == {self.start} and n < limit:")
+            self.emit(f"n += {self.count}", 2)
+            self.emit(f"c += {self.cycles}", 2)
+            self.emit("continue", 2)
+            self.emit("break")
+            self.depth -= 1
+
+        self.exit(program_counter, 1)
+
+        if self.trace_mask is not None:
+            self.depth -= 1
+            self.emit("finally:")
+            self.emit("TRACE.recorded = traced", 2)
+
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, line: str, indent: int = 1) -> None:
+        self.lines.append("    " * (indent + self.depth) + line)
+
+    def exit(self, program_counter: str, indent: int, count: Optional[int] = None, cycles: Optional[int] = None) -> None:
+        count = self.count if count is None else count
+        cycles = self.cycles if cycles is None else cycles
+        # the instructions executed in earlier iterations of a looping block
+        executed = "n + " if self.loops else ""
+
+        self.emit("cpu.register_a = a; cpu.register_x = x; cpu.register_y = y; cpu.status = p; cpu.stack_pointer = s", indent)
+        self.emit(f"cpu.program_counter = {program_counter}", indent)
+        self.emit(f"cpu.cycles = c + {cycles}", indent)
+        self.emit(f"cpu.opcode = OPCODES[{self.code}]", indent)
+        self.emit(f"return {executed}{count}", indent)
+
+    def guard(self, address: str, next_instruction: int, cycles: int) -> None:
+        """Stop the block after a store that may have overwritten the block's own code"""
+        if address.isdigit():
+            if not self.start <= int(address) < self.end:
+                return
+
+            self.exit(str(next_instruction), 1, self.count + 1, self.cycles + cycles)
+            return
+
+        self.emit(f"if {self.start} <= {address} < {self.end}:")
+        self.exit(str(next_instruction), 2, self.count + 1, self.cycles + cycles)
+
+    def push(self, value: str) -> None:
+        self.emit(f"write({self.stack} + s, {value})")
+        self.emit("s = (s - 1) & 0xFFFF")
+
+    def guarded_push(self, value: str, next_instruction: int, cycles: int) -> None:
+        self.push(value)
+        self.guard(f"{self.stack} + ((s + 1) & 0xFFFF)", next_instruction, cycles)
+
+    def pop(self, target: str) -> None:
+        self.emit("s = (s + 1) & 0xFFFF")
+        self.emit(f"{target} = read({self.stack} + s)")
+
+    def address(self, opcode: Opcode, operand: int) -> str:
+        """Emit the effective address calculation and return an expression for it"""
+        mode = opcode.addressing_mode
+
+        if mode == AddressingMode.ZERO_PAGE or mode == AddressingMode.ABSOLUTE:
+            return str(operand)
+
+        if mode == AddressingMode.X_INDEXED_ZERO_PAGE:
+            self.emit(f"addr = ({operand} + x) & 0xFF")
+        elif mode == AddressingMode.Y_INDEXED_ZERO_PAGE:
+            self.emit(f"addr = ({operand} + y) & 0xFF")
+        elif mode in (AddressingMode.X_INDEXED_ABSOLUTE, AddressingMode.Y_INDEXED_ABSOLUTE):
+            register = "x" if mode == AddressingMode.X_INDEXED_ABSOLUTE else "y"
+            self.emit(f"addr = ({operand} + {register}) & 0xFFFF")
+            if opcode.page_penalty:
+                self.emit(f"if ({operand} ^ addr) & 0xFF00: c += 1")
+        elif mode == AddressingMode.X_INDEXED_ZERO_PAGE_INDIRECT:
+            self.emit(f"i = ({operand} + x) & 0xFF")
+            self.emit("addr = ((read((i + 1) & 0xFF) << 8) + read(i)) & 0xFFFF")
+        elif mode == AddressingMode.ZERO_PAGE_INDIRECT_Y_INDEXED:
+            self.emit(f"base = read({operand}) + (read({(operand + 1) & 0xFF}) << 8)")
+            self.emit("addr = (base + y) & 0xFFFF")
+            if opcode.page_penalty:
+                self.emit("if (base ^ addr) & 0xFF00: c += 1")
+        else:
+            raise ValueError(f"Can't translate the addressing mode {mode}")
+
+        return "addr"
+
+    def value(self, opcode: Opcode, operand: int) -> str:
+        """Emit the operand fetch and return an expression for the value"""
+        if opcode.addressing_mode == AddressingMode.IMMEDIATE:
+            return str(operand)
+
+        self.emit(f"v = read({self.address(opcode, operand)})")
+        return "v"
+
+    def instruction(self, address: int, opcode: Opcode, operand: int) -> Optional[str]:
+        """Emit a single instruction - returns the expression for the program counter if the instruction ends the
+        block, otherwise None"""
+        mnemonic = opcode.mnemonic.split()[0]
+        next_instruction = address + opcode.length
+        cycles = opcode.cycles
+        accumulator = opcode.addressing_mode == AddressingMode.ACCUMULATOR
+
+        self.emit(f"# ${address:04X} {opcode.mnemonic}")
+
+        match mnemonic:
+            case "LDA" | "LDX" | "LDY":
+                register = mnemonic[-1].lower()
+                self.emit(f"{register} = {self.value(opcode, operand)}")
+                self.emit(f"p = (p & 0x7D) | ZN[{register} & 0xFF]")
+
+            case "STA" | "STX" | "STY":
+                register = mnemonic[-1].lower()
+                target = self.address(opcode, operand)
+                self.emit(f"write({target}, {register})")
+                self.guard(target, next_instruction, cycles)
+
+            case "ADC" | "SBC":
+                value = self.value(opcode, operand)
+                if mnemonic == "SBC":
+                    self.emit(f"v = ({value} ^ 0xFF) & 0xFF")
+                elif value != "v":
+                    self.emit(f"v = {value}")
+                self.emit("t = a + v + (p & 0x01)")
+                self.emit("r = t & 0xFF")
+                self.emit("p = (p & ~0xC3) | (t > 0xFF) | (0x40 if (v ^ r) & (r ^ a) & 0x80 != 0 else 0) | ZN[r]")
+                self.emit("a = r")
+
+            case "AND":
+                self.emit(f"a &= {self.value(opcode, operand)}")
+                self.emit("p = (p & 0x7D) | ZN[a & 0xFF]")
+
+            case "ORA":
+                # the interpreter doesn't update the flags for ORA either
+                self.emit(f"a |= {self.value(opcode, operand)}")
+
+            case "EOR":
+                self.emit(f"a ^= {self.value(opcode, operand)}")
+                self.emit("p = (p & 0x7D) | ZN[a & 0xFF]")
+
+            case "CMP" | "CPX" | "CPY":
+                register = "a" if mnemonic == "CMP" else mnemonic[-1].lower()
+                value = self.value(opcode, operand)
+                self.emit(f"p = (p & 0x7C) | ({value} <= {register}) | ZN[({register} - {value}) & 0xFF]")
+
+            case "BIT":
+                value = self.value(opcode, operand)
+                self.emit(f"p = (p & ~0xC2) | (0x02 if a & {value} == 0 else 0) | ({value} & 0xC0)")
+
+            case "ASL" | "LSR" | "ROL" | "ROR":
+                self.shift(mnemonic, opcode, operand, accumulator, next_instruction, cycles)
+
+            case "INC" | "DEC":
+                target = self.address(opcode, operand)
+                sign = "+" if mnemonic == "INC" else "-"
+                self.emit(f"v = (read({target}) {sign} 1) & 0xFF")
+                self.emit("p = (p & 0x7D) | ZN[v]")
+                self.emit(f"write({target}, v)")
+                self.guard(target, next_instruction, cycles)
+
+            case "INX" | "INY" | "DEX" | "DEY":
+                register = mnemonic[-1].lower()
+                sign = "+" if mnemonic[0] == "I" else "-"
+                self.emit(f"{register} = ({register} {sign} 1) & 0xFF")
+                self.emit(f"p = (p & 0x7D) | ZN[{register}]")
+
+            case "TAX" | "TAY" | "TXA" | "TYA" | "TSX":
+                source, target = {"TAX": ("a", "x"), "TAY": ("a", "y"), "TXA": ("x", "a"), "TYA": ("y", "a"), "TSX": ("s", "x")}[mnemonic]
+                self.emit(f"{target} = {source}")
+                self.emit(f"p = (p & 0x7D) | ZN[{target} & 0xFF]")
+
+            case "TXS":
+                self.emit("s = x")
+
+            case "CLC" | "CLD" | "CLI" | "CLV":
+                flag = {"CLC": 0x01, "CLD": 0x08, "CLI": 0x04, "CLV": 0x40}[mnemonic]
+                self.emit(f"p &= ~{flag}")
+
+            case "SEC" | "SED" | "SEI":
+                flag = {"SEC": 0x01, "SED": 0x08, "SEI": 0x04}[mnemonic]
+                self.emit(f"p |= {flag}")
+
+            case "NOP":
+                pass
+
+            case "PHA":
+                self.guarded_push("a", next_instruction, cycles)
+
+            case "PHP":
+                self.guarded_push("p | 0x30", next_instruction, cycles)
+
+            case "PLA":
+                self.pop("a")
+
+            case "PLP":
+                self.pop("p")
+                self.emit("p = (p & ~0x10) | 0x20")
+
+            case "JSR":
+                # JSR ends the block, so a return address pushed over the block's code is caught on the next entry
+                self.push(f"{(address + 2) >> 8}")
+                self.push(f"{(address + 2) & 0xFF}")
+                return str(self.jump_target(address, opcode, operand))
+
+            case "JMP":
+                if opcode.addressing_mode == AddressingMode.ABSOLUTE:
+                    return str(self.jump_target(address, opcode, operand))
+
+                if operand & 0x00FF == 0x00FF:
+                    self.emit(f"pc = (read({operand & 0xFF00}) << 8) | read({operand})")
+                else:
+                    self.emit(f"pc = read({operand}) | (read({operand + 1}) << 8)")
+                # the interpreter skips the operand when an instruction leaves the program counter where it was
+                self.emit(f"if pc == {address + 1}: pc = {next_instruction}")
+                return "pc"
+
+            case "RTS":
+                self.pop("lo")
+                self.pop("hi")
+                self.emit("pc = (hi << 8 | lo) + 1")
+                return "pc"
+
+            case "RTI":
+                self.pop("p")
+                self.emit("p = (p & ~0x10) | 0x20")
+                self.pop("lo")
+                self.pop("hi")
+                self.emit("pc = hi << 8 | lo")
+                return "pc"
+
+            case _ if mnemonic in BRANCHES:
+                target, penalty = self.branch_target(address, operand)
+
+                self.emit(f"if {BRANCHES[mnemonic]}:")
+                self.emit(f"c += {penalty}", 2)
+                self.emit(f"pc = {target}", 2)
+                self.emit("else:")
+                self.emit(f"pc = {next_instruction}", 2)
+                return "pc"
+
+            case _:
+                raise ValueError(f"Can't translate {opcode.mnemonic}")
+
+        return None
+
+    def jump_target(self, address: int, opcode: Opcode, operand: int) -> int:
+        # the interpreter skips the operand when an instruction leaves the program counter where it was
+        if operand == address + 1:
+            return address + opcode.length
+
+        return operand
+
+    def branch_target(self, address: int, operand: int) -> Tuple[int, int]:
+        """The (target, cycle penalty) of a taken branch"""
+        next_instruction = address + 2
+        target = (operand - 0x100 if operand & 0x80 else operand) + next_instruction
+        penalty = 2 if (next_instruction ^ target) & 0xFF00 else 1
+
+        # as in the interpreter, a branch that leaves the program counter on its operand skips it
+        if target == address + 1:
+            target = next_instruction
+
+        return target, penalty
+
+    def static_target(self, address: int, opcode: Opcode, operand: int) -> Optional[int]:
+        """The address a taken branch or an absolute JMP goes to, None for anything else"""
+        mnemonic = opcode.mnemonic.split()[0]
+
+        if mnemonic in BRANCHES:
+            return self.branch_target(address, operand)[0]
+
+        if mnemonic == "JMP" and opcode.addressing_mode == AddressingMode.ABSOLUTE:
+            return self.jump_target(address, opcode, operand)
+
+        return None
+
+    def shift(self, mnemonic: str, opcode: Opcode, operand: int, accumulator: bool, next_instruction: int, cycles: int) -> None:
+        target = None
+        if accumulator:
+            value = "a"
+        else:
+            target = self.address(opcode, operand)
+            self.emit(f"v = read({target})")
+            value = "v"
+
+        match mnemonic:
+            case "ASL":
+                self.emit(f"carry = {value} >> 7 & 0x01")
+                self.emit("p = (p & ~0x01) | carry")
+                self.emit(f"d = (({value} << 1) | carry) & 0xFF")
+            case "LSR":
+                self.emit(f"d = {value} >> 1")
+                self.emit(f"p = (p & 0x7C) | ({value} & 0x01) | ZN[d & 0xFF]")
+            case "ROL":
+                self.emit(f"d = (({value} << 1) | (p & 0x01)) & 0xFF")
+                self.emit(f"p = (p & ~0x01) | ({value} >> 7 & 0x01)")
+            case "ROR":
+                self.emit(f"d = {value} >> 1")
+                self.emit("if p & 0x01: d |= 0x80")
+                self.emit(f"p = (p & ~0x01) | ({value} & 0x01)")
+
+        if accumulator:
+            self.emit("a = d")
+            return
+
+        # the interpreter only updates the negative flag for the memory forms of ASL, ROL and ROR
+        if mnemonic != "LSR":
+            self.emit("p = (p & ~0x80) | (d & 0x80)")
+        self.emit(f"write({target}, d)")
+        self.guard(target, next_instruction, cycles)
@@ -0,0 +1,122 @@
+import pytest
+from apu import APU, BUTTON_A, BUTTON_START, OPEN_BUS
+from constants import StopReason
+from cpu import CPU
+from memory import Memory
+
+# the usual reset code - silence the APU, set the frame counter, strobe and read the first controller
+# fmt: off
+RESET = [
+    0x78,              # SEI
+    0xA9, 0x00,        # LDA #$00
+    0x8D, 0x15, 0x40,  # STA $4015
+    0xA9, 0x40,        # LDA #$40
+    0x8D, 0x17, 0x40,  # STA $4017
+    0xA9, 0x01,        # LDA #$01
+    0x8D, 0x16, 0x40,  # STA $4016
+    0xA9, 0x00,        # LDA #$00
+    0x8D, 0x16, 0x40,  # STA $4016
+    0xAD, 0x16, 0x40,  # LDA $4016
+    0x85, 0x10,        # STA $10
+    0xAD, 0x16, 0x40,  # LDA $4016
+    0x85, 0x11,        # STA $11
+    0x00,              # BRK
+]
+# fmt: on
+
+
+def program_rom() -> bytes:
+    # 16KiB at $8000 (and mirrored at $C000), the reset vector pointing at the start
+    rom = bytearray(0x4000)
+    rom[: len(RESET)] = bytes(RESET)
+    rom[0x3FFC:0x3FFE] = (0x8000).to_bytes(2, "little")
+    return bytes(rom)
+
+
+def test_registers_latch_writes():
+    apu = APU()
+
+    apu.write(0x4015, 0x0F)
+    apu.write(0x4017, 0x40)
+    assert apu.registers[0x15] == 0x0F and apu.registers[0x17] == 0x40
+
+    # the write only registers are open bus
+    assert apu.read(0x4015) == OPEN_BUS
+    assert apu.read(0x4000) == OPEN_BUS
+    # and nothing listens past $4017
+    apu.write(0x4020, 0xFF)
+    assert apu.read(0x4020) == OPEN_BUS
+
+    with pytest.raises(ValueError):
+        apu.map_register(0x4018, lambda addr, data: None)
+
+
+def test_controller_shifts_out_the_buttons():
+    apu = APU()
+    apu.controllers[0].buttons = BUTTON_A | BUTTON_START
+
+    # while strobed the first button is read over and over
+    apu.write(0x4016, 0x01)
+    assert [apu.read(0x4016) & 0x01 for _ in range(3)] == [1, 1, 1]
+
+    apu.write(0x4016, 0x00)
+    assert [apu.read(0x4016) & 0x01 for _ in range(10)] == [1, 0, 0, 1, 0, 0, 0, 0, 1, 1]
+    # nothing held on the second
+    assert apu.read(0x4017) == OPEN_BUS
+
+
+def test_map_register():
+    apu = APU()
+    writes = []
+    apu.map_register(0x4014, lambda addr, data: writes.append((addr, data)))
+
+    apu.write(0x4014, 0x02)
+    assert writes == [(0x4014, 0x02)]
+    assert apu.registers[0x14] == 0x00
+
+
+def test_reset_code_runs_on_the_bus():
+    memory = Memory(has_bus=True)
+    memory.map_buffer(0x8000, 0x10000, program_rom(), writable=False)
+    memory.apu.controllers[0].buttons = BUTTON_A
+
+    cpu = CPU(memory=memory)
+    cpu.reset()
+
+    assert cpu.execute(100) == StopReason.BRK
+    assert memory.apu.registers[0x15] == 0x00 and memory.apu.registers[0x17] == 0x40
+    # A then B
+    assert memory.read(0x10) == OPEN_BUS | 0x01
+    assert memory.read(0x11) == OPEN_BUS
+
+
+def test_reset_code_runs_on_the_console(tmp_path):
+    # the cartridge loader types its paths with pydantic
+    pytest.importorskip("pydantic")
+    from console import Console
+
+    path = tmp_path / "reset.nes"
+    path.write_bytes(b"NES\x1a" + bytes([0x01, 0x01]) + bytes(10) + program_rom() + bytes(0x2000))
+
+    with Console(rom_path=path, memory_map=True) as console:
+        console.load_cartridge()
+
+        assert console.run_frame() == StopReason.BRK
+        assert console.memory.apu.registers[0x17] == 0x40
+
+    # closed with the console
+    with pytest.raises(ValueError):
+        console.cartrige.program_rom[0]
+
+
+def test_fork_has_its_own_registers():
+    memory = Memory(has_bus=True)
+    memory.write(0x4017, 0x40)
+    fork = memory.fork()
+
+    fork.write(0x4017, 0x00)
+    fork.apu.controllers[0].buttons = BUTTON_A
+
+    assert fork.apu is not memory.apu
+    assert memory.apu.registers[0x17] == 0x40 and fork.apu.registers[0x17] == 0x00
+    assert memory.apu.controllers[0].buttons == 0
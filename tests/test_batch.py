@@ -0,0 +1,86 @@
+import pytest
+from batch import find_programs, run_batch, run_program
+from constants import StopReason
+
+# LDX #$00, NOP, NOP, DEX, BNE -5, BRK
+DELAY_LOOP = bytes([0xA2, 0x00, 0xEA, 0xEA, 0xCA, 0xD0, 0xFB, 0x00])
+
+
+def test_run_program(tmp_path):
+    path = tmp_path / "delay.bin"
+    path.write_bytes(DELAY_LOOP)
+
+    report = run_program(path, instructions=10_000, cycles=10**9)
+
+    assert report["stop_reason"] == StopReason.BRK.value
+    assert report["instructions"] == 1 + 256 * 4 + 1
+    assert report["registers"]["program_counter"] == 0x0608
+    assert report["registers"]["x"] == 0
+
+    # the engines all finish in the same state
+    for options in ({"translate": True}, {"fast_forward": True}, {"translate": True, "fast_forward": True}):
+        other = run_program(path, instructions=10_000, cycles=10**9, **options)
+        assert {key: other[key] for key in ("stop_reason", "registers", "memory_sha1", "instructions", "cycles")} == {
+            key: report[key] for key in ("stop_reason", "registers", "memory_sha1", "instructions", "cycles")
+        }
+
+
+def test_run_program_budget(tmp_path):
+    path = tmp_path / "delay.bin"
+    path.write_bytes(DELAY_LOOP)
+
+    assert run_program(path, instructions=10, cycles=10**9)["stop_reason"] == StopReason.INSTRUCTION_BUDGET.value
+    assert run_program(path, instructions=10_000, cycles=100)["stop_reason"] == StopReason.CYCLE_BUDGET.value
+
+
+def test_run_batch(tmp_path):
+    (tmp_path / "delay.bin").write_bytes(DELAY_LOOP)
+    (tmp_path / "undefined.bin").write_bytes(bytes([0x02]))
+    # not a valid iNES ROM
+    (tmp_path / "broken.nes").write_bytes(b"NES\x1a")
+
+    report = run_batch(find_programs(tmp_path), instructions=10_000, workers=2)
+
+    programs = {program["path"].rsplit("/", 1)[-1]: program for program in report["programs"]}
+    assert programs["delay.bin"]["stop_reason"] == StopReason.BRK.value
+    assert programs["undefined.bin"]["stop_reason"] == StopReason.UNDEFINED_OPCODE.value
+    assert "error" in programs["broken.nes"]
+
+    assert report["summary"]["programs"] == 3
+    assert report["summary"]["errors"] == 1
+    assert report["summary"]["instructions"] == programs["delay.bin"]["instructions"]
+
+
+def test_run_rom_takes_nmis(tmp_path):
+    # the cartridge loader types its paths with pydantic
+    pytest.importorskip("pydantic")
+
+    # fmt: off
+    code = bytes([
+        0xA9, 0x80,        # LDA #$80
+        0x8D, 0x00, 0x20,  # STA $2000 - NMI at vblank
+        0xA5, 0x10,        # LDA $10
+        0xC9, 0x03,        # CMP #$03
+        0xD0, 0xFA,        # BNE -6 - wait for the third vblank
+        0x00,              # BRK
+        0xE6, 0x10,        # NMI: INC $10
+        0x40,              # RTI
+    ])
+    # fmt: on
+    program_rom = bytearray(0x4000)
+    program_rom[: len(code)] = code
+    # the NMI, reset and IRQ vectors
+    program_rom[0x3FFA:0x4000] = bytes([0x0C, 0x80, 0x00, 0x80, 0x0C, 0x80])
+
+    path = tmp_path / "vblank.nes"
+    path.write_bytes(b"NES\x1a" + bytes([0x01, 0x01]) + bytes(10) + bytes(program_rom) + bytes(0x2000))
+
+    for options in ({}, {"fast_forward": True}):
+        report = run_program(path, instructions=1_000_000, cycles=10**9, **options)
+        assert report["stop_reason"] == StopReason.BRK.value
+        # the third vblank - two frames of 29780 cycles after the first, at scanline 241 of the first frame
+        assert 2 * 29780 + 241 * 341 // 3 < report["cycles"] < 3 * 29780
+
+    # the budgets still stop a ROM part way through a frame
+    assert run_program(path, instructions=100, cycles=10**9)["instructions"] == 100
+    assert run_program(path, instructions=1_000_000, cycles=1000)["stop_reason"] == StopReason.CYCLE_BUDGET.value
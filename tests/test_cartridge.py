@@ -0,0 +1,126 @@
+import pytest
+
+# the cartridge loader types its paths with pydantic
+pytest.importorskip("pydantic")
+
+from cartridge import Cartridge, parse_header  # noqa: E402
+from constants import CartridgeFormat  # noqa: E402
+from memory import Memory  # noqa: E402
+
+
+def rom(program_banks: int = 2, character_banks: int = 1, flags_6: int = 0x00, trainer: bytes = b"") -> bytes:
+    header = b"NES\x1a" + bytes([program_banks, character_banks, flags_6]) + bytes(9)
+    program_rom = b"".join(bytes([0x10 + bank]) * 0x4000 for bank in range(program_banks))
+    character_rom = b"".join(bytes([0x80 + bank]) * 0x2000 for bank in range(character_banks))
+
+    return header + trainer + program_rom + character_rom
+
+
+@pytest.mark.parametrize("memory_map", [False, True])
+def test_banks(tmp_path, memory_map):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom(program_banks=2, character_banks=2))
+
+    cartridge = Cartridge(path, memory_map=memory_map)
+
+    assert cartridge.type == CartridgeFormat.ines
+    assert len(cartridge.program_rom) == 0x8000
+    assert len(cartridge.character_rom) == 0x4000
+    assert cartridge.program_rom[0] == 0x10 and cartridge.program_rom[-1] == 0x11
+    assert cartridge.character_rom[0] == 0x80 and cartridge.character_rom[-1] == 0x81
+
+    # zero-copy read-only views of the ROM
+    assert cartridge.program_rom.readonly
+    assert cartridge.program_rom_bank(1)[0] == 0x11
+    assert cartridge.program_rom_bank(2)[0] == 0x10
+    assert cartridge.character_rom_bank(1, size=0x1000)[0] == 0x80
+
+
+def test_character_ram(tmp_path):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom(character_banks=0))
+
+    cartridge = Cartridge(path)
+
+    assert len(cartridge.character_rom) == 0
+    with pytest.raises(ValueError):
+        cartridge.character_rom_bank(0)
+
+
+def test_close(tmp_path):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom())
+
+    with Cartridge(path, memory_map=True) as cartridge:
+        assert cartridge.program_rom[0] == 0x10
+
+    assert cartridge.rom.closed
+    with pytest.raises(ValueError):
+        cartridge.program_rom[0]
+
+
+def test_close_while_loaded(tmp_path):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom(program_banks=1))
+
+    memory = Memory(has_bus=True)
+    cartridge = Cartridge(path, memory_map=True)
+    memory.load_cartridge(cartridge)
+    cartridge.close()
+
+    # the memory's views keep the ROM mapped until it goes
+    assert not cartridge.rom.closed
+    assert memory.read(0x8000) == 0x10
+
+
+def test_trainer_and_mapper(tmp_path):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom(program_banks=1, flags_6=0x14, trainer=bytes(0x200)))
+
+    cartridge = Cartridge(path)
+
+    assert cartridge.mapper == 1
+    assert cartridge.program_rom[0] == 0x10
+    assert cartridge.character_rom[0] == 0x80
+
+
+def test_load_into_memory(tmp_path):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom(program_banks=1))
+
+    memory = Memory(has_bus=True)
+    memory.load_cartridge(Cartridge(path, memory_map=True))
+
+    # a 16KiB PRG ROM is mirrored into both banks, and is read only
+    assert memory.read(0x8000) == 0x10
+    assert memory.read(0xC000) == 0x10
+    memory.write(0x8000, 0xFF)
+    assert memory.read(0x8000) == 0x10
+
+
+def test_invalid(tmp_path):
+    path = tmp_path / "test.nes"
+
+    path.write_bytes(b"NES")
+    with pytest.raises(ValueError):
+        Cartridge(path)
+
+    # the header says there is more PRG ROM than there is
+    path.write_bytes(rom(program_banks=2)[:0x5000])
+    with pytest.raises(ValueError):
+        Cartridge(path, memory_map=True)
+
+
+def test_header_is_parsed_once():
+    header = rom()[:0x10]
+    assert parse_header(header, 0x10 + 0xA000) is parse_header(header, 0x10 + 0xA000)
+
+
+def test_nes20_sizes():
+    # 0x101 PRG ROM banks, CHR ROM in exponent-multiplier notation: 2^13 * 3 bytes
+    header = b"NES\x1a" + bytes([0x01, 0x35, 0x00, 0x08, 0x00, 0xF1]) + bytes(6)
+    parsed = parse_header(header, 0x10 + 0x101 * 0x4000 + 0x6000)
+
+    assert parsed.type == CartridgeFormat.nes20
+    assert parsed.program_rom_size == 0x101 * 0x4000
+    assert parsed.character_rom_size == 0x6000
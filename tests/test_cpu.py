@@ -1,4 +1,5 @@
-from cpu import CPU, AddressingMode, Flags
+import pytest
+from cpu import CPU, AddressingMode, Flags, StopReason
 
 
 # # Tests
@@ -801,3 +802,268 @@ def test_unsigned_to_signed_converstion():
 
     for i in range(128, 256):
         assert cpu.unsigned_to_signed(i, 8) == i - 256
+
+
+def test_dispatch_table_covers_opcodes():
+    cpu = CPU()
+
+    assert len(cpu.dispatch) == 0x100
+    for code in range(0x100):
+        assert (cpu.dispatch[code] is None) == (code not in cpu.opcodes)
+
+
+def test_get_operand_address_absolute_indirect_page_wrap():
+    # JMP ($30FF) -> the high byte of the target is read from $3000 not $3100
+    cpu = CPU()
+
+    cpu.memory.write(0x10, 0x6C)
+    cpu.memory.write(0x11, 0xFF)
+    cpu.memory.write(0x12, 0x30)
+
+    cpu.memory.write(0x30FF, 0x80)
+    cpu.memory.write(0x3000, 0x50)
+    cpu.memory.write(0x3100, 0x40)
+
+    cpu.program_counter = 0x11
+
+    assert cpu.get_operand_address(AddressingMode.ABSOLUTE_INDIRECT) == 0x5080
+
+
+def test_status_is_int_and_flags_at_api_edge():
+    cpu = CPU(**dict(status=Flags.CARRY | Flags.ZERO))
+    assert type(cpu.status) is int
+    assert cpu.flags == Flags.CARRY | Flags.ZERO
+
+    # LDA #$80
+    # BRK
+    cpu.load_and_run([0xA9, 0x80, 0x00])
+    assert type(cpu.status) is int
+    assert cpu.flags == Flags.NEGATIVE | Flags.UNUSED | Flags.BREAK
+
+
+def test_cycles_base():
+    cpu = CPU()
+
+    # LDA #$05
+    # TAX
+    # INX
+    # BRK
+    cpu.load_and_run([0xA9, 0x05, 0xAA, 0xE8, 0x00])
+
+    # 7 for the reset sequence then 2 for each instruction
+    assert cpu.cycles == 7 + 2 + 2 + 2
+
+
+def test_cycles_page_crossing():
+    cpu = CPU()
+
+    # LDA $10F0,X
+    cpu.pre_load([0xBD, 0xF0, 0x10, 0x00], **{"register_x": 0x0F})
+    assert cpu.step() == 4
+
+    # the index now carries into the next page
+    cpu.reset(**{"register_x": 0x10})
+    assert cpu.step() == 5
+
+
+def test_cycles_no_page_crossing_penalty_for_stores():
+    cpu = CPU()
+
+    # STA $10F0,X
+    cpu.pre_load([0x9D, 0xF0, 0x10, 0x00], **{"register_x": 0x10})
+    assert cpu.step() == 5
+
+
+def test_cycles_branch():
+    cpu = CPU()
+
+    # BNE $03 - not taken
+    cpu.pre_load([0xD0, 0x03, 0x00], **dict(status=[Flags.ZERO]))
+    assert cpu.step() == 2
+
+    # taken
+    cpu.reset()
+    assert cpu.step() == 3
+
+    # taken onto the previous page
+    cpu.pre_load([0xD0, 0x80, 0x00])
+    assert cpu.step() == 4
+
+
+def test_step_stops_on_brk():
+    cpu = CPU()
+    cpu.pre_load([0x00])
+    assert cpu.step() == 0
+
+
+def test_run_until_cycles():
+    cpu = CPU()
+
+    # LDX #$00
+    # DEX
+    # BNE -3
+    # BRK
+    cpu.pre_load([0xA2, 0x00, 0xCA, 0xD0, 0xFD, 0x00])
+
+    # the last instruction overshoots the target: LDX (2), DEX (2), BNE (3), DEX (2), BNE (3)
+    assert cpu.run_until_cycles(7 + 10) == StopReason.CYCLE_BUDGET
+    assert cpu.cycles == 7 + 12
+
+    # runs until BRK: 256 DEX (2) and 255 taken BNE (3) and a final untaken BNE (2)
+    assert cpu.run_until_cycles(100_000) == StopReason.BRK
+    assert cpu.cycles == 7 + 2 + 256 * 2 + 255 * 3 + 2
+    assert cpu.register_x == 0
+
+
+def test_run_for():
+    cpu = CPU()
+
+    # LDX #$00
+    # DEX
+    # BNE -3
+    # BRK
+    cpu.pre_load([0xA2, 0x00, 0xCA, 0xD0, 0xFD, 0x00])
+
+    assert cpu.run_for(3) == StopReason.INSTRUCTION_BUDGET
+    assert cpu.register_x == 0xFF
+    assert cpu.program_counter == 0x8002
+    assert cpu.executed == 3
+
+    assert cpu.run_for(10_000) == StopReason.BRK
+    # LDX, 256 times round DEX/BNE and the BRK
+    assert cpu.executed == 1 + 256 * 2 + 1
+
+
+def test_run_until():
+    cpu = CPU()
+
+    # LDX #$03
+    # DEX
+    # BNE -3
+    # LDA #$01
+    # BRK
+    cpu.pre_load([0xA2, 0x03, 0xCA, 0xD0, 0xFD, 0xA9, 0x01, 0x00])
+
+    assert cpu.run_until(0x8005) == StopReason.PROGRAM_COUNTER
+    assert cpu.program_counter == 0x8005
+    assert cpu.register_x == 0
+    assert cpu.register_a == 0
+
+
+def test_run_for_undefined_opcode():
+    cpu = CPU()
+    cpu.pre_load([0xA9, 0x01, 0x02])
+
+    assert cpu.run_for(10) == StopReason.UNDEFINED_OPCODE
+    assert cpu.register_a == 1
+
+
+def test_run_for_callback_at_batch_boundary():
+    calls = []
+    cpu = CPU(callback=lambda: calls.append(1))
+    cpu.pre_load([0xEA] * 10 + [0x00])
+
+    cpu.run_for(5)
+    cpu.run_for(5)
+    assert len(calls) == 2
+
+
+def test_snapshot_restore():
+    cpu = CPU()
+
+    # LDX #$00
+    # DEX
+    # STX $10
+    # BNE -5
+    # BRK
+    cpu.pre_load([0xA2, 0x00, 0xCA, 0x86, 0x10, 0xD0, 0xFB, 0x00])
+    cpu.run_for(100)
+    snapshot = cpu.snapshot()
+
+    # finishing the run from a snapshot, on the same or another CPU, ends in the same state
+    assert cpu.run_for(10_000) == StopReason.BRK
+    expected = cpu.snapshot()
+
+    cpu.restore(snapshot)
+    assert cpu.register_x == 0xDF
+    assert cpu.executed == 100
+    assert cpu.snapshot() == snapshot
+
+    other = CPU()
+    other.restore(snapshot)
+    assert other.run_for(10_000) == StopReason.BRK
+    assert other.snapshot() == expected
+
+
+def test_restore_invalid():
+    cpu = CPU()
+    snapshot = cpu.snapshot()
+
+    with pytest.raises(ValueError):
+        cpu.restore(b"XXXX" + snapshot[4:])
+
+    with pytest.raises(ValueError):
+        cpu.restore(snapshot[:10])
+
+
+def test_nmi():
+    cpu = CPU()
+
+    # LDX #$05
+    # NOP
+    # BRK
+    # the handler 16 bytes in:
+    # INX
+    # RTI
+    cpu.pre_load([0xA2, 0x05, 0xEA, 0x00] + [0x00] * 12 + [0xE8, 0x40])
+    handler = cpu.program_offset + 0x10
+    cpu.memory.write_u16(0xFFFA, handler)
+    cpu.run_for(1)
+
+    status = cpu.status
+    cycles = cpu.cycles
+    cpu.nmi()
+
+    assert cpu.program_counter == handler
+    assert cpu.cycles == cycles + 7
+    assert cpu.status & Flags.INTERRUPT_DISABLE
+    assert cpu.stack_pointer == 0xFC
+    # the status is pushed with the break flag clear
+    assert cpu.memory.read(cpu.stack + 0xFD) == (status & ~Flags.BREAK) | Flags.UNUSED
+
+    # RTI returns to the interrupted instruction
+    assert cpu.run_for(10) == StopReason.BRK
+    assert cpu.register_x == 0x06
+    assert cpu.stack_pointer == 0xFF
+    assert cpu.status == status & ~Flags.BREAK
+
+
+def test_irq():
+    cpu = CPU()
+
+    # SEI
+    # CLI
+    # BRK
+    # the handler 16 bytes in:
+    # INX
+    # RTI
+    cpu.pre_load([0x78, 0x58, 0x00] + [0x00] * 13 + [0xE8, 0x40])
+    handler = cpu.program_offset + 0x10
+    cpu.memory.write_u16(0xFFFE, handler)
+
+    # masked while interrupts are disabled
+    cpu.run_for(1)
+    program_counter = cpu.program_counter
+    assert not cpu.irq()
+    assert cpu.program_counter == program_counter and cpu.stack_pointer == 0xFF
+
+    cpu.run_for(1)
+    cycles = cpu.cycles
+    assert cpu.irq()
+    assert cpu.program_counter == handler
+    assert cpu.cycles == cycles + 7
+    assert cpu.status & Flags.INTERRUPT_DISABLE
+
+    assert cpu.run_for(10) == StopReason.BRK
+    assert cpu.register_x == 0x01
+    assert cpu.stack_pointer == 0xFF
@@ -0,0 +1,65 @@
+import io
+from disassembler import Disassembler, Instruction, write_listing
+from memory import Memory
+
+# LDX #$05
+# loop: DEX
+# BNE loop
+# JSR sub
+# BRK
+# .byte $FF
+# sub: LDA ($10),Y
+# RTS
+PROGRAM = bytes([0xA2, 0x05, 0xCA, 0xD0, 0xFD, 0x20, 0x0A, 0x06, 0x00, 0xFF, 0xB1, 0x10, 0x60])
+
+
+def test_linear():
+    disassembler = Disassembler(PROGRAM, 0x0600)
+    instructions = list(disassembler.linear())
+
+    assert [instruction.address for instruction in instructions] == [0x0600, 0x0602, 0x0603, 0x0605, 0x0608, 0x0609, 0x060A, 0x060C]
+    assert [instruction.text() for instruction in instructions] == ["LDX #$05", "DEX", "BNE $0602", "JSR $060A", "BRK", ".byte $FF", "LDA ($10),Y", "RTS"]
+    assert instructions[2] == Instruction(0x0603, 0xD0, 0xFD, 2, 0x0602)
+    assert instructions[3].target == 0x060A
+    assert not instructions[5].defined
+
+    # a sweep from part way through
+    assert [instruction.text() for instruction in disassembler.linear(0x0605, 0x0609)] == ["JSR $060A", "BRK"]
+
+
+def test_recursive_follows_the_flow_of_control():
+    disassembler = Disassembler(PROGRAM, 0x0600)
+
+    # the .byte after BRK can't be reached
+    assert [instruction.address for instruction in sorted(disassembler.recursive([0x0600]))] == [0x0600, 0x0602, 0x0603, 0x0605, 0x0608, 0x060A, 0x060C]
+    # each instruction is decoded once
+    assert len(disassembler.cache) == 7
+
+
+def test_cut_off_instruction():
+    # JMP without its operand
+    instruction = next(Disassembler(bytes([0x4C, 0x00]), 0x8000).linear())
+
+    assert instruction == Instruction(0x8000, 0x4C, None, 1, None)
+    assert instruction.text() == ".byte $4C"
+
+
+def test_cache_and_invalidate():
+    memory = Memory()
+    memory.load(0x0600, 0x0600 + len(PROGRAM), list(PROGRAM))
+    disassembler = Disassembler.from_memory(memory, 0x0600, 0x0600 + len(PROGRAM))
+
+    assert disassembler.decode(0x0600).text() == "LDX #$05"
+
+    # flat memory is viewed, the cache has to be told about the change
+    memory.write(0x0601, 0x07)
+    assert disassembler.decode(0x0600).text() == "LDX #$05"
+    disassembler.invalidate(0x0601, 0x0602)
+    assert disassembler.decode(0x0600).text() == "LDX #$07"
+
+
+def test_listing():
+    output = io.StringIO()
+    write_listing(Disassembler(PROGRAM, 0x0600).linear(0x0600, 0x0605), output)
+
+    assert output.getvalue() == "0600  A2 05     LDX #$05\n0602  CA        DEX\n0603  D0 FD     BNE $0602\n"
@@ -0,0 +1,104 @@
+import pytest
+from cpu import CPU
+from disassembler import Disassembler
+from golden import Entry, compare, parse, read_log
+from tracer import render
+
+# LDX #$03
+# DEX
+# BNE -3
+# BRK
+PROGRAM = [0xA2, 0x03, 0xCA, 0xD0, 0xFD, 0x00]
+
+
+def reference_log():
+    # the log the program should produce, with P shown the way nestest shows it - without the break bit
+    cpu = CPU(program_offset=0x0600, trace=16)
+    cpu.pre_load(PROGRAM)
+    cpu.run_for(100)
+
+    disassembler = Disassembler(bytes(PROGRAM), 0x0600)
+    return [render(record[:5] + (record[5] & ~0x10,) + record[6:], disassembler) for record in cpu.trace.records()]
+
+
+def load():
+    cpu = CPU(program_offset=0x0600, trace=4)
+    cpu.pre_load(PROGRAM)
+    return cpu
+
+
+def test_parse():
+    line = "C000  4C F5 C5  JMP $C5F5                       A:00 X:00 Y:00 P:24 SP:FD PPU:  0, 21 CYC:7"
+    assert parse(line, 1) == Entry(1, 0xC000, 0x00, 0x00, 0x00, 0x24, 0xFD, 7, line)
+
+    # older logs count cycles per scanline and have no total
+    entry = parse("C000  4C F5 C5  JMP $C5F5                       A:00 X:00 Y:00 P:24 SP:FD CYC:  0 SL:241")
+    assert entry.program_counter == 0xC000 and entry.cycles is None
+
+    assert parse("") is None
+    assert parse("; not a trace line") is None
+
+
+def test_read_log_skips_other_lines():
+    log = ["; header\n", *(f"{line}\n" for line in reference_log())]
+    entries = list(read_log(log))
+
+    assert len(entries) == 8
+    assert entries[0].line_number == 2
+    assert entries[-1].program_counter == 0x0605
+
+
+def test_matches_log():
+    # in batches of 4, so the log is checked across batches
+    matched, divergence = compare(load(), read_log(reference_log()), batch_size=4)
+
+    assert divergence is None
+    assert matched == 8
+
+
+def test_stops_at_divergence():
+    log = reference_log()
+    log[4] = log[4].replace("X:01", "X:07")
+
+    matched, divergence = compare(load(), read_log(log), history=2, batch_size=4)
+
+    assert matched == 4
+    assert divergence.entry.line_number == 5
+    assert divergence.differences == {"X": (0x07, 0x01)}
+    assert divergence.history == log[2:4]
+    assert divergence.record[0] == 0x0603
+
+    report = divergence.report()
+    assert "Diverged at line 5" in report
+    assert "X: expected 07, got 01" in report
+
+
+def test_cycle_divergence():
+    log = reference_log()
+    log[1] = log[1].replace("CYC:9", "CYC:10")
+
+    matched, divergence = compare(load(), read_log(log), batch_size=4)
+
+    assert matched == 1
+    assert divergence.differences == {"CYC": (10, 9)}
+
+
+def test_cpu_stops_before_log_ends():
+    log = reference_log()
+    log.append(log[-1])
+
+    matched, divergence = compare(load(), read_log(log), batch_size=4)
+
+    assert matched == 8
+    assert divergence.record is None
+    assert divergence.reason == "BRK"
+
+
+def test_needs_a_trace():
+    cpu = CPU(program_offset=0x0600)
+    with pytest.raises(ValueError):
+        compare(cpu, read_log(reference_log()))
+
+    cpu = CPU(program_offset=0x0600, trace=4)
+    with pytest.raises(ValueError):
+        compare(cpu, read_log(reference_log()), batch_size=8)
@@ -0,0 +1,99 @@
+import pytest
+from constants import StopReason
+from cpu import CPU
+
+# LDX #$00, NOP, NOP, DEX, BNE -5 (back to the first NOP), BRK - the delay loop from the snake program
+DELAY_LOOP = [0xA2, 0x00, 0xEA, 0xEA, 0xCA, 0xD0, 0xFB, 0x00]
+# LDA $10, BPL -4, BRK - waits for bit 7 of $10
+POLLING_LOOP = [0xA5, 0x10, 0x10, 0xFC, 0x00]
+# LDX $CA, LSR A, AND $0206,Y, BCS -8 (never taken), JMP $0600 - comes back to the head round a longer path than the
+# one closed by the branch
+JMP_LOOP = [0xA6, 0xCA, 0x4A, 0x39, 0x06, 0x02, 0xB0, 0xF8, 0x4C, 0x00, 0x06]
+
+
+def state(cpu: CPU) -> tuple:
+    return cpu.register_a, cpu.register_x, cpu.register_y, cpu.status, cpu.stack_pointer, cpu.program_counter, cpu.cycles, cpu.executed, bytes(cpu.memory.data)
+
+
+def run(program: list, batches: list, fast_forward: bool, translate: bool = False, **kwargs) -> tuple:
+    cpu = CPU(program_offset=0x0600, fast_forward=fast_forward, translate=translate)
+    cpu.pre_load(program)
+
+    reasons = [cpu.execute(batch, **kwargs) for batch in batches]
+
+    return reasons, state(cpu)
+
+
+def test_fast_forward_is_opt_in():
+    assert CPU().idle_loops is None
+    assert CPU(fast_forward=True).idle_loops is not None
+
+
+@pytest.mark.parametrize("translate", [False, True])
+def test_countdown_loop(translate):
+    expected = run(DELAY_LOOP, [10_000], fast_forward=False)
+    assert expected[0] == [StopReason.BRK]
+    assert run(DELAY_LOOP, [10_000], fast_forward=True, translate=translate) == expected
+
+    cpu = CPU(program_offset=0x0600, fast_forward=True)
+    cpu.pre_load(DELAY_LOOP)
+    cpu.execute(10_000)
+
+    assert cpu.idle_loops.loops[0x0602].kind == "countdown"
+
+
+@pytest.mark.parametrize("batch", [1, 3, 4, 100, 1000])
+def test_countdown_loop_batches(batch):
+    expected = run(DELAY_LOOP, [batch] * 20, fast_forward=False)
+    assert run(DELAY_LOOP, [batch] * 20, fast_forward=True) == expected
+
+
+@pytest.mark.parametrize("until_cycles", [20, 21, 22, 500, 1793])
+def test_countdown_loop_cycle_budget(until_cycles):
+    expected = run(DELAY_LOOP, [10_000], fast_forward=False, until_cycles=until_cycles)
+    assert run(DELAY_LOOP, [10_000], fast_forward=True, until_cycles=until_cycles) == expected
+
+
+def test_countdown_loop_until_pc():
+    expected = run(DELAY_LOOP, [10_000], fast_forward=False, until_pc=0x0604)
+    assert expected[0] == [StopReason.PROGRAM_COUNTER]
+    assert run(DELAY_LOOP, [10_000], fast_forward=True, until_pc=0x0604) == expected
+
+
+@pytest.mark.parametrize("translate", [False, True])
+def test_polling_loop(translate):
+    expected = run(POLLING_LOOP, [10_001], fast_forward=False)
+    assert run(POLLING_LOOP, [10_001], fast_forward=True, translate=translate) == expected
+
+
+def test_polling_loop_skips_to_the_budget():
+    cpu = CPU(program_offset=0x0600, fast_forward=True)
+    cpu.pre_load(POLLING_LOOP)
+
+    # the loop never ends, so the whole budget is skipped rather than run
+    assert cpu.run_until_cycles(10**12) == StopReason.CYCLE_BUDGET
+    assert cpu.program_counter in (0x0600, 0x0602)
+    assert 10**12 <= cpu.cycles < 10**12 + 6
+
+    # once memory changes the loop falls through
+    cpu.memory.write(0x10, 0x80)
+    assert cpu.run_for(100) == StopReason.BRK
+    assert cpu.register_a == 0x80
+
+
+@pytest.mark.parametrize("translate", [False, True])
+def test_untaken_branch_then_jmp(translate):
+    expected = run(JMP_LOOP, [100] * 6, fast_forward=False)
+    assert run(JMP_LOOP, [100] * 6, fast_forward=True, translate=translate) == expected
+
+
+def test_loop_that_writes_isnt_idle():
+    # LDX #$05, STX $10, DEX, BNE -5, BRK
+    program = [0xA2, 0x05, 0x86, 0x10, 0xCA, 0xD0, 0xFB, 0x00]
+
+    cpu = CPU(program_offset=0x0600, fast_forward=True)
+    cpu.pre_load(program)
+    cpu.execute(1000)
+
+    assert cpu.idle_loops.loops[0x0602].kind is None
+    assert run(program, [1000], fast_forward=True)[1] == run(program, [1000], fast_forward=False)[1]
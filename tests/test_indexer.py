@@ -0,0 +1,60 @@
+import hashlib
+import os
+import zlib
+import pytest
+
+# the header parser lives with the cartridge loader, which types its paths with pydantic
+pytest.importorskip("pydantic")
+
+from indexer import RomIndex, index_rom  # noqa: E402
+
+
+def rom(program_banks: int = 1, character_banks: int = 1, flags_6: int = 0x00, flags_9: int = 0x00) -> bytes:
+    header = b"NES\x1a" + bytes([program_banks, character_banks, flags_6, 0x00, 0x00, flags_9]) + bytes(6)
+    return header + bytes([0xEA]) * 0x4000 * program_banks + bytes([0x55]) * 0x2000 * character_banks
+
+
+def test_index_rom(tmp_path):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom(program_banks=2, flags_6=0x13, flags_9=0x01))
+
+    row = index_rom(path)
+
+    assert row["error"] is None
+    assert row["format"] == "iNES1.0"
+    assert row["mapper"] == 1
+    assert row["mirroring"] == "VERTICAL"
+    assert row["battery"]
+    assert row["tv_system"] == "PAL"
+    assert row["program_rom_size"] == 0x8000
+    assert row["program_rom_sha1"] == hashlib.sha1(bytes([0xEA]) * 0x8000).hexdigest()
+    assert row["character_rom_crc32"] == f"{zlib.crc32(bytes([0x55]) * 0x2000):08x}"
+
+
+def test_index_rom_invalid(tmp_path):
+    path = tmp_path / "test.nes"
+    path.write_bytes(rom()[:0x1000])
+
+    assert index_rom(path)["error"].startswith("ValueError")
+
+
+def test_rescan_only_reads_changes(tmp_path):
+    library = tmp_path / "library"
+    (library / "nested").mkdir(parents=True)
+    (library / "first.nes").write_bytes(rom())
+    (library / "nested" / "second.nes").write_bytes(rom(program_banks=2))
+    (library / "readme.txt").write_text("not a ROM")
+
+    with RomIndex(tmp_path / "roms.sqlite") as index:
+        assert index.scan(library, workers=2) == {"indexed": 2, "unchanged": 0, "removed": 0}
+        assert index.scan(library, workers=2) == {"indexed": 0, "unchanged": 2, "removed": 0}
+
+        (library / "first.nes").write_bytes(rom(program_banks=2))
+        os.utime(library / "first.nes", ns=(0, 0))
+        (library / "nested" / "second.nes").unlink()
+        assert index.scan(library, workers=2) == {"indexed": 1, "unchanged": 0, "removed": 1}
+
+    # the cache persists
+    with RomIndex(tmp_path / "roms.sqlite") as index:
+        assert [row["program_rom_size"] for row in index.roms()] == [0x8000]
+        assert index.get(library / "first.nes")["modified"] == 0
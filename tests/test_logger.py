@@ -0,0 +1,55 @@
+import logging
+import logger as logging_setup
+from logger import ColoredFormatter, get_logger, start_async, stop_async
+
+
+def record(level: int, msg: str, *args) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+
+def test_one_handler_per_logger():
+    log = get_logger("test_logger.handlers")
+    get_logger("test_logger.handlers", "DEBUG")
+    log = get_logger("test_logger.handlers", "WARNING")
+
+    assert len(log.handlers) == 1
+    assert log.level == logging.WARNING
+    # shared by every logger
+    assert get_logger("test_logger.other").handlers == log.handlers
+
+
+def test_colored_format():
+    formatter = ColoredFormatter(fmt="%(levelname)s | %(message)s")
+    warning = record(logging.WARNING, "at $%04X", 0x0600)
+
+    assert formatter.format(warning) == "\033[33mWARNING\033[0m | \033[33mat $0600\033[0m"
+    # the record isn't changed for other handlers
+    assert warning.levelname == "WARNING" and warning.msg == "at $%04X"
+
+    assert formatter.format(record(5, "custom")) == "\033[37mLevel 5\033[0m | \033[37mcustom\033[0m"
+
+
+def test_async_sink():
+    log = get_logger("test_logger.async", "DEBUG")
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record: logging.LogRecord) -> None:
+            records.append(record.getMessage())
+
+    console = logging_setup.get_console_handler()
+    collect = Collect()
+    start_async()
+    try:
+        assert log.handlers == [logging_setup.queue_handler]
+        logging_setup.listener.handlers = (console, collect)
+
+        value = [1]
+        log.debug("value %s", value)
+        # merged before it's queued
+        value.append(2)
+    finally:
+        stop_async()
+
+    assert records == ["value [1]"]
+    assert log.handlers == [console]
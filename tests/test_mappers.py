@@ -0,0 +1,235 @@
+import pytest
+
+# the cartridge loader types its paths with pydantic
+pytest.importorskip("pydantic")
+
+from cartridge import Cartridge  # noqa: E402
+from constants import Mirroring, StopReason  # noqa: E402
+from mappers import CNROM, MMC1, MMC3, Mapper, UxROM, create_mapper  # noqa: E402
+from memory import Memory  # noqa: E402
+
+
+def load(tmp_path, mapper: int, program_banks: int, character_banks: int, flags_6: int = 0x00) -> Mapper:
+    """A ROM where every byte of each 8KiB PRG bank and 1KiB CHR bank is its bank number"""
+    header = b"NES\x1a" + bytes([program_banks, character_banks, (mapper & 0x0F) << 4 | flags_6, mapper & 0xF0]) + bytes(8)
+    program_rom = b"".join(bytes([bank]) * 0x2000 for bank in range(program_banks * 2))
+    character_rom = b"".join(bytes([bank]) * 0x0400 for bank in range(character_banks * 8))
+
+    path = tmp_path / "test.nes"
+    path.write_bytes(header + program_rom + character_rom)
+
+    return create_mapper(Cartridge(path), Memory(has_bus=True))
+
+
+def test_nrom(tmp_path):
+    mapper = load(tmp_path, 0, program_banks=1, character_banks=1, flags_6=0x01)
+
+    assert type(mapper) is Mapper
+    assert mapper.mirroring == Mirroring.VERTICAL
+    # 16KiB mirrored into both banks
+    assert [mapper.memory.read(addr) for addr in (0x8000, 0xA000, 0xC000, 0xE000)] == [0, 1, 0, 1]
+    assert mapper.read_character(0x1C00) == 7
+
+
+def test_uxrom(tmp_path):
+    mapper = load(tmp_path, 2, program_banks=4, character_banks=0)
+    memory = mapper.memory
+
+    assert type(mapper) is UxROM
+    assert memory.read(0x8000) == 0 and memory.read(0xC000) == 6
+
+    memory.write(0x8000, 2)
+    assert memory.read(0x8000) == 4 and memory.read(0xA000) == 5
+    assert memory.read(0xC000) == 6
+
+    # no CHR ROM, so CHR RAM
+    mapper.write_character(0x0010, 0x99)
+    assert mapper.read_character(0x0010) == 0x99
+
+
+def test_cnrom(tmp_path):
+    mapper = load(tmp_path, 3, program_banks=2, character_banks=4)
+
+    assert type(mapper) is CNROM
+    mapper.memory.write(0x8000, 3)
+    assert mapper.read_character(0x0000) == 24
+    assert mapper.read_character(0x1C00) == 31
+
+
+def write_mmc1(mapper: Mapper, addr: int, value: int) -> None:
+    for bit in range(5):
+        mapper.memory.write(addr, (value >> bit) & 0x01)
+
+
+def test_mmc1(tmp_path):
+    mapper = load(tmp_path, 1, program_banks=8, character_banks=2)
+    memory = mapper.memory
+
+    assert type(mapper) is MMC1
+    # the last bank is fixed at $C000
+    assert memory.read(0xC000) == 14
+
+    write_mmc1(mapper, 0xE000, 3)
+    assert memory.read(0x8000) == 6 and memory.read(0xA000) == 7
+
+    # vertical mirroring, 32KiB PRG banks, 4KiB CHR banks
+    write_mmc1(mapper, 0x8000, 0b10010)
+    assert mapper.mirroring == Mirroring.VERTICAL
+    assert memory.read(0x8000) == 4 and memory.read(0xC000) == 6
+
+    write_mmc1(mapper, 0xC000, 3)
+    assert mapper.read_character(0x1000) == 12
+
+    # bit 7 resets the shift register part way through a write
+    memory.write(0xE000, 0x01)
+    memory.write(0xE000, 0x80)
+    write_mmc1(mapper, 0xE000, 0)
+    # and puts it back into fixing the last bank at $C000
+    assert memory.read(0x8000) == 0 and memory.read(0xC000) == 14
+
+
+def test_mmc3(tmp_path):
+    mapper = load(tmp_path, 4, program_banks=4, character_banks=4)
+    memory = mapper.memory
+
+    assert type(mapper) is MMC3
+    assert [memory.read(addr) for addr in (0x8000, 0xA000, 0xC000, 0xE000)] == [0, 1, 6, 7]
+
+    # R6 and R7
+    memory.write(0x8000, 6)
+    memory.write(0x8001, 3)
+    memory.write(0x8000, 7)
+    memory.write(0x8001, 4)
+    assert [memory.read(addr) for addr in (0x8000, 0xA000, 0xC000, 0xE000)] == [3, 4, 6, 7]
+
+    # PRG mode 1 swaps $8000 and $C000
+    memory.write(0x8000, 0x46)
+    assert [memory.read(addr) for addr in (0x8000, 0xA000, 0xC000, 0xE000)] == [6, 4, 3, 7]
+
+    # R2 with CHR A12 inversion lands at $0000
+    memory.write(0x8000, 0x82)
+    memory.write(0x8001, 9)
+    assert mapper.read_character(0x0000) == 9
+
+    memory.write(0xA000, 0x01)
+    assert mapper.mirroring == Mirroring.HORIZONTAL
+
+
+def test_mmc3_irq(tmp_path):
+    mapper = load(tmp_path, 4, program_banks=2, character_banks=1)
+    memory = mapper.memory
+
+    memory.write(0xC000, 2)
+    memory.write(0xC001, 0)
+    memory.write(0xE001, 0)
+
+    mapper.scanline()
+    mapper.scanline()
+    assert not mapper.irq
+    mapper.scanline()
+    assert mapper.irq
+
+    memory.write(0xE000, 0)
+    assert not mapper.irq
+
+
+def test_mmc3_irq_runs_the_handler(tmp_path):
+    from console import Console
+
+    # fmt: off
+    code = bytes([
+        0xA9, 0x08,        # LDA #$08
+        0x8D, 0x01, 0x20,  # STA $2001 - show the background
+        0xA9, 0x10,        # LDA #$10
+        0x8D, 0x00, 0xC0,  # STA $C000 - an IRQ every 17 scanlines
+        0x8D, 0x01, 0xC0,  # STA $C001
+        0x8D, 0x01, 0xE0,  # STA $E001
+        0x58,              # CLI
+        0xA5, 0x10,        # LDA $10
+        0xF0, 0xFC,        # BEQ -4 - wait for the IRQ
+        0x00,              # BRK
+        0x8D, 0x00, 0xE0,  # IRQ: STA $E000 - acknowledge
+        0xE6, 0x10,        # INC $10
+        0x40,              # RTI
+    ])
+    # fmt: on
+    # the last 8KiB bank is fixed at $E000
+    program_rom = bytearray(0x8000)
+    program_rom[0x6000 : 0x6000 + len(code)] = code
+    # the NMI, reset and IRQ vectors
+    program_rom[0x7FFA:0x8000] = bytes([0x00, 0xE0, 0x00, 0xE0, 0x16, 0xE0])
+
+    path = tmp_path / "irq.nes"
+    path.write_bytes(b"NES\x1a" + bytes([0x02, 0x01, 0x40, 0x00]) + bytes(8) + bytes(program_rom) + bytes(0x2000))
+
+    # the end of the 17th scanline, a cycle is 3 dots
+    scanline = (16 * 341 + 256) // 3
+    for options in ({}, {"translate": True, "fast_forward": True}):
+        console = Console(rom_path=path, **options)
+        console.load_cartridge()
+
+        assert console.run_frame() == StopReason.BRK
+        assert console.memory.read(0x10) == 1
+        assert not console.mapper.irq
+        # taken on its scanline
+        assert scanline < console.cpu.cycles < scanline + 40
+
+
+def test_unsupported_mapper(tmp_path):
+    with pytest.raises(ValueError):
+        load(tmp_path, 5, program_banks=1, character_banks=1)
+
+
+def test_fork_switches_its_own_banks(tmp_path):
+    mapper = load(tmp_path, 2, program_banks=4, character_banks=0)
+    memory = mapper.memory
+    fork = memory.fork()
+
+    # a bank switch through the fork only remaps the fork
+    fork.write(0x8000, 1)
+    assert fork.read(0x8000) == 2
+    assert memory.read(0x8000) == 0
+
+    # and one through the parent only the parent
+    memory.write(0x8000, 3)
+    assert memory.read(0x8000) == 6
+    assert fork.read(0x8000) == 2
+    assert fork.read(0xC000) == memory.read(0xC000) == 6
+
+
+def test_fork_mmc3_registers(tmp_path):
+    mapper = load(tmp_path, 4, program_banks=4, character_banks=4)
+    memory = mapper.memory
+    fork = memory.fork()
+
+    fork.write(0x8000, 6)
+    fork.write(0x8001, 3)
+    assert fork.read(0x8000) == 3
+    assert memory.read(0x8000) == 0
+    assert mapper.registers[6] == 0
+
+
+def test_snapshot_restores_banks(tmp_path):
+    mapper = load(tmp_path, 4, program_banks=4, character_banks=4)
+    memory = mapper.memory
+
+    memory.write(0x8000, 6)
+    memory.write(0x8001, 3)
+    memory.write(0xA000, 0x01)
+    memory.write(0xC000, 0x20)
+    snapshot = memory.snapshot()
+
+    memory.write(0x8000, 0x46)
+    memory.write(0x8001, 5)
+    memory.write(0xA000, 0x00)
+    assert memory.read(0xC000) == 5
+
+    memory.restore(snapshot)
+    assert [memory.read(addr) for addr in (0x8000, 0xA000, 0xC000, 0xE000)] == [3, 1, 6, 7]
+    assert mapper.mirroring == Mirroring.HORIZONTAL
+    assert mapper.irq_latch == 0x20 and mapper.irq_reload is False
+
+    # a snapshot of a cartridge with another mapper doesn't fit
+    other = load(tmp_path, 2, program_banks=4, character_banks=0)
+    with pytest.raises(ValueError):
+        other.memory.restore(snapshot)
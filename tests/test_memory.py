@@ -0,0 +1,315 @@
+import pytest
+from memory import MEMORY_SIZE, Memory, page_views
+
+
+def test_flat_memory_covers_address_space():
+    memory = Memory()
+    assert len(memory.data) == MEMORY_SIZE == 0x10000
+
+    memory.write(0xFFFF, 0x12)
+    assert memory.read(0xFFFF) == 0x12
+
+
+def test_view_is_zero_copy():
+    memory = Memory()
+    view = memory.view(0x0200, 0x0600)
+    assert len(view) == 0x400
+
+    memory.write(0x0200, 0x05)
+    assert view[0] == 0x05
+
+    view[1] = 0x07
+    assert memory.read(0x0201) == 0x07
+
+
+def test_load():
+    memory = Memory()
+    memory.load(0x8000, 0x8003, [0xA9, 0x05, 0x00])
+    assert list(memory.slice(0x7FFF, 0x8004)) == [0x00, 0xA9, 0x05, 0x00, 0x00]
+    assert len(memory.data) == MEMORY_SIZE
+
+
+def test_load_not_enough_data():
+    memory = Memory()
+    with pytest.raises(ValueError):
+        memory.load(0x8000, 0x8004, [0xA9, 0x05, 0x00])
+
+
+def test_bus_ram_is_mirrored():
+    memory = Memory(has_bus=True)
+    memory.write(0x0012, 0x34)
+
+    for mirror in (0x0812, 0x1012, 0x1812):
+        assert memory.read(mirror) == 0x34
+
+    memory.write(0x1FFF, 0x56)
+    assert memory.read(0x07FF) == 0x56
+
+
+def test_bus_unmapped_raises():
+    memory = Memory(has_bus=True)
+
+    with pytest.raises(ValueError):
+        memory.read(0x2002)
+
+    with pytest.raises(ValueError):
+        memory.write(0x5000, 0x01)
+
+
+def test_bus_read_only_buffer():
+    memory = Memory(has_bus=True)
+    rom = bytes(range(0x100)) * 0x40
+    memory.map_buffer(0x8000, 0x10000, rom, writable=False)
+
+    assert memory.read(0x8010) == 0x10
+    # 16KiB mirrored into the upper bank
+    assert memory.read(0xC010) == 0x10
+
+    memory.write(0x8010, 0xFF)
+    assert memory.read(0x8010) == 0x10
+
+
+def test_bus_handlers():
+    memory = Memory(has_bus=True)
+    registers = bytearray(8)
+
+    def read(addr: int) -> int:
+        return registers[addr & 0x07]
+
+    def write(addr: int, data: int) -> None:
+        registers[addr & 0x07] = data
+
+    memory.map_handlers(0x2000, 0x4000, read, write)
+    memory.write(0x3FFE, 0x99)
+
+    assert registers[6] == 0x99
+    assert memory.read(0x2006) == 0x99
+
+
+def test_bus_map_buffer_not_page_aligned():
+    memory = Memory(has_bus=True)
+
+    with pytest.raises(ValueError):
+        memory.map_buffer(0x6000, 0x8000, bytearray(0x10))
+
+
+def test_snapshot_round_trip():
+    memory = Memory()
+    memory.load(0x0600, 0x0604, [0xA9, 0x01, 0x00, 0xFF])
+    snapshot = memory.snapshot()
+
+    memory.write(0x0600, 0x00)
+    memory.write(0xFFFF, 0x42)
+    memory.restore(snapshot)
+
+    assert memory.read(0x0600) == 0xA9
+    assert memory.read(0xFFFF) == 0x00
+    assert memory.snapshot() == snapshot
+
+
+def test_snapshot_restore_is_in_place():
+    memory = Memory(has_bus=True)
+    memory.write(0x0010, 0x99)
+    snapshot = memory.snapshot()
+
+    memory.write(0x0010, 0x00)
+    view = memory.read_pages[0]
+    memory.restore(snapshot)
+
+    # the page table still points at the same buffer
+    assert view[0x10] == 0x99
+    assert memory.read(0x0810) == 0x99
+
+
+def test_snapshot_invalid():
+    memory = Memory()
+    snapshot = memory.snapshot()
+
+    with pytest.raises(ValueError):
+        memory.restore(b"XXXX" + snapshot[4:])
+
+    with pytest.raises(ValueError):
+        memory.restore(snapshot[:4] + bytes([0xFF]) + snapshot[5:])
+
+    with pytest.raises(ValueError):
+        memory.restore(snapshot[:-1])
+
+    # flat memory can't be restored onto the bus
+    with pytest.raises(ValueError):
+        Memory(has_bus=True).restore(snapshot)
+
+
+def test_fork_flat():
+    memory = Memory()
+    memory.write(0x0600, 0x01)
+
+    fork = memory.fork()
+    fork.write(0x0600, 0x02)
+    memory.write(0x0601, 0x03)
+
+    assert memory.read(0x0600) == 0x01
+    assert fork.read(0x0600) == 0x02
+    assert fork.read(0x0601) == 0x00
+
+
+def test_fork_bus_is_copy_on_write():
+    memory = Memory(has_bus=True)
+    rom = bytes(0x4000)
+    memory.map_buffer(0x8000, 0x10000, rom, writable=False)
+    memory.write(0x0010, 0x01)
+
+    fork = memory.fork()
+    # RAM and ROM are shared until written
+    assert fork.cpu_vram is memory.cpu_vram
+    assert fork.read_pages[0x80] is memory.read_pages[0x80]
+
+    fork.write(0x0810, 0x02)
+    assert fork.cpu_vram is not memory.cpu_vram
+    assert fork.read(0x0010) == 0x02
+    assert memory.read(0x0010) == 0x01
+
+    # the parent copies on its first write too, so another fork isn't affected
+    other = memory.fork()
+    memory.write(0x0010, 0x03)
+    assert other.read(0x0010) == 0x01
+    assert memory.read(0x1810) == 0x03
+
+
+def test_fork_bus_restore():
+    memory = Memory(has_bus=True)
+    memory.write(0x0010, 0x01)
+    snapshot = memory.snapshot()
+    memory.write(0x0010, 0x02)
+
+    fork = memory.fork()
+    fork.restore(snapshot)
+
+    assert fork.read(0x0010) == 0x01
+    assert memory.read(0x0010) == 0x02
+
+
+def test_map_pages_rebinds_views():
+    memory = Memory(has_bus=True)
+    rom = bytes(range(0x100)) * 0x80
+    pages = page_views(rom)
+    writes = []
+
+    memory.map_pages(0x8000, pages[0x40:0x80], write=lambda addr, data: writes.append((addr, data)))
+    assert memory.read_pages[0x80] is pages[0x40]
+    assert memory.read(0x8001) == 0x01
+
+    # writes go to the handler, not the ROM
+    memory.write(0x8001, 0xFF)
+    assert writes == [(0x8001, 0xFF)]
+    assert memory.read(0x8001) == 0x01
+
+    with pytest.raises(ValueError):
+        page_views(bytes(0x10))
+
+
+def test_watch_flat():
+    memory = Memory()
+    watch = memory.watch(0x0200, 0x0600)
+
+    memory.write(0x0100, 0x01)
+    assert not watch.changed
+
+    memory.write(0x0205, 0x01)
+    memory.write_u16(0x05FF, 0x0102)
+    assert watch.changed
+    assert watch.cells() == [0x05, 0x3FF]
+
+    watch.clear()
+    assert not watch.changed
+    assert watch.cells() == []
+
+    memory.load(0x01FE, 0x0204, [0x01] * 6)
+    assert watch.cells() == [0, 1, 2, 3]
+
+    memory.unwatch(watch)
+    watch.clear()
+    memory.write(0x0205, 0x02)
+    assert not watch.changed
+
+
+def test_watch_granularity():
+    memory = Memory()
+    # a flag per 16 byte tile
+    watch = memory.watch(0x0000, 0x2000, granularity=16)
+
+    memory.write(0x0011, 0x01)
+    memory.write(0x001F, 0x01)
+    memory.write(0x1FF0, 0x01)
+    assert watch.cells() == [0x01, 0x1FF]
+
+    with pytest.raises(ValueError):
+        memory.watch(0x0000, 0x2000, granularity=3)
+    with pytest.raises(ValueError):
+        memory.watch(0x0600, 0x0200)
+
+
+def test_watch_bank_switch():
+    memory = Memory(has_bus=True)
+    banks = page_views(bytes(0x0400))
+    memory.map_pages(0x8000, banks[:2])
+    watch = memory.watch(0x8000, 0x8400, 0x0100)
+
+    # switching a bank in counts as writing the pages it covers
+    memory.map_pages(0x8100, banks[2:3])
+    assert watch.cells() == [0x01]
+
+    watch.clear()
+    memory.map_buffer(0x8000, 0x8400, bytearray(0x0400))
+    assert watch.cells() == [0x00, 0x01, 0x02, 0x03]
+
+
+def test_watch_bus():
+    memory = Memory(has_bus=True)
+    watch = memory.watch(0x0010, 0x0020)
+
+    # the RAM mirrors are separate addresses
+    memory.write(0x0015, 0x01)
+    memory.write(0x0815, 0x02)
+    memory.write(0x0030, 0x03)
+    assert watch.cells() == [0x05]
+    assert memory.read(0x0015) == 0x02
+    assert memory.read(0x0030) == 0x03
+
+    # the watch survives the page being mapped again and forks don't share it
+    memory.map_buffer(0x0000, 0x0800, bytearray(0x0800))
+    fork = memory.fork()
+    watch.clear()
+    fork.write(0x0011, 0x01)
+    assert not watch.changed
+
+    memory.write(0x0011, 0x04)
+    assert watch.cells() == [0x01]
+    assert memory.read(0x0011) == 0x04
+    assert fork.read(0x0011) == 0x01
+
+    # restoring rewrites everything
+    watch.clear()
+    memory.restore(fork.snapshot())
+    assert watch.cells() == list(range(0x10))
+
+    memory.unwatch(watch)
+    assert memory.write_pages[0x00] is not None
+
+
+def test_restore_only_copies_shared_buffers():
+    memory = Memory(has_bus=True)
+    memory.write(0x0010, 0x01)
+    snapshot = memory.snapshot()
+    watch = memory.watch(0x0000, 0x0100)
+
+    # watched, but not shared - restored in place
+    vram = memory.cpu_vram
+    memory.restore(snapshot)
+    assert memory.cpu_vram is vram
+    assert watch.changed
+
+    # shared with a fork - copied before it's written
+    fork = memory.fork()
+    memory.restore(snapshot)
+    assert memory.cpu_vram is not fork.cpu_vram
+    assert not memory.is_shared(0x0000)
@@ -0,0 +1,91 @@
+import copy
+import importlib.util
+import pickle
+import pytest
+from constants import AddressingMode
+from cpu import CPU
+from opcodes import CYCLES, INSTRUCTIONS, LENGTHS, MODES, OPCODES, Opcode, generate_table, source_hash
+
+
+def test_table_is_shared():
+    first, second = CPU(), CPU()
+    assert first.opcodes is second.opcodes is OPCODES
+    assert first.instructions is second.instructions is INSTRUCTIONS
+
+
+def test_table_is_read_only():
+    with pytest.raises(TypeError):
+        OPCODES[0x02] = OPCODES[0x00]
+
+
+def test_opcode_has_slots():
+    with pytest.raises(AttributeError):
+        OPCODES[0xA9].__dict__
+
+
+def test_instructions():
+    assert len(INSTRUCTIONS) == 0x100
+    assert INSTRUCTIONS[0xA9] is OPCODES[0xA9]
+    assert INSTRUCTIONS[0x02] is None
+
+
+def test_generated_table(tmp_path):
+    file_path = tmp_path / "opcode_table.py"
+    generate_table(OPCODES, file_path)
+
+    spec = importlib.util.spec_from_file_location("opcode_table", file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    assert module.SOURCE_HASH == source_hash()
+
+    parsed = Opcode.load_opcodes()
+    assert len(module.ROWS) == len(parsed)
+    for code, mnemonic, length, cycles, mode, page_penalty, branch_penalty in module.ROWS:
+        opcode = parsed[code]
+        assert (mnemonic, length, cycles, AddressingMode[mode], page_penalty, branch_penalty) == (
+            opcode.mnemonic,
+            opcode.length,
+            opcode.cycles,
+            opcode.addressing_mode,
+            opcode.page_penalty,
+            opcode.branch_penalty,
+        )
+
+
+def test_opcode_is_immutable():
+    opcode = OPCODES[0xA9]
+
+    with pytest.raises(AttributeError):
+        opcode.cycles = 3
+    with pytest.raises(AttributeError):
+        del opcode.length
+
+    # copies are rebuilt rather than having their slots set
+    copied = pickle.loads(pickle.dumps(opcode))
+    assert (copied.code, copied.mnemonic, copied.cycles, copied.resolver) == (opcode.code, opcode.mnemonic, opcode.cycles, opcode.resolver)
+    assert copy.copy(opcode).addressing_mode == AddressingMode.IMMEDIATE
+
+
+def test_running_leaves_the_table_unchanged():
+    fields = [(opcode.code, opcode.mnemonic, opcode.length, opcode.cycles, opcode.addressing_mode, opcode.resolver) for opcode in OPCODES.values()]
+
+    # LDX #$05, DEX, STX $10, BNE -5, BRK - on two CPUs sharing the table
+    for cpu in (CPU(), CPU()):
+        cpu.pre_load([0xA2, 0x05, 0xCA, 0x86, 0x10, 0xD0, 0xFB, 0x00])
+        cpu.run_for(100)
+
+    assert [(opcode.code, opcode.mnemonic, opcode.length, opcode.cycles, opcode.addressing_mode, opcode.resolver) for opcode in OPCODES.values()] == fields
+
+
+def test_parallel_arrays():
+    assert LENGTHS[0xAD] == 3 and CYCLES[0xAD] == 4 and MODES[0xAD] == AddressingMode.ABSOLUTE
+    assert LENGTHS[0x02] == 1 and CYCLES[0x02] == 0 and MODES[0x02] is None
+
+
+def test_string():
+    assert OPCODES[0xA9].string(0x05) == "LDA #$05"
+    assert OPCODES[0xBD].string(0x1234) == "LDA $1234,X"
+    # a branch is shown with the address it goes to
+    assert OPCODES[0xD0].string(0x0602) == "BNE $0602"
+    assert OPCODES[0xEA].string() == "NOP"
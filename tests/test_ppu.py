@@ -0,0 +1,206 @@
+import numpy as np
+import pytest
+from ppu import CTRL_NMI, DOTS_PER_FRAME, HEIGHT, MASK_BACKGROUND, MASK_BACKGROUND_LEFT, MASK_SPRITES, MASK_SPRITES_LEFT, STATUS_SPRITE_ZERO, STATUS_VBLANK, decode_tiles
+
+# a tile with a diagonal of colour 1, a column of colour 2 and its top row colour 3
+TILE = bytes([0xFF, 0x40, 0x20, 0x10, 0x08, 0x04, 0x02, 0x01]) + bytes([0x81, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01])
+
+
+def load(tmp_path, character_rom: bytes, synchronised: bool = False):
+    # the cartridge loader types its paths with pydantic
+    pytest.importorskip("pydantic")
+    from cartridge import Cartridge
+    from cpu import CPU
+    from mappers import create_mapper
+    from memory import Memory
+    from ppu import PPU
+
+    path = tmp_path / "test.nes"
+    path.write_bytes(b"NES\x1a" + bytes([0x01, len(character_rom) // 0x2000]) + bytes(10) + bytes(0x4000) + character_rom)
+
+    memory = Memory(has_bus=True)
+    mapper = create_mapper(Cartridge(path), memory)
+    return PPU(mapper, memory, CPU(memory=memory) if synchronised else None)
+
+
+def test_decode_tiles():
+    tiles = decode_tiles(TILE * 2)
+
+    assert tiles.shape == (2, 8, 8)
+    assert list(tiles[0, 0]) == [3, 1, 1, 1, 1, 1, 1, 3]
+    assert list(tiles[0, 1]) == [0, 1, 0, 0, 0, 0, 0, 2]
+    assert list(tiles[1, 7]) == [0, 0, 0, 0, 0, 0, 0, 3]
+
+
+def write_vram(ppu, addr: int, data: bytes) -> None:
+    ppu.write_register(0x2006, addr >> 8)
+    ppu.write_register(0x2006, addr & 0xFF)
+    for value in data:
+        ppu.write_register(0x2007, value)
+
+
+def scroll(ppu, x: int, y: int) -> None:
+    # the nametable select is the low bits of PPUCTRL
+    ppu.write_register(0x2000, 0x00)
+    ppu.write_register(0x2005, x)
+    ppu.write_register(0x2005, y)
+
+
+def test_registers(tmp_path):
+    ppu = load(tmp_path, bytes(0x2000))
+
+    write_vram(ppu, 0x2000, b"\x11\x22")
+    # nametable reads are buffered
+    write_vram(ppu, 0x2000, b"")
+    assert [ppu.read_register(0x2007) for _ in range(3)] == [0x00, 0x11, 0x22]
+
+    # $3F10 mirrors $3F00
+    write_vram(ppu, 0x3F10, b"\x0F")
+    write_vram(ppu, 0x3F00, b"")
+    assert ppu.read_register(0x2007) == 0x0F
+
+    ppu.start_vblank()
+    assert ppu.read_register(0x2002) & STATUS_VBLANK
+    assert not ppu.read_register(0x2002) & STATUS_VBLANK
+
+
+def test_render_background(tmp_path):
+    ppu = load(tmp_path, bytes(0x10) + TILE + bytes(0x2000 - 0x20))
+
+    # tile 1 at the top left, with palette 1 from the attribute table
+    write_vram(ppu, 0x2000, b"\x01")
+    write_vram(ppu, 0x23C0, b"\x01")
+    write_vram(ppu, 0x3F00, bytes(range(0x20, 0x30)))
+    scroll(ppu, 0, 0)
+    ppu.write_register(0x2001, MASK_BACKGROUND | MASK_BACKGROUND_LEFT)
+
+    frame = ppu.render_frame()
+
+    assert frame.shape == (240, 256)
+    # the backdrop, then colours 1-3 of palette 1
+    assert list(frame[0, :8]) == [0x27, 0x25, 0x25, 0x25, 0x25, 0x25, 0x25, 0x27]
+    assert list(frame[1, :8]) == [0x20, 0x25, 0x20, 0x20, 0x20, 0x20, 0x20, 0x26]
+    assert (frame[8:] == 0x20).all()
+
+    # scrolled 4 pixels left
+    scroll(ppu, 4, 0)
+    frame = ppu.render_frame()
+    assert list(frame[0, :4]) == [0x25, 0x25, 0x25, 0x27]
+
+
+def test_render_sprites(tmp_path):
+    ppu = load(tmp_path, bytes(0x10) + TILE + bytes(0x2000 - 0x20))
+
+    write_vram(ppu, 0x2000, b"\x01")
+    write_vram(ppu, 0x3F00, bytes(range(0x20, 0x40)))
+    scroll(ppu, 0, 0)
+    ppu.write_register(0x2001, MASK_BACKGROUND | MASK_BACKGROUND_LEFT | MASK_SPRITES | MASK_SPRITES_LEFT)
+
+    # sprite 0 over the background tile, flipped horizontally with palette 2
+    ppu.oam[:4] = bytes([0xFF, 0x01, 0x42, 0x00])
+    ppu.oam[4:8] = bytes([0x0F, 0x01, 0x00, 0x80])
+    ppu.oam[8:] = bytes([0xFF]) * 248
+    frame = ppu.render_frame()
+    assert not ppu.status & STATUS_SPRITE_ZERO
+
+    ppu.oam[0] = 0x00
+    frame = ppu.render_frame()
+
+    assert ppu.status & STATUS_SPRITE_ZERO
+    assert list(frame[1, :8]) == [0x3B, 0x39, 0x39, 0x39, 0x39, 0x39, 0x39, 0x3B]
+    # the sprite is drawn over the background where it's opaque, and $3F10 (0x30) is the backdrop
+    assert list(frame[2, :8]) == [0x3A, 0x30, 0x21, 0x30, 0x30, 0x30, 0x39, 0x22]
+    assert list(frame[0x10, 0x80:0x88]) == [0x33, 0x31, 0x31, 0x31, 0x31, 0x31, 0x31, 0x33]
+
+
+def test_chr_ram_tiles_are_decoded_again(tmp_path):
+    ppu = load(tmp_path, b"")
+    assert not ppu.tiles.any()
+
+    write_vram(ppu, 0x0010, TILE)
+    ppu.update_tiles()
+
+    assert np.array_equal(ppu.tiles[1], decode_tiles(TILE)[0])
+
+
+def test_catch_up_on_register_access(tmp_path):
+    ppu = load(tmp_path, bytes(0x2000), synchronised=True)
+    cpu = ppu.cpu
+
+    # vblank starts on dot 1 of scanline 241, a cycle is 3 dots
+    vblank = ppu.next_deadline()
+    assert vblank == (241 * 341 + 1) // 3 + 1
+
+    cpu.cycles = vblank - 1
+    assert not ppu.read_register(0x2002) & STATUS_VBLANK
+    assert ppu.frame == 0
+
+    cpu.cycles = vblank
+    assert ppu.read_register(0x2002) & STATUS_VBLANK
+    assert ppu.frame == 1
+    # the next vblank is a frame on
+    assert ppu.next_deadline() == (DOTS_PER_FRAME + 241 * 341 + 1) // 3 + 1
+
+    # frames the CPU ran through without looking are counted but not rendered
+    cpu.cycles += 10 * DOTS_PER_FRAME // 3
+    ppu.catch_up()
+    assert ppu.frame == 11
+
+
+def test_catch_up_only_skips_the_rendering(tmp_path):
+    ppu = load(tmp_path, bytes(0x2000), synchronised=True)
+    cpu = ppu.cpu
+
+    scanlines = []
+    ppu.mapper.scanline = lambda: scanlines.append(ppu.frame)
+    rendered = []
+    background = ppu.background
+    ppu.background = lambda y: rendered.append(ppu.frame) or background(y)
+
+    ppu.write_register(0x2000, CTRL_NMI)
+    ppu.write_register(0x2001, MASK_BACKGROUND)
+
+    # all but the last two frames go unseen
+    cpu.cycles = 10 * DOTS_PER_FRAME // 3
+    ppu.catch_up()
+
+    assert ppu.frame == 10 and ppu.nmi
+    # the mapper counts every scanline of every frame
+    assert scanlines == [frame for frame in range(10) for _ in range(HEIGHT)]
+    assert rendered == [frame for frame in (8, 9) for _ in range(HEIGHT)]
+
+
+def test_catch_up_renders_mid_frame_scroll(tmp_path):
+    ppu = load(tmp_path, bytes(0x10) + TILE + bytes(0x2000 - 0x20), synchronised=True)
+    cpu = ppu.cpu
+
+    # tile 1 at the top left of the first two rows of tiles
+    write_vram(ppu, 0x2000, b"\x01")
+    write_vram(ppu, 0x2020, b"\x01")
+    write_vram(ppu, 0x3F00, bytes(range(0x20, 0x30)))
+    scroll(ppu, 0, 0)
+    ppu.write_register(0x2001, MASK_BACKGROUND | MASK_BACKGROUND_LEFT)
+
+    # scrolled 4 pixels to the right part way through scanline 8 of the second frame, once 0-7 are out
+    cpu.cycles = (DOTS_PER_FRAME + 8 * 341 + 100) // 3
+    scroll(ppu, 4, 0)
+    cpu.cycles += 20 * 341 // 3
+    ppu.read_register(0x2002)
+
+    assert list(ppu.framebuffer[7, :8]) == [0x20, 0x20, 0x20, 0x20, 0x20, 0x20, 0x20, 0x23]
+    assert list(ppu.framebuffer[8, :8]) == [0x21, 0x21, 0x21, 0x23, 0x20, 0x20, 0x20, 0x20]
+
+
+def test_oam_dma_stalls_the_cpu(tmp_path):
+    ppu = load(tmp_path, bytes(0x2000), synchronised=True)
+    cpu = ppu.cpu
+    vblank = ppu.next_deadline()
+
+    ppu.memory.write(0x0200, 0x42)
+    cpu.cycles = 1001
+    ppu.memory.write(0x4014, 0x02)
+
+    assert ppu.oam[0] == 0x42
+    # an extra cycle when the DMA starts on an odd cycle
+    assert ppu.stall == 514
+    assert ppu.next_deadline() == vblank - 514
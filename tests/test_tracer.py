@@ -0,0 +1,112 @@
+import io
+import pytest
+from cpu import CPU, StopReason
+from disassembler import Disassembler
+from memory import Memory
+from tracer import Trace, load, render, write_log
+
+# LDX #$03
+# DEX
+# BNE -3
+# BRK
+PROGRAM = [0xA2, 0x03, 0xCA, 0xD0, 0xFD, 0x00]
+
+
+def test_records_each_instruction():
+    cpu = CPU(program_offset=0x0600, trace=16)
+    cpu.pre_load(PROGRAM)
+    assert cpu.run_for(100) == StopReason.BRK
+
+    records = list(cpu.trace.records())
+    assert len(cpu.trace) == cpu.trace.recorded == 8
+    # the state before each instruction ran
+    assert records[0] == (0x0600, 0xA2, 0x00, 0x00, 0x00, 0x30, 0xFF, 7)
+    assert records[1] == (0x0602, 0xCA, 0x00, 0x03, 0x00, 0x30, 0xFF, 9)
+    assert [record[0] for record in records] == [0x0600, 0x0602, 0x0603, 0x0602, 0x0603, 0x0602, 0x0603, 0x0605]
+    assert records[-1][3] == 0x00
+
+
+def test_ring_keeps_the_last_instructions():
+    # rounded up to 4
+    cpu = CPU(program_offset=0x0600, trace=3)
+    cpu.pre_load(PROGRAM)
+    cpu.run_for(100)
+
+    assert cpu.trace.capacity == 4
+    assert cpu.trace.recorded == 8
+    assert [record[0] for record in cpu.trace.records()] == [0x0603, 0x0602, 0x0603, 0x0605]
+
+    cpu.trace.clear()
+    assert list(cpu.trace.records()) == []
+
+    with pytest.raises(ValueError):
+        Trace(cpu, 0)
+
+
+@pytest.mark.parametrize("batch", [5, 1000])
+def test_translated_blocks_are_recorded(batch):
+    # a loop hot enough to be translated
+    program = [0xA2, 0x10, 0xCA, 0xD0, 0xFD, 0x00]
+    traces = []
+    for translate in (False, True):
+        cpu = CPU(program_offset=0x0600, translate=translate, trace=64)
+        cpu.pre_load(program)
+        while cpu.execute(batch) != StopReason.BRK:
+            pass
+
+        assert cpu.trace.recorded == cpu.executed
+        traces.append(list(cpu.trace.records()))
+
+    assert cpu.translator.blocks
+    assert traces[1] == traces[0]
+
+
+def test_translated_block_records_the_access_that_raised():
+    # LDX #$10, LDA $5000,X, DEX, BNE -6, BRK - the read of $5001 raises, by then the loop is translated
+    program = [0xA2, 0x10, 0xBD, 0x00, 0x50, 0xCA, 0xD0, 0xFA, 0x00]
+    memory = Memory(has_bus=True)
+    # somewhere for the reset vector
+    memory.map_buffer(0x8000, 0x10000, bytearray(0x8000))
+    cpu = CPU(program_offset=0x0600, memory=memory, translate=True, trace=64)
+    cpu.pre_load(program)
+
+    def read(addr: int) -> int:
+        if addr == 0x5001:
+            raise ValueError("not mapped")
+        return 0
+
+    cpu.memory.map_handlers(0x5000, 0x5100, read, lambda addr, data: None)
+
+    with pytest.raises(ValueError):
+        cpu.execute(1000)
+
+    assert cpu.translator.blocks
+    last = list(cpu.trace.records())[-1]
+    assert last[:2] == (0x0602, 0xBD) and last[3] == 0x01
+
+
+def test_dump_and_render(tmp_path):
+    cpu = CPU(program_offset=0x0600, trace=16)
+    cpu.pre_load(PROGRAM)
+    cpu.run_for(100)
+
+    path = tmp_path / "trace.bin"
+    cpu.trace.dump(path)
+    recorded, records = load(path)
+
+    assert recorded == 8
+    assert records == list(cpu.trace.records())
+
+    assert render(records[0]) == "0600  A2        LDX #$nn                        A:00 X:00 Y:00 P:30 SP:FF CYC:7"
+
+    output = io.StringIO()
+    write_log(records[:3], Disassembler(bytes(PROGRAM), 0x0600), output)
+    assert output.getvalue().splitlines() == [
+        "0600  A2 03     LDX #$03                        A:00 X:00 Y:00 P:30 SP:FF CYC:7",
+        "0602  CA        DEX                             A:00 X:03 Y:00 P:30 SP:FF CYC:9",
+        "0603  D0 FD     BNE $0602                       A:00 X:02 Y:00 P:30 SP:FF CYC:11",
+    ]
+
+    path.write_bytes(b"nope" + bytes(12))
+    with pytest.raises(ValueError):
+        load(path)
@@ -0,0 +1,187 @@
+import random
+import pytest
+import translator
+from constants import StopReason
+from cpu import CPU
+from memory import PAGE_SIZE, Memory, page_views
+
+# LDX #$08, DEX, NOP, BNE -4 (back to DEX), BRK
+DELAY_LOOP = [0xA2, 0x08, 0xCA, 0xEA, 0xD0, 0xFC, 0x00]
+
+
+def state(cpu: CPU) -> tuple:
+    return cpu.register_a, cpu.register_x, cpu.register_y, cpu.status, cpu.stack_pointer, cpu.program_counter, cpu.cycles, cpu.executed, bytes(cpu.memory.data)
+
+
+def run_both(program: list, batches: list, program_offset: int = 0x0600, **kwargs) -> tuple:
+    results = []
+    for translate in (False, True):
+        cpu = CPU(program_offset=program_offset, translate=translate)
+        cpu.pre_load(program)
+
+        reasons = [cpu.execute(batch, **kwargs) for batch in batches]
+        results.append((reasons, state(cpu)))
+
+    return results[0], results[1]
+
+
+@pytest.fixture(autouse=True)
+def translate_immediately(monkeypatch):
+    monkeypatch.setattr(translator, "HOT_THRESHOLD", 1)
+
+
+def test_translator_is_opt_in():
+    assert CPU().translator is None
+    assert CPU(translate=True).translator is not None
+
+
+def test_delay_loop():
+    interpreted, translated = run_both(DELAY_LOOP, [1000])
+    assert interpreted == translated
+    assert translated[0] == [StopReason.BRK]
+
+    cpu = CPU(program_offset=0x0600, translate=True)
+    cpu.pre_load(DELAY_LOOP)
+    cpu.execute(1000)
+
+    # the loop body is a single block that branches back to its own start
+    assert cpu.translator.blocks[0x0602].length == 3
+    assert "while True" in cpu.translator.blocks[0x0602].source
+
+
+@pytest.mark.parametrize("batch", [1, 2, 4, 5, 7])
+def test_delay_loop_batches(batch):
+    interpreted, translated = run_both(DELAY_LOOP, [batch] * 10)
+    assert interpreted == translated
+
+
+def test_until_pc_inside_block():
+    interpreted, translated = run_both(DELAY_LOOP, [1000], until_pc=0x0603)
+    assert interpreted == translated
+    assert translated[0] == [StopReason.PROGRAM_COUNTER]
+
+
+@pytest.mark.parametrize("until_cycles", [10, 20, 31, 40])
+def test_until_cycles(until_cycles):
+    interpreted, translated = run_both(DELAY_LOOP, [1000], until_cycles=until_cycles)
+    assert interpreted == translated
+    assert translated[0] == [StopReason.CYCLE_BUDGET]
+
+
+def test_self_modifying_code():
+    # the loop rewrites the operand of its own LDA #$00 with the loop counter, then adds it into $10
+    program = [
+        0xA2, 0x05,        # LDX #$05
+        0xA9, 0x00,        # LDA #$00    <- $0603 is rewritten
+        0x18,              # CLC
+        0x65, 0x10,        # ADC $10
+        0x85, 0x10,        # STA $10
+        0x8E, 0x03, 0x06,  # STX $0603
+        0xCA,              # DEX
+        0xD0, 0xF3,        # BNE $0602
+        0x00,              # BRK
+    ]  # fmt: skip
+
+    interpreted, translated = run_both(program, [1000])
+    assert interpreted == translated
+    assert translated[1][-1][0x10] == 5 + 4 + 3 + 2
+
+
+def test_code_written_by_another_block():
+    # the loop rewrites the operand of the LDA #$00 in a subroutine, translated as a block of its own
+    program = [
+        0xA2, 0x05,        # LDX #$05
+        0x20, 0x20, 0x06,  # JSR $0620
+        0x18,              # CLC
+        0x65, 0x10,        # ADC $10
+        0x85, 0x10,        # STA $10
+        0xEE, 0x21, 0x06,  # INC $0621
+        0xCA,              # DEX
+        0xD0, 0xF2,        # BNE $0602
+        0x00,              # BRK
+    ]  # fmt: skip
+    # at $0620: LDA #$00, RTS
+    program += [0x00] * (0x20 - len(program)) + [0xA9, 0x00, 0x60]
+
+    interpreted, translated = run_both(program, [1000])
+    assert interpreted == translated
+    assert translated[1][-1][0x10] == 0 + 1 + 2 + 3 + 4
+
+
+def test_blocks_arent_read_back_until_written():
+    cpu = CPU(program_offset=0x0600, translate=True)
+    cpu.pre_load(DELAY_LOOP)
+    assert cpu.execute(1000) == StopReason.BRK
+
+    def slice(start: int, end: int):
+        raise AssertionError("the code was read back")
+
+    # run it again with every block translated, writes to other pages don't matter
+    cpu.memory.slice = slice
+    cpu.memory.write(0x0010, 0xFF)
+    cpu.program_counter = 0x0600
+    assert cpu.execute(1000) == StopReason.BRK
+
+
+def test_new_memory_drops_blocks():
+    cpu = CPU(program_offset=0x0600, translate=True)
+    cpu.pre_load(DELAY_LOOP)
+    cpu.execute(1000)
+
+    # the same loop with INX rather than DEX
+    cpu.memory = Memory()
+    cpu.pre_load(DELAY_LOOP[:2] + [0xE8] + DELAY_LOOP[3:])
+    assert cpu.execute(1000) == StopReason.BRK
+    assert cpu.cycles == run_both(DELAY_LOOP[:2] + [0xE8] + DELAY_LOOP[3:], [1000])[0][1][6]
+
+
+def test_bank_switch_drops_blocks():
+    memory = Memory(has_bus=True)
+    memory.map_buffer(0x8000, 0x10000, bytearray(0x8000))
+    # INX, RTS in one bank and DEX, RTS in the other
+    banks = page_views(bytes([0xE8, 0x60]).ljust(PAGE_SIZE, b"\x00") + bytes([0xCA, 0x60]).ljust(PAGE_SIZE, b"\x00"))
+    memory.map_pages(0xC000, banks[:1])
+
+    cpu = CPU(program_offset=0x0600, memory=memory, translate=True)
+    # JSR $C000, JMP $0600
+    cpu.pre_load([0x20, 0x00, 0xC0, 0x4C, 0x00, 0x06])
+    # 4 instructions a call
+    cpu.execute(400)
+    assert cpu.register_x == 100 and 0xC000 in cpu.translator.blocks
+
+    memory.map_pages(0xC000, banks[1:])
+    cpu.execute(400)
+    assert cpu.register_x == 0
+
+
+def test_random_programs():
+    opcodes = CPU().opcodes
+
+    for seed in range(100):
+        rng = random.Random(seed)
+
+        program = []
+        for _ in range(30):
+            code = rng.choice([code for code in opcodes if code != 0x00])
+            program += [code] + [rng.randrange(0x100) for _ in range(opcodes[code].length - 1)]
+
+        # JMP back to the start
+        program += [0x4C, 0x00, 0x06]
+        zero_page = [rng.randrange(0x100) for _ in range(0x100)]
+
+        results = []
+        for translate in (False, True):
+            cpu = CPU(program_offset=0x0600, translate=translate)
+            cpu.memory.load(0x0000, 0x0100, zero_page)
+            cpu.pre_load(program)
+
+            try:
+                reasons = [cpu.execute(25) for _ in range(20)]
+            except (IndexError, ValueError):
+                # the program wandered off the end of memory - the registers aren't comparable once a block raises
+                break
+
+            results.append((reasons, state(cpu)))
+
+        if len(results) == 2:
+            assert results[0] == results[1], seed